@@ -0,0 +1,189 @@
+"""Process-wide registry for the Groq LLM client and CrewAI agent definitions.
+
+Streamlit re-executes the app script on every interaction, but imported
+modules stay loaded. Building the LLM client here, once per process, and
+each session's four agents once per session, keeps reruns from paying
+for that construction again.
+
+CrewAI and LangChain are only imported when the LLM or agents are first
+needed, so importing this module is cheap.
+"""
+import logging
+import threading
+import time
+
+from prompt_compiler import VISUAL_MAX_TOKENS
+
+GROQ_MODEL = "openai/gpt-oss-120b"
+# Answers calls the primary model is slow with or failing on
+GROQ_FALLBACK_MODEL = "llama-3.3-70b-versatile"
+
+AGENT_SPECS = {
+    "journal": {
+        "role": "Journal Buddy & Conversation Analyst",
+        "goal": "Engage users in meaningful conversation while analyzing emotional context",
+        "backstory": """You are a warm, empathetic AI companion. Use step-by-step reasoning:
+            1. Analyze the emotional tone and context
+            2. Identify key details and events
+            3. Connect to previous conversations
+            4. Respond with appropriate empathy and questions
+            Keep responses concise but engaging.""",
+    },
+    "story": {
+        "role": "Story Weaver",
+        "goal": "Transform conversations into engaging narratives",
+        "backstory": """Master storyteller who thinks systematically:
+            1. Extract main characters, setting, and events
+            2. Organize chronologically with clear structure
+            3. Add narrative flow while staying authentic
+            4. Create engaging but concise stories""",
+    },
+    "judge": {
+        "role": "Content Quality Specialist",
+        "goal": "Ensure story quality and appropriateness",
+        "backstory": """Quality control expert with systematic approach:
+            1. Check clarity and engagement
+            2. Review appropriateness for all audiences
+            3. Assess narrative flow and pacing
+            4. Provide specific improvements if needed""",
+    },
+    "visual": {
+        "role": "Visual Prompt Creator",
+        "goal": "Create detailed comic strip prompts",
+        "backstory": """Visual storytelling expert who plans systematically:
+            1. Break story into logical panel sequences
+            2. Design consistent characters and settings
+            3. Plan compelling compositions and angles
+            4. Integrate requested art style and tone
+
+            Focus on creating detailed, specific visual descriptions that work well with image generation AI.""",
+    },
+}
+
+# Answer length caps per agent; the visual plan only has to fill the image prompt budget
+AGENT_MAX_TOKENS = {
+    "visual": VISUAL_MAX_TOKENS,
+}
+
+STREAMING_PERSONA = """{backstory}
+
+Think through the emotion, key details and how this connects to the conversation,
+but reply with only your final message to the user: warm, concise (2-3 sentences),
+and encouraging them to share more."""
+
+
+def journal_chat_messages(user_input, context):
+    """Chat messages for a streamed journal reply, with the journal agent's persona"""
+    return [
+        ("system", STREAMING_PERSONA.format(backstory=AGENT_SPECS["journal"]["backstory"])),
+        ("human", f'User\'s message: "{user_input}"\nRecent context: {context}'),
+    ]
+
+
+def _check_agent_llms(agents):
+    """Fail fast if CrewAI replaced the model it was given, as releases from 0.60 on do"""
+    from llm_gateway import HedgedChatModel
+
+    for name, agent in agents.items():
+        if not isinstance(agent.llm, HedgedChatModel):
+            raise RuntimeError(
+                f"CrewAI swapped the {name} agent's model for {type(agent.llm).__name__}, which would "
+                "bypass the LLM gateway; install a crewai release below 0.60, as requirements.txt asks"
+            )
+
+
+class AgentRegistry:
+    """Builds the LLM client once and hands each session its own agents.
+
+    The shared part is the chat model and its gateway. Agents are built
+    fresh per session from ``AGENT_SPECS`` rather than copied from shared
+    ones: a CrewAI agent keeps its executor, callbacks and handlers in
+    mutable fields that a shallow copy would share across sessions. The
+    journal agent gets the session's own conversation memory.
+
+    Every LLM call goes through an ``LLMGateway``, which hedges slow
+    calls to ``fallback_model`` (served from ``fallback_base_url`` if
+    given, otherwise the same endpoint) and routes around a failing
+    model. ``fallback_model=None`` keeps a single model.
+    """
+
+    def __init__(self, api_key, model=GROQ_MODEL, temperature=0.7, timeout=30, base_url=None,
+                 fallback_model=GROQ_FALLBACK_MODEL, fallback_base_url=None):
+        self.api_key = api_key
+        self.model = model
+        self.temperature = temperature
+        self.timeout = timeout
+        self.base_url = base_url
+        self.fallback_model = fallback_model
+        self.fallback_base_url = fallback_base_url
+        self.gateway = None
+        self._lock = threading.Lock()
+        self._llm = None
+
+    def _chat_model(self, model, base_url):
+        from langchain_groq import ChatGroq
+
+        # base_url points the client at a Groq-compatible server, e.g. the benchmark mocks
+        extra = {"base_url": base_url} if base_url else {}
+        return ChatGroq(
+            model=model,
+            api_key=self.api_key,
+            temperature=self.temperature,
+            timeout=self.timeout,
+            **extra,
+        )
+
+    @property
+    def llm(self):
+        """The shared chat model, backed by the hedging gateway"""
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    from llm_gateway import HedgedChatModel, LLMGateway
+
+                    secondary = None
+                    if self.fallback_model:
+                        secondary = self._chat_model(self.fallback_model, self.fallback_base_url or self.base_url)
+                    self.gateway = LLMGateway(self._chat_model(self.model, self.base_url), secondary)
+                    self._llm = HedgedChatModel(gateway=self.gateway, model_name=self.model)
+        return self._llm
+
+    @staticmethod
+    def answering_models():
+        """Context manager collecting the models that answer the LLM calls made inside it"""
+        from llm_gateway import answering_models
+
+        return answering_models()
+
+    @staticmethod
+    def _capped(llm, name):
+        """``llm`` with the agent's answer length cap, sharing the same gateway"""
+        if name not in AGENT_MAX_TOKENS:
+            return llm
+        # LangChain 0.2 models are pydantic v1 models, which only have copy()
+        copy = getattr(llm, "model_copy", None) or llm.copy
+        return copy(update={"max_tokens": AGENT_MAX_TOKENS[name]})
+
+    def warm(self):
+        """Import the CrewAI/LangChain stack and check it keeps our model, ahead of use"""
+        start = time.perf_counter()
+        try:
+            self.session_agents()
+        except Exception as e:
+            logging.warning(f"Agent warm-up failed: {e}")
+            return
+        logging.info(f"Agent stack ready in {time.perf_counter() - start:.2f}s")
+
+    def session_agents(self, memory=None):
+        """Return (journal, story, judge, visual) agents for one session, sharing only the LLM"""
+        from crewai import Agent
+
+        llm = self.llm
+        journal_options = {"memory": memory} if memory is not None else {}
+        agents = {
+            name: Agent(**spec, llm=self._capped(llm, name), allow_delegation=False, verbose=False,
+                        **(journal_options if name == "journal" else {}))
+            for name, spec in AGENT_SPECS.items()
+        }
+        _check_agent_llms(agents)
+        return agents["journal"], agents["story"], agents["judge"], agents["visual"]
@@ -0,0 +1,233 @@
+"""Render comics from exported chats without Streamlit.
+
+Reads every ``*.txt`` chat saved with the app's "Export Chat" button
+from a directory, runs each through the same story, review, visual and
+image pipeline as the app on a bounded worker pool, and writes one
+image per chat plus ``manifest.jsonl`` to the output directory.
+
+The manifest is appended to as each chat finishes. A rerun reads it and
+skips chats that already have a comic, unless their text has changed,
+so an interrupted nightly run picks up where it stopped.
+
+    GROQ_API_KEY=... FIREWORKS_API_KEY=... python batch_comics.py exports/ comics/ --workers 4
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from agent_registry import GROQ_FALLBACK_MODEL, AgentRegistry
+from comic_pipeline import FUSED, PANELS, STAGED, STRIP, run_comic_pipeline
+from conversation_summary import RollingSummary, llm_summarizer
+from fireworks_client import FIREWORKS_WORKFLOW_URL, FireworksClient, PollSchedule
+from image_cache import DEFAULT_CACHE_DIR, ImageCache
+from llm_cache import DEFAULT_DB_PATH, LLMResponseCache
+from rate_limiter import RateLimiter
+
+MANIFEST_NAME = "manifest.jsonl"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+_TURN = re.compile(r"^(USER|ASSISTANT):\s?(.*)$")
+
+
+def parse_chat_export(text):
+    """Messages from an "Export Chat" file; lines without a role prefix continue the previous turn"""
+    messages = []
+    for line in text.splitlines():
+        match = _TURN.match(line)
+        if match:
+            messages.append({"role": match.group(1).lower(), "content": match.group(2)})
+        elif messages:
+            messages[-1]["content"] += "\n" + line
+    return messages
+
+
+def load_manifest(path):
+    """Latest manifest record per chat file"""
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # A line cut short by an interrupted run
+            records[record["chat"]] = record
+    return records
+
+
+class Manifest:
+    """Append-only JSON-lines record of finished chats"""
+
+    def __init__(self, path):
+        self.path = path
+        self.records = load_manifest(path)
+        self._lock = threading.Lock()
+
+    def is_finished(self, chat, digest):
+        record = self.records.get(chat)
+        return record is not None and record["sha256"] == digest and record["status"] in (DONE, SKIPPED)
+
+    def add(self, record):
+        with self._lock:
+            self.records[record["chat"]] = record
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+
+def write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def render_chat(chat_path, digest, setup, args):
+    """Run the pipeline for one exported chat and return its manifest record"""
+    name = os.path.basename(chat_path)
+    record = {"chat": name, "sha256": digest, "started": time.time()}
+
+    with open(chat_path, encoding="utf-8") as f:
+        messages = parse_chat_export(f.read())
+    record["messages"] = len(messages)
+    if len(messages) < args.min_messages:
+        record.update(status=SKIPPED, error=f"only {len(messages)} messages", finished=time.time())
+        return record
+
+    registry = setup["registry"]
+    _, story_agent, judge_agent, visual_agent = registry.session_agents()
+    summary = RollingSummary(llm_summarizer(registry.llm, limiter=setup["limiter"]))
+    conversation_text = summary.build(messages, args.context_tokens)
+
+    result = run_comic_pipeline(
+        story_agent, judge_agent, visual_agent, registry.llm, setup["client"], setup["image_cache"],
+        conversation_text, args.style, args.tone, args.panels, mode=args.mode, memo=setup["memo"],
+        limiter=setup["limiter"], layout=args.layout,
+    )
+
+    image_file = None
+    if isinstance(result.image, bytes):
+        image_file = f"{os.path.splitext(name)[0]}.jpg"
+        write_atomic(os.path.join(args.output, image_file), result.image)
+
+    record.update(
+        status=DONE,
+        image=image_file,
+        image_url=result.image_url,
+        story=result.story,
+        final_story=result.final_story,
+        comic_prompt=result.comic_prompt,
+        mode=result.mode,
+        layout=result.layout,
+        style=result.style,
+        panels=result.panels,
+        timings={stage: round(seconds, 3) for stage, seconds in result.timings.items()},
+        finished=time.time(),
+    )
+    return record
+
+
+def build_setup(args):
+    groq_key = os.getenv("GROQ_API_KEY", "")
+    fireworks_key = os.getenv("FIREWORKS_API_KEY", "")
+    if not groq_key or not fireworks_key:
+        sys.exit("Missing API keys. Set GROQ_API_KEY and FIREWORKS_API_KEY.")
+
+    limiter = RateLimiter()
+    registry = AgentRegistry(
+        groq_key,
+        base_url=os.getenv("COMIC_JOURNAL_GROQ_BASE_URL") or None,
+        fallback_model=os.getenv("COMIC_JOURNAL_FALLBACK_MODEL", GROQ_FALLBACK_MODEL) or None,
+        fallback_base_url=os.getenv("COMIC_JOURNAL_FALLBACK_BASE_URL") or None,
+    )
+    llm_cache = LLMResponseCache(os.getenv("COMIC_JOURNAL_LLM_CACHE", DEFAULT_DB_PATH))
+    return {
+        "registry": registry,
+        "limiter": limiter,
+        "client": FireworksClient(
+            fireworks_key,
+            model_url=os.getenv("COMIC_JOURNAL_FIREWORKS_URL", FIREWORKS_WORKFLOW_URL),
+            schedule=PollSchedule(),
+            pool_size=max(10, args.workers),
+            limiter=limiter,
+        ),
+        "image_cache": ImageCache(os.getenv("COMIC_JOURNAL_CACHE_DIR", DEFAULT_CACHE_DIR)),
+        "memo": llm_cache.bind(registry.model, registry.temperature, reuse=args.reuse,
+                               answering_models=registry.answering_models),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="directory of exported chat .txt files")
+    parser.add_argument("output", help="directory for images and manifest.jsonl")
+    parser.add_argument("--workers", type=int, default=4, help="chats rendered at once")
+    parser.add_argument("--style", default="Cartoonish (fun and whimsical)")
+    parser.add_argument("--tone", default="Slice-of-life (realistic daily life)")
+    parser.add_argument("--panels", type=int, default=3, choices=range(1, 7))
+    parser.add_argument("--mode", choices=[STAGED, FUSED], default=STAGED)
+    parser.add_argument("--layout", choices=[STRIP, PANELS], default=STRIP,
+                        help="one image for the strip, or one per panel composited locally")
+    parser.add_argument("--reuse", action="store_true", help="reuse cached stage responses")
+    parser.add_argument("--min-messages", type=int, default=4, help="skip shorter chats, as the app does")
+    parser.add_argument("--context-tokens", type=int, default=3000, help="conversation budget for the story")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    os.makedirs(args.output, exist_ok=True)
+    manifest = Manifest(os.path.join(args.output, MANIFEST_NAME))
+
+    pending = []
+    for name in sorted(os.listdir(args.input)):
+        path = os.path.join(args.input, name)
+        if not name.endswith(".txt") or not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        if manifest.is_finished(name, digest):
+            continue
+        pending.append((path, digest))
+
+    finished = sum(1 for record in manifest.records.values() if record["status"] in (DONE, SKIPPED))
+    print(f"{len(pending)} chat(s) to render, {finished} already finished")
+    if not pending:
+        return
+
+    setup = build_setup(args)
+    counts = {DONE: 0, FAILED: 0, SKIPPED: 0}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="batch-comic") as executor:
+        futures = {executor.submit(render_chat, path, digest, setup, args): (path, digest)
+                   for path, digest in pending}
+        for future in as_completed(futures):
+            path, digest = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                record = {"chat": os.path.basename(path), "sha256": digest, "status": FAILED,
+                          "error": f"{type(e).__name__}: {e}", "finished": time.time()}
+            manifest.add(record)
+            counts[record["status"]] += 1
+            print(f"[{sum(counts.values())}/{len(pending)}] {record['chat']}: {record['status']}"
+                  + (f" ({record['error']})" if record.get("error") else ""))
+
+    setup["client"].close()
+    print(f"{counts[DONE]} done, {counts[SKIPPED]} skipped, {counts[FAILED]} failed "
+          f"in {time.perf_counter() - start:.1f}s")
+    if counts[FAILED]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Performance benchmarks for the comic journal. Run as modules from the repo root."""
@@ -0,0 +1,82 @@
+"""Journal export throughput and peak memory for a multi-month journal.
+
+Fills a temporary journal with a few months of messages and comic
+images, then exports it in each format to a file and reports throughput
+and traced peak memory. Peak memory should stay near one image chunk
+plus one page of text, whatever the journal size; compare runs with
+different ``--comics`` to see that it doesn't grow with them.
+
+    python -m benchmarks.bench_export --days 120 --comics 300 --image-kb 600
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from journal_export import FORMATS, export_journal
+from journal_store import JournalStore
+
+WORDS = "today work coffee bus meeting friend dinner walk rain sun tired happy late early park dog".split()
+
+
+def fill_journal(store, user_id, days, messages_per_day, comics, image_kb, rng):
+    """Write ``days`` days of messages and ``comics`` comics, back-dated a day at a time"""
+    start = time.time() - days * 86400
+    comic_days = set(rng.sample(range(days * 4), comics))
+    jpeg_header = b"\xff\xd8\xff\xe0"
+    with store._lock, store._conn:
+        for day_index in range(days):
+            created = start + day_index * 86400
+            day = store._day(created)
+            for i in range(messages_per_day):
+                content = " ".join(rng.choice(WORDS) for _ in range(40))
+                store._conn.execute(
+                    "INSERT INTO entries (user_id, day, created, role, content) VALUES (?, ?, ?, ?, ?)",
+                    (user_id, day, created + i, "user" if i % 2 == 0 else "assistant", content),
+                )
+            for slot in range(4):
+                if day_index * 4 + slot in comic_days:
+                    image = jpeg_header + os.urandom(image_kb * 1024 - len(jpeg_header))
+                    store._conn.execute(
+                        """INSERT INTO comics (user_id, day, created, style, panels, story, visual_prompt, image)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                        (user_id, day, created + 3600, "Manga", 3, "A day worth drawing.", "Panel 1: ...", image),
+                    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--messages-per-day", type=int, default=12)
+    parser.add_argument("--comics", type=int, default=300)
+    parser.add_argument("--image-kb", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    if args.comics > args.days * 4:
+        parser.error("at most four comics per day")
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        store = JournalStore(os.path.join(directory, "journal.sqlite3"))
+        fill_journal(store, "bench", args.days, args.messages_per_day, args.comics, args.image_kb, rng)
+        image_mb = args.comics * args.image_kb / 1024
+        print(f"{args.days} days, {args.days * args.messages_per_day} messages, "
+              f"{args.comics} comics ({image_mb:.0f} MB of images)")
+
+        for fmt in FORMATS:
+            path = os.path.join(directory, f"export.{fmt}.zip")
+            tracemalloc.start()
+            with open(path, "wb") as f:
+                stats = export_journal(store, "bench", f, fmt)
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            print(f"{fmt:<5} {stats.seconds:6.2f}s   {size_mb / stats.seconds:7.1f} MB/s   "
+                  f"{stats.comics / stats.seconds:7.0f} comics/s   archive {size_mb:6.1f} MB   "
+                  f"traced peak {traced_peak / (1024 * 1024):5.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
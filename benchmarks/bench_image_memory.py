@@ -0,0 +1,95 @@
+"""Peak memory per image generation: base64 round trips vs raw bytes.
+
+The old image path ran a regex over the base64 sample, decoded it to
+validate, decoded it again, re-encoded it and wrapped it in a data URL.
+The new path decodes once with strict validation and keeps the bytes.
+Each variant runs in a fresh subprocess so peak RSS is comparable.
+
+    python -m benchmarks.bench_image_memory --size-mb 4 --rounds 5
+"""
+import argparse
+import base64
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from comic_pipeline import decode_image_sample
+
+
+def legacy_decode(image_data):
+    """The pre-bytes path: validate, decode twice, re-encode as a data URL"""
+    if re.match(r'^[A-Za-z0-9+/]*={0,2}$', image_data):
+        base64.b64decode(image_data, validate=True)
+        decoded_data = base64.b64decode(image_data)
+        img_b64 = base64.b64encode(decoded_data).decode()
+        return f"data:image/jpeg;base64,{img_b64}"
+    return None
+
+
+VARIANTS = {
+    "legacy": legacy_decode,
+    "bytes": decode_image_sample,
+}
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_variant(name, size_mb, rounds):
+    """Decode ``rounds`` samples, keeping each result like session state would"""
+    decode = VARIANTS[name]
+    sample = base64.b64encode(os.urandom(int(size_mb * 1024 * 1024))).decode()
+    baseline_rss = peak_rss_mb()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    kept = None
+    for _ in range(rounds):
+        kept = decode(sample)
+        assert kept is not None
+    elapsed = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "variant": name,
+        "per_image_ms": elapsed / rounds * 1000,
+        "traced_peak_mb": traced_peak / (1024 * 1024),
+        "rss_growth_mb": peak_rss_mb() - baseline_rss,
+        "stored_mb": len(kept) / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=4.0, help="decoded image size")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--variant", choices=sorted(VARIANTS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, args.size_mb, args.rounds)))
+        return
+
+    print(f"{args.size_mb:g} MB images, {args.rounds} rounds per variant")
+    for name in ("legacy", "bytes"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_image_memory",
+             "--variant", name, "--size-mb", str(args.size_mb), "--rounds", str(args.rounds)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(f"{r['variant']:<8} {r['per_image_ms']:8.1f} ms/image   traced peak {r['traced_peak_mb']:7.1f} MB   "
+              f"peak RSS growth {r['rss_growth_mb']:7.1f} MB   stored {r['stored_mb']:6.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
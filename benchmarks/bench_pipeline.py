@@ -0,0 +1,235 @@
+"""End-to-end chat and comic latency against local Groq/Fireworks stand-ins.
+
+Starts the mock servers from ``benchmarks.mock_servers``, points the
+real ``AgentRegistry`` and ``FireworksClient`` at them, and plays a
+number of concurrent users. Each user gets its own session agents,
+sends a few streamed chat messages, then generates comics through
+``ComicJobEngine`` exactly as the app does: submitted as that user,
+keyed on the request so repeats join a running job, and followed by
+polling the job. Latency percentiles and throughput are reported per stage
+for every user count, so changes to polling, caching or concurrency
+show up as numbers.
+
+    python -m benchmarks.bench_pipeline --users 1 4 16 --mode fused
+    python -m benchmarks.bench_pipeline --groq-latency 0.8 --throttle-rate 0.05 --render 5
+
+No API keys or network access are needed. The staged mode drives real
+CrewAI agents, so it needs a CrewAI release below 0.60, as the app does.
+"""
+import argparse
+import logging
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from agent_registry import AgentRegistry, journal_chat_messages
+from benchmarks.mock_servers import Latency, MockFireworksServer, MockGroqServer, MockProfile
+from comic_jobs import ComicJobEngine
+from comic_pipeline import FUSED, PANELS, STAGED, STRIP, build_conversation_text, run_comic_pipeline
+from fireworks_client import FireworksClient, PollSchedule
+from image_cache import ImageCache
+from llm_cache import LLMResponseCache
+from rate_limiter import RateLimiter
+import tracing
+
+CHAT_LINES = [
+    "I spilled coffee all over myself on the bus this morning.",
+    "A stranger gave me a napkin and we ended up laughing about it.",
+    "Then I had the big presentation I'd been dreading all week.",
+    "It actually went really well, my manager said it was the best one this quarter.",
+]
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+class Recorder:
+    """Thread-safe collection of per-stage latencies and errors"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def fail(self, stage, error):
+        with self._lock:
+            self.errors[f"{stage}: {type(error).__name__}"] += 1
+
+
+def chat_turns(llm, limiter, user, recorder, turns):
+    """Stream a few chat replies, like ``stream_journal_reply``"""
+    messages = []
+    for line in CHAT_LINES[:turns]:
+        text = f"{line} (user {user})"
+        messages.append({"role": "user", "content": text})
+        start = time.perf_counter()
+        first_token = None
+        reply = []
+        try:
+            with limiter.slot("groq", "chat"):
+                for chunk in llm.stream(journal_chat_messages(text, build_conversation_text(messages))):
+                    if isinstance(chunk.content, str) and chunk.content:
+                        if first_token is None:
+                            first_token = time.perf_counter() - start
+                        reply.append(chunk.content)
+        except Exception as e:
+            recorder.fail("chat", e)
+            continue
+        recorder.add("chat_first_token", first_token or 0.0)
+        recorder.add("chat", time.perf_counter() - start)
+        messages.append({"role": "assistant", "content": "".join(reply)})
+    return messages
+
+
+def play_user(user, setup, args, recorder):
+    owner = f"user-{user}"
+    # Each session has its own agents, as create_agents() gives it in the app
+    agents = setup["registry"].session_agents()[1:] if args.mode == STAGED else (None, None, None)
+    messages = chat_turns(setup["llm"], setup["limiter"], user, recorder, args.chat_turns)
+    conversation_text = build_conversation_text(messages)
+    style, tone = "Manga (expressive characters)", "Funny (comedic moments)"
+
+    for _ in range(args.comics):
+        def work(job):
+            return run_comic_pipeline(
+                *agents, setup["llm"], setup["client"], setup["image_cache"],
+                conversation_text, style, tone, args.panels,
+                mode=args.mode, memo=setup["memo"], report=job.report, limiter=setup["limiter"],
+                layout=args.layout,
+            )
+
+        start = time.perf_counter()
+        key = ("comic", owner, conversation_text, style, tone, args.panels, args.mode, args.reuse, args.layout)
+        job = setup["engine"].submit(work, key=key, owner=owner)
+        while job.active:
+            time.sleep(0.02)
+        state = job.snapshot()
+        if state["error"]:
+            recorder.fail("comic", RuntimeError(state["error"]))
+            continue
+        recorder.add("comic", time.perf_counter() - start)
+        for stage, seconds in state["result"].timings.items():
+            recorder.add(stage, seconds)
+
+
+def run_scenario(users, groq, fireworks, args, workdir):
+    """Play ``users`` concurrent users against fresh clients, limiters and caches"""
+    limiter = RateLimiter()
+    registry = AgentRegistry("gsk_mock", base_url=groq.url, fallback_model=None if args.no_hedge else "mock-fallback")
+    memo = None
+    if args.reuse:
+        memo = LLMResponseCache(f"{workdir}/llm_{users}.sqlite3").bind(
+            registry.model, registry.temperature, answering_models=registry.answering_models,
+        )
+    setup = {
+        "registry": registry,
+        "llm": registry.llm,
+        "client": FireworksClient(
+            "fw_mock", model_url=fireworks.model_url, limiter=limiter,
+            schedule=PollSchedule(deadline=args.deadline),
+        ),
+        "image_cache": ImageCache(f"{workdir}/images_{users}") if args.image_cache else None,
+        "memo": memo,
+        "limiter": limiter,
+        "engine": ComicJobEngine(max_workers=args.workers),
+    }
+    recorder = Recorder()
+
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=play_user, args=(user, setup, args, recorder), name=f"user-{user}")
+        for user in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    poller_stats = setup["client"].poller.stats()
+    setup["client"].close()
+    return recorder, wall, limiter.stats(), registry.gateway.stats(), poller_stats
+
+
+def report(users, recorder, wall, limiter_stats, gateway_stats, poller_stats, groq, fireworks):
+    print(f"\n== {users} concurrent user(s), {wall:.1f}s wall ==")
+    print(f"{'stage':<18}{'n':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'per s':>8}")
+    order = ["chat_first_token", "chat", "fused", "story", "judge", "visual", "image", "comic"]
+    for stage in sorted(recorder.samples, key=lambda s: order.index(s) if s in order else len(order)):
+        ordered = sorted(recorder.samples[stage])
+        print(f"{stage:<18}{len(ordered):>5}"
+              + "".join(f"{percentile(ordered, q):>8.2f}s" for q in (0.50, 0.95, 0.99))
+              + f"{len(ordered) / wall:>8.2f}")
+    for error, count in sorted(recorder.errors.items()):
+        print(f"  error x{count}: {error}")
+    throttles = sum(e["throttles"] for e in limiter_stats["endpoints"].values())
+    print(f"requests: groq {groq.counts}, fireworks {fireworks.counts}; limiter throttles {throttles}")
+    print(f"llm gateway: {gateway_stats['calls']} calls, {gateway_stats['hedged']} hedged, "
+          f"{gateway_stats['failovers']} failed over, fallback won {gateway_stats['wins_secondary']}, "
+          f"{gateway_stats['saved_seconds']:.2f}s saved")
+    print(f"image poller: {poller_stats['polls']} status checks, "
+          f"{poller_stats['polls_per_request']:.1f} per image, {poller_stats['errors']} transport errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 16],
+                        help="concurrent user counts to run, one scenario each")
+    parser.add_argument("--mode", choices=[STAGED, FUSED], default=FUSED)
+    parser.add_argument("--layout", choices=[STRIP, PANELS], default=STRIP,
+                        help="one image for the strip, or one per panel composited locally")
+    parser.add_argument("--panels", type=int, default=3, choices=range(1, 7))
+    parser.add_argument("--chat-turns", type=int, default=2)
+    parser.add_argument("--comics", type=int, default=1, help="comics per user")
+    parser.add_argument("--workers", type=int, default=2, help="comic job workers, as COMIC_JOURNAL_JOB_WORKERS")
+    parser.add_argument("--image-cache", action="store_true", help="use an image cache (fresh per scenario)")
+    parser.add_argument("--reuse", action="store_true", help="reuse cached stage responses")
+    parser.add_argument("--no-hedge", action="store_true", help="single LLM model, no hedged requests")
+    parser.add_argument("--deadline", type=float, default=90.0, help="image poll deadline in seconds")
+    parser.add_argument("--groq-latency", type=float, default=0.4, help="median Groq response time")
+    parser.add_argument("--groq-sigma", type=float, default=0.5, help="log-normal shape; larger means a longer tail")
+    parser.add_argument("--groq-concurrency", type=int, default=8)
+    parser.add_argument("--token-interval", type=float, default=0.01)
+    parser.add_argument("--fireworks-latency", type=float, default=0.05, help="median submit/poll time")
+    parser.add_argument("--fireworks-concurrency", type=int, default=8)
+    parser.add_argument("--render", type=float, default=3.0, help="median image render time")
+    parser.add_argument("--queue-delay", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--trace-log", help="append every span to this file as JSON lines")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    tracing.TRACER.log_to(args.trace_log)
+
+    def profile(latency, concurrency, sigma=0.5):
+        return MockProfile(
+            latency=Latency(latency, sigma), concurrency=concurrency, queue_delay=args.queue_delay,
+            failure_rate=args.failure_rate, throttle_rate=args.throttle_rate,
+        )
+
+    print(f"mode {args.mode}, {args.layout} layout with {args.panels} panels, {args.chat_turns} chat turns and {args.comics} comic(s) per user, "
+          f"{args.workers} job workers")
+    with tempfile.TemporaryDirectory() as workdir:
+        for users in args.users:
+            with MockGroqServer(profile(args.groq_latency, args.groq_concurrency, args.groq_sigma),
+                                token_interval=args.token_interval, seed=args.seed) as groq, \
+                    MockFireworksServer(profile(args.fireworks_latency, args.fireworks_concurrency),
+                                        render=Latency(args.render, 0.3), seed=args.seed) as fireworks:
+                recorder, wall, limiter_stats, gateway_stats, poller_stats = run_scenario(
+                    users, groq, fireworks, args, workdir)
+                report(users, recorder, wall, limiter_stats, gateway_stats, poller_stats, groq, fireworks)
+
+
+if __name__ == "__main__":
+    main()
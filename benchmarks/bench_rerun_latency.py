@@ -0,0 +1,82 @@
+"""Rerun latency of agent setup: rebuilding per rerun vs the shared registry.
+
+Every Streamlit interaction re-executes the app script. Before the
+registry, each rerun constructed a ChatGroq client and four CrewAI
+agents; now a session builds its agents once on the registry's shared
+client and reuses them from session state.
+
+    python -m benchmarks.bench_rerun_latency --sessions 5 --reruns 20
+
+No network calls are made; a placeholder API key is enough.
+"""
+import argparse
+import statistics
+import time
+
+from crewai import Agent
+from langchain.memory import ConversationBufferMemory
+from langchain_groq import ChatGroq
+
+from agent_registry import AGENT_SPECS, GROQ_MODEL, AgentRegistry
+
+
+def build_like_before(api_key, memory):
+    """What each rerun used to construct: one plain ChatGroq client and four agents on it"""
+    llm = ChatGroq(model=GROQ_MODEL, api_key=api_key, temperature=0.7, timeout=30)
+    return [
+        Agent(**spec, llm=llm, allow_delegation=False, verbose=False,
+              **({"memory": memory} if name == "journal" else {}))
+        for name, spec in AGENT_SPECS.items()
+    ]
+
+
+def rebuild_every_rerun(api_key, sessions, reruns):
+    """Old behaviour: fresh client and agents on every rerun"""
+    timings = []
+    for _ in range(sessions):
+        memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+        for _ in range(reruns):
+            start = time.perf_counter()
+            build_like_before(api_key, memory)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def shared_registry(api_key, sessions, reruns):
+    """New behaviour: one registry per process, agents kept in session state"""
+    registry = AgentRegistry(api_key)
+    timings = []
+    for _ in range(sessions):
+        session_state = {}
+        memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+        for _ in range(reruns):
+            start = time.perf_counter()
+            if "agents" not in session_state:
+                session_state["agents"] = registry.session_agents(memory)
+            session_state["agents"]
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(label, timings):
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{label:<22} mean {statistics.mean(timings) * 1000:8.3f} ms   "
+          f"p50 {statistics.median(timings) * 1000:8.3f} ms   "
+          f"p95 {p95 * 1000:8.3f} ms   total {sum(timings):7.3f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=5)
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--api-key", default="gsk_benchmark_placeholder")
+    args = parser.parse_args()
+
+    print(f"{args.sessions} sessions x {args.reruns} reruns")
+    report("rebuild every rerun", rebuild_every_rerun(args.api_key, args.sessions, args.reruns))
+    report("shared registry", shared_registry(args.api_key, args.sessions, args.reruns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Similarity index build time, lookup latency and recall at scale.
+
+Indexes synthetic journal conversations, times adding them and
+reloading the index from SQLite (what a restarted process pays), then
+looks up lightly edited copies of indexed conversations (a message
+added, as when someone regenerates) and fresh ones that shouldn't match.
+
+    python -m benchmarks.bench_similarity_index --entries 100000 --lookups 1000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from similarity_index import SimilarityIndex
+
+WORDS = ("today work coffee bus meeting friend dinner walk rain sun tired happy late early park dog cat "
+         "call mom dad sister brother movie book gym run lunch boss project deadline laugh cry train "
+         "office home kitchen garden music song game phone message email party birthday cake store "
+         "doctor class teacher exam weekend trip beach mountain city street car bike snow coat").split()
+
+
+def conversation(rng, turns=6, words_per_turn=18):
+    lines = []
+    for turn in range(turns):
+        role = "user" if turn % 2 == 0 else "assistant"
+        lines.append(f"{role}: " + " ".join(rng.choice(WORDS) for _ in range(words_per_turn)))
+    return "\n".join(lines)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=1000, help="journals the entries are spread over")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [conversation(rng) for _ in range(args.entries)]
+    owners = [f"user-{i % args.users}" for i in range(args.entries)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "similarity.sqlite3")
+        index = SimilarityIndex(path)
+
+        start = time.perf_counter()
+        for user_id, text in zip(owners, texts):
+            index.add(user_id, text, "Manga", "Funny", 3, "strip", "story", "final story", "{}", "prompt")
+        added = time.perf_counter() - start
+        print(f"Indexed {args.entries} conversations in {added:.1f}s "
+              f"({args.entries / added:,.0f}/s, signing and SQLite insert)")
+
+        reloaded = SimilarityIndex(path)
+        print(f"Rebuilt index from SQLite in {reloaded.build_seconds:.2f}s")
+
+        picks = rng.sample(range(args.entries), min(args.lookups, args.entries))
+        latencies, found = [], 0
+        for i in picks:
+            edited = f"{texts[i]}\nuser: " + " ".join(rng.choice(WORDS) for _ in range(10))
+            start = time.perf_counter()
+            matches = reloaded.lookup(owners[i], edited, args.threshold)
+            latencies.append(time.perf_counter() - start)
+            found += bool(matches)
+
+        false_matches = 0
+        for i in picks:
+            start = time.perf_counter()
+            false_matches += bool(reloaded.lookup(owners[i], conversation(rng), args.threshold))
+            latencies.append(time.perf_counter() - start)
+
+        print(f"Lookup p50 {percentile(latencies, 0.5) * 1000:.2f} ms, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.2f} ms, p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+        print(f"Edited copies matched: {found}/{len(picks)}; unrelated conversations matched: "
+              f"{false_matches}/{len(picks)} (threshold {args.threshold:g})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""Local stand-ins for the Groq and Fireworks APIs, for offline benchmarks.
+
+``MockGroqServer`` speaks the OpenAI-style chat-completions protocol the
+Groq SDK uses (including streaming), and ``MockFireworksServer`` speaks
+the workflow submit / ``get_result`` protocol ``FireworksClient`` uses.
+Both serve a limited number of requests at once and queue the rest,
+sample their latency from a log-normal distribution, and can be told to
+fail or throttle a fraction of requests.
+
+    with MockGroqServer(MockProfile(latency=Latency(0.4))) as groq:
+        AgentRegistry("gsk_mock", base_url=groq.url)
+"""
+import base64
+import io
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+@dataclass
+class Latency:
+    """Log-normal latency with the given median (seconds) and shape"""
+    median: float = 0.0
+    sigma: float = 0.5
+
+    def sample(self, rng):
+        if self.median <= 0:
+            return 0.0
+        return rng.lognormvariate(math.log(self.median), self.sigma)
+
+
+@dataclass
+class MockProfile:
+    """How a mock endpoint behaves under load"""
+    latency: Latency = field(default_factory=Latency)
+    concurrency: int = 8       # Requests served at once; the rest wait in line
+    queue_delay: float = 0.0   # Extra fixed delay before a request is served
+    failure_rate: float = 0.0  # Fraction answered with a 500
+    throttle_rate: float = 0.0  # Fraction answered with a 429
+    retry_after: float = 1.0
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response (timeouts, aborted streams) are expected under load
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+class _MockServer:
+    """Threaded HTTP server with a served-at-once limit and request counters"""
+
+    def __init__(self, profile=None, seed=None):
+        self.profile = profile or MockProfile()
+        self.rng = random.Random(seed)
+        self.counts = {}
+        self._slots = threading.BoundedSemaphore(self.profile.concurrency)
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def _sample(self, latency):
+        with self._lock:
+            return latency.sample(self.rng)
+
+    def _roll(self):
+        """Decide this request's fate: None, 429 or 500"""
+        profile = self.profile
+        with self._lock:
+            roll = self.rng.random()
+        if roll < profile.throttle_rate:
+            return 429
+        if roll < profile.throttle_rate + profile.failure_rate:
+            return 500
+        return None
+
+    def handle(self, handler, path, body):
+        raise NotImplementedError
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if server.profile.queue_delay:
+                    time.sleep(server.profile.queue_delay)
+                with server._slots:
+                    status = server._roll()
+                    if status is not None:
+                        server._count(status)
+                        self.send_json(status, {"error": {"message": f"mock {status}"}},
+                                       {"Retry-After": f"{server.profile.retry_after:g}"} if status == 429 else None)
+                        return
+                    server.handle(self, self.path, body)
+
+            def send_json(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._httpd = _QuietHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# Canned replies; the words are streamed one chunk at a time
+STORY_REPLY = ("Sam spilled coffee on the way to a big meeting, laughed it off with a stranger "
+               "on the bus, and ended the day proud of a presentation that went better than expected.")
+CHAT_REPLY = "That sounds like quite a day! How did you feel once the meeting was over?"
+CHARACTERS_REPLY = "Sam: short curly hair, round glasses, green raincoat. Stranger: tall, grey beard, red scarf."
+SETTING_REPLY = "A rainy city morning, a crowded bus and a glass-walled office."
+LOOK_REPLY = "Bold ink outlines, warm morning palette, playful exaggerated expressions."
+PANEL_REPLY = "Sam on a crowded bus, coffee splashing, a stranger laughing nearby, warm morning light."
+
+
+class MockGroqServer(_MockServer):
+    """Groq chat-completions stand-in; point ``base_url`` at ``url``.
+
+    The reply fits what the caller asked for: a ReAct ``Final Answer``
+    for CrewAI, a JSON plan for the fused pipeline prompt, plain text
+    otherwise. ``token_interval`` spaces out streamed chunks.
+    """
+
+    def __init__(self, profile=None, token_interval=0.01, seed=None):
+        super().__init__(profile, seed)
+        self.token_interval = token_interval
+
+    @staticmethod
+    def reply_for(messages):
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        panels = re.search(r"(\d+)-panel", prompt)
+        panel_replies = [f"{PANEL_REPLY} Scene {i + 1}." for i in range(int(panels.group(1)) if panels else 3)]
+        if "JSON keys" in prompt:
+            plan = {
+                "story": STORY_REPLY,
+                "verdict": "approved",
+                "final_story": STORY_REPLY,
+                "characters": CHARACTERS_REPLY,
+                "setting": SETTING_REPLY,
+                "panels": panel_replies,
+                "look": LOOK_REPLY,
+            }
+            if "panel_prompts" in prompt:
+                plan["panel_prompts"] = panel_replies
+            return json.dumps(plan)
+        if "Panel planning" in prompt:
+            text = json.dumps({"characters": CHARACTERS_REPLY, "panels": panel_replies})
+        elif "Visual planning" in prompt:
+            text = json.dumps({"characters": CHARACTERS_REPLY, "setting": SETTING_REPLY,
+                               "panels": panel_replies, "look": LOOK_REPLY})
+        elif "User's message" in prompt:
+            text = CHAT_REPLY
+        else:
+            text = STORY_REPLY
+        if "Final Answer" in prompt:
+            return f"Thought: I now can give a great answer\nFinal Answer: {text}"
+        return text
+
+    def handle(self, handler, path, body):
+        if not path.rstrip("/").endswith("/chat/completions"):
+            self._count(404)
+            handler.send_json(404, {"error": {"message": f"unknown path {path}"}})
+            return
+        self._count("chat")
+        time.sleep(self._sample(self.profile.latency))
+
+        content = self.reply_for(body.get("messages", []))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get("model", "mock")
+        created = int(time.time())
+        usage = {"prompt_tokens": 100, "completion_tokens": len(content) // 4, "total_tokens": 100 + len(content) // 4}
+
+        if not body.get("stream"):
+            handler.send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "logprobs": None, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        handler.close_connection = True
+
+        def event(delta, finish_reason=None):
+            chunk = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish_reason}],
+            }
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            handler.wfile.flush()
+
+        event({"role": "assistant", "content": ""})
+        for word in content.split(" "):
+            event({"content": word + " "})
+            time.sleep(self.token_interval)
+        event({}, "stop")
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+
+
+def noise_jpeg(size, seed=None):
+    """A real, decodable JPEG, so callers can composite or resize it"""
+    import numpy as np
+    from PIL import Image
+
+    pixels = np.random.default_rng(seed).integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    output = io.BytesIO()
+    Image.fromarray(pixels).save(output, format="JPEG", quality=85)
+    return output.getvalue()
+
+
+class MockFireworksServer(_MockServer):
+    """Fireworks workflow stand-in; use ``model_url`` as the client's model URL.
+
+    A submitted generation becomes ``Ready`` after a render time drawn
+    from ``render``; ``get_result`` reports ``Pending`` until then and
+    returns a base64 JPEG of random noise, ``image_size`` pixels, afterwards.
+    """
+
+    def __init__(self, profile=None, render=None, image_size=(512, 512), seed=None):
+        super().__init__(profile, seed)
+        self.render = render or Latency(3.0, 0.3)
+        self.sample = base64.b64encode(noise_jpeg(image_size, seed)).decode("ascii")
+        self._ready_at = {}
+
+    @property
+    def model_url(self):
+        return f"{self.url}/inference/v1/workflows/accounts/mock/models/mock-image"
+
+    def handle(self, handler, path, body):
+        time.sleep(self._sample(self.profile.latency))
+        if path.endswith("/get_result"):
+            self._count("poll")
+            with self._lock:
+                ready_at = self._ready_at.get(body.get("id"))
+            if ready_at is None:
+                handler.send_json(200, {"status": "Failed", "details": "Unknown request"})
+            elif time.monotonic() < ready_at:
+                handler.send_json(200, {"status": "Pending"})
+            else:
+                handler.send_json(200, {"status": "Ready", "result": {"sample": self.sample}})
+            return
+
+        self._count("submit")
+        request_id = uuid.uuid4().hex
+        render = self._sample(self.render)
+        with self._lock:
+            self._ready_at[request_id] = time.monotonic() + render
+        handler.send_json(200, {"request_id": request_id})
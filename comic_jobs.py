@@ -0,0 +1,138 @@
+"""Background job engine for comic generation.
+
+Jobs run on a bounded worker pool outside the Streamlit script thread,
+so reruns, widget clicks and page refreshes don't abandon them. The UI
+polls a job's state by ID and can re-attach to it from a new session.
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass
+class ComicJob:
+    """State of one submitted job, updated by its worker"""
+    job_id: str
+    owner: str = ""
+    status: str = QUEUED
+    stage: str = ""
+    progress: int = 0
+    message: str = "⏳ Waiting for a free worker..."
+    result: object = None
+    error: str = ""
+    created: float = field(default_factory=time.time)
+    finished: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    def report(self, stage, progress, message):
+        """Progress callback handed to the work function"""
+        with self._lock:
+            self.stage = stage
+            self.progress = progress
+            self.message = message
+
+    def snapshot(self):
+        """Consistent copy of the fields the UI reads"""
+        with self._lock:
+            return {
+                "status": self.status,
+                "stage": self.stage,
+                "progress": self.progress,
+                "message": self.message,
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class ComicJobEngine:
+    """Runs jobs on a fixed-size thread pool and keeps them for re-attaching"""
+
+    def __init__(self, max_workers=2, retention=3600):
+        self.max_workers = max_workers
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="comic-job")
+        self._jobs = {}
+        self._active_keys = {}
+        self.coalesced = 0
+        self._lock = threading.Lock()
+
+    def submit(self, work, describe_error=str, key=None, owner=""):
+        """Queue ``work(job)`` for ``owner`` and return its job.
+
+        Whatever ``work`` returns becomes ``job.result``. If it raises,
+        ``describe_error(exc)`` becomes ``job.error``. While a job
+        submitted by the same owner with the same ``key`` is still queued
+        or running, that job is returned instead of starting the same
+        work again.
+        """
+        key = (owner, key) if key is not None else None
+        with self._lock:
+            self._prune()
+            existing = self._active_keys.get(key) if key is not None else None
+            if existing is not None and existing.active:
+                self.coalesced += 1
+                return existing
+            job = ComicJob(job_id=uuid.uuid4().hex, owner=owner)
+            self._jobs[job.job_id] = job
+            if key is not None:
+                self._active_keys[key] = job
+        self._executor.submit(self._run, job, work, describe_error, key)
+        return job
+
+    def _run(self, job, work, describe_error, key):
+        with job._lock:
+            job.status = RUNNING
+        try:
+            result = work(job)
+        except Exception as e:
+            logging.error(f"Comic job {job.job_id[:8]} failed: {str(e)}")
+            with job._lock:
+                job.status = FAILED
+                job.error = describe_error(e)
+                job.finished = time.time()
+            return
+        else:
+            with job._lock:
+                job.status = DONE
+                job.result = result
+                job.progress = 100
+                job.finished = time.time()
+        finally:
+            if key is not None:
+                with self._lock:
+                    if self._active_keys.get(key) is job:
+                        del self._active_keys[key]
+
+    def get(self, job_id, owner=None):
+        """Look up a job by ID, or None if unknown, expired or, given ``owner``, someone else's"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            return None
+        return job
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [j for j, job in self._jobs.items() if not job.active and job.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        """Number of jobs in each state, and submissions that joined a running job"""
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            counts["coalesced"] = self.coalesced
+            return counts
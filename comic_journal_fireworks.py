@@ -1,13 +1,84 @@
+import time
+_script_started = time.perf_counter()
+
 import os
 import streamlit as st
-from crewai import Agent, Task, Crew
-from langchain_groq import ChatGroq
-from langchain.memory import ConversationBufferMemory
 import requests
-import base64
-import time
 import logging
-import re
+import sqlite3
+import functools
+import hashlib
+import itertools
+import json
+import tempfile
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from agent_registry import GROQ_FALLBACK_MODEL, AgentRegistry, journal_chat_messages
+from conversation_summary import SummaryPerBudget, llm_summarizer
+from comic_jobs import ComicJobEngine
+from fireworks_client import (
+    FIREWORKS_WORKFLOW_URL, FireworksClient, FireworksError, FireworksTimeout, PollSchedule,
+)
+from image_cache import DEFAULT_CACHE_DIR, ImageCache
+from journal_export import FORMATS as EXPORT_FORMATS, HTML as HTML_EXPORT, export_journal
+from journal_store import DEFAULT_DB_PATH as JOURNAL_DB_PATH, JournalStore
+from llm_cache import DEFAULT_DB_PATH, LLMResponseCache
+from rate_limiter import RateLimiter
+from session_memory import (
+    DEFAULT_BYTE_BUDGET, DEFAULT_SPILL_DIR, DEFAULT_TOKEN_BUDGET, SessionMemory, SpillStore,
+    SpilledImage, excess_messages, load_image, spill_image, trim_chat_memory,
+)
+from similarity_index import (
+    DEFAULT_DB_PATH as SIMILARITY_DB_PATH, DEFAULT_THRESHOLD as REUSE_THRESHOLD, SimilarityIndex,
+)
+from speculation import SpeculationStats, StorySpeculator
+import tracing
+
+# =====================
+# STARTUP PROFILING
+# =====================
+# Set COMIC_JOURNAL_PROFILE_STARTUP=1 to log import and render timings
+PROFILE_STARTUP = os.getenv("COMIC_JOURNAL_PROFILE_STARTUP") == "1"
+if PROFILE_STARTUP:
+    logging.basicConfig(level=logging.INFO)
+
+# Server-wide panels (traces, every session's memory) open with ?debug=1 only where
+# the operator set COMIC_JOURNAL_ADMIN=1; anyone can add the query parameter
+ADMIN_PANELS = os.getenv("COMIC_JOURNAL_ADMIN") == "1"
+
+def debug_panels_open():
+    """Whether to show the server-wide debug panels on this page"""
+    return ADMIN_PANELS and st.query_params.get("debug") == "1"
+
+def log_startup_timing(stage):
+    """Log time elapsed since this script run started"""
+    if PROFILE_STARTUP:
+        logging.info(f"[startup] {stage}: {(time.perf_counter() - _script_started) * 1000:.0f} ms")
+
+log_startup_timing("imports done")
+
+# Script time of recent runs, per page section
+INTERACTION_SAMPLES = 50
+
+def timed_interaction(section):
+    """Record how long each run of a page section (or the whole page) takes"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                times = st.session_state.setdefault("interaction_times", {})
+                times.setdefault(section, deque(maxlen=INTERACTION_SAMPLES)).append(elapsed)
+                if PROFILE_STARTUP:
+                    logging.info(f"[interaction] {section} ran in {elapsed * 1000:.0f} ms")
+        return wrapper
+    return decorate
 
 # =====================
 # PAGE CONFIGURATION
@@ -91,128 +162,297 @@ if not api_keys["groq"] or not api_keys["fireworks"]:
     st.error("⚠️ Missing API keys. Please configure GROQ_API_KEY and FIREWORKS_API_KEY.")
     st.stop()
 
-# Initialize Groq client with error handling
-try:
-    llm = ChatGroq(
-        model="openai/gpt-oss-120b", 
-        api_key=api_keys["groq"], 
-        temperature=0.7,
-        timeout=30
+@st.cache_resource
+def get_agent_registry():
+    """Process-wide LLM client and agent definitions, shared by every session"""
+    return AgentRegistry(
+        api_keys["groq"],
+        base_url=os.getenv("COMIC_JOURNAL_GROQ_BASE_URL") or None,
+        # Set COMIC_JOURNAL_FALLBACK_MODEL to an empty string to turn hedging off
+        fallback_model=os.getenv("COMIC_JOURNAL_FALLBACK_MODEL", GROQ_FALLBACK_MODEL) or None,
+        fallback_base_url=os.getenv("COMIC_JOURNAL_FALLBACK_BASE_URL") or None,
     )
-except Exception as e:
-    st.error(f"⚠️ Failed to initialize AI services: {str(e)}")
-    st.stop()
+
+@st.cache_resource
+def start_agent_warmup():
+    """Load CrewAI/LangChain in the background so the page renders immediately"""
+    thread = threading.Thread(target=get_agent_registry().warm, name="agent-warmup", daemon=True)
+    thread.start()
+    return thread
 
 # =====================
 # FIREWORKS AI IMAGE GENERATION
 # =====================
-def is_valid_base64(s):
-    """Check if string is valid base64"""
-    try:
-        if isinstance(s, str):
-            # Check if it looks like base64
-            if re.match(r'^[A-Za-z0-9+/]*={0,2}$', s):
-                base64.b64decode(s, validate=True)
-                return True
-        return False
-    except Exception:
-        return False
+@st.cache_resource
+def get_rate_limiter():
+    """Process-wide token buckets and adaptive concurrency for Groq and Fireworks"""
+    return RateLimiter()
 
-def generate_image_with_fireworks(prompt, max_attempts=90):
-    """Generate image using Fireworks AI API with improved error handling"""
-    try:
-        # Step 1: Submit the generation request
-        url = "https://api.fireworks.ai/inference/v1/workflows/accounts/fireworks/models/flux-kontext-pro"
-        headers = {
-            "Content-Type": "application/json",
-            "Accept": "application/json",
-            "Authorization": f"Bearer {api_keys['fireworks']}",
-        }
-        data = {
-            "prompt": prompt[:1000]  # Limit prompt length
-        }
+@st.cache_resource
+def get_fireworks_client():
+    """Shared Fireworks client so every session reuses the same connection pool"""
+    return FireworksClient(
+        api_keys["fireworks"],
+        model_url=os.getenv("COMIC_JOURNAL_FIREWORKS_URL", FIREWORKS_WORKFLOW_URL),
+        schedule=PollSchedule(),
+        limiter=get_rate_limiter(),
+    )
 
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        response.raise_for_status()  # Raise exception for bad status codes
-        
-        result = response.json()
-        request_id = result.get("request_id")
+@st.cache_resource
+def get_image_cache():
+    """Shared on-disk cache of generated images, keyed by prompt and model"""
+    return ImageCache(os.getenv("COMIC_JOURNAL_CACHE_DIR", DEFAULT_CACHE_DIR))
 
-        if not request_id:
-            raise Exception("No request ID returned from Fireworks AI")
+@st.cache_resource
+def get_llm_cache():
+    """Shared SQLite cache of story, review and visual stage responses"""
+    return LLMResponseCache(os.getenv("COMIC_JOURNAL_LLM_CACHE", DEFAULT_DB_PATH))
 
-        st.info(f"🔥 Generation started (ID: {request_id[:8]}...)")
+# =====================
+# TRACING AND METRICS
+# =====================
+@st.cache_resource
+def configure_tracing():
+    """Span log and Prometheus endpoint, set up once per process.
 
-        # Step 2: Poll for the result
-        result_endpoint = f"{url}/get_result"
-        
-        progress_container = st.empty()
-        
-        for attempt in range(max_attempts):
-            time.sleep(1)
-            
-            # Update progress
-            progress_container.text(f"⏳ Generating image... ({attempt + 1}/{max_attempts})")
-            
-            try:
-                result_response = requests.post(result_endpoint, 
-                    headers={
-                        "Content-Type": "application/json",
-                        "Accept": "image/jpeg",
-                        "Authorization": f"Bearer {api_keys['fireworks']}"
-                    },
-                    json={"id": request_id},
-                    timeout=10
-                )
-                result_response.raise_for_status()
-                
-                poll_result = result_response.json()
-                status = poll_result.get("status")
-                
-                if status in ["Ready", "Complete", "Finished"]:
-                    progress_container.empty()
-                    image_data = poll_result.get("result", {}).get("sample")
-                    
-                    if isinstance(image_data, str) and image_data.startswith("http"):
-                        # Image is available via URL
-                        return image_data
-                    elif image_data and is_valid_base64(image_data):
-                        # Base64 encoded image data
-                        try:
-                            # Decode base64 and create a data URL for display
-                            decoded_data = base64.b64decode(image_data)
-                            # Convert to base64 string for display in Streamlit
-                            img_b64 = base64.b64encode(decoded_data).decode()
-                            return f"data:image/jpeg;base64,{img_b64}"
-                        except Exception as decode_error:
-                            st.error(f"Error decoding image: {decode_error}")
-                            return None
-                    else:
-                        st.error("Invalid or missing image data returned")
-                        return None
-                
-                elif status in ["Failed", "Error"]:
-                    progress_container.empty()
-                    error_details = poll_result.get('details', 'Unknown error')
-                    raise Exception(f"Generation failed: {error_details}")
-                
-                # Continue polling for other statuses (Processing, Queued, etc.)
-                
-            except requests.exceptions.RequestException as req_error:
-                st.warning(f"Request error during polling: {req_error}")
-                continue  # Continue polling despite temporary network issues
-        
-        # If we've exhausted all attempts
-        progress_container.empty()
-        st.error(f"⏰ Generation timed out after {max_attempts} seconds")
+    COMIC_JOURNAL_TRACE_LOG appends every span as a JSON line and
+    COMIC_JOURNAL_METRICS_PORT serves /metrics on that port.
+    """
+    tracing.TRACER.log_to(os.getenv("COMIC_JOURNAL_TRACE_LOG"))
+    port = os.getenv("COMIC_JOURNAL_METRICS_PORT")
+    return tracing.serve_metrics(int(port)) if port else None
+
+def show_debug_panel():
+    """Per-span metrics and the latest comic's trace; open with ?debug=1 on an admin server"""
+    if not debug_panels_open():
+        return
+    with st.expander("🔬 Pipeline Traces"):
+        interaction_times = st.session_state.get("interaction_times")
+        if interaction_times:
+            st.caption("Script time per run")
+            st.table([
+                {
+                    "section": section,
+                    "runs": len(times),
+                    "p50": f"{sorted(times)[len(times) // 2] * 1000:.0f} ms",
+                    "max": f"{max(times) * 1000:.0f} ms",
+                }
+                for section, times in interaction_times.items()
+            ])
+        summary = tracing.TRACER.summary()
+        if not summary:
+            st.caption("No spans recorded yet")
+            return
+        st.table([
+            {
+                "span": name,
+                "count": m["count"],
+                "errors": m["errors"],
+                "p50": f"{m['p50']:.2f}s",
+                "p95": f"{m['p95']:.2f}s",
+                "cache": " ".join(f"{k}:{v}" for k, v in m["cache"].items()) or "—",
+                "tokens in/out": f"{m.get('prompt_tokens', 0):.0f}/{m.get('response_tokens', 0):.0f}",
+                "limiter wait": f"{m.get('limiter_wait', 0):.2f}s",
+            }
+            for name, m in summary.items()
+        ])
+        trace_id = st.session_state.get("comic_trace_id")
+        if trace_id:
+            st.caption("Latest comic")
+            st.dataframe([
+                {"span": s["name"], "stage": s.get("stage", ""), "seconds": round(s["duration"], 3),
+                 "status": s["status"], "cache": s.get("cache", ""), "retries": str(s.get("retries", ""))}
+                for s in reversed(tracing.TRACER.recent(200, trace_id=trace_id))
+            ])
+        st.download_button("📈 Export metrics", data=tracing.TRACER.prometheus_text(),
+                           file_name="comic_journal_metrics.txt", mime="text/plain")
+
+def describe_generation_error(e):
+    """User-facing message for an exception raised while generating a comic"""
+    if isinstance(e, FireworksTimeout):
+        return f"⏰ {e}"
+    if isinstance(e, requests.exceptions.RequestException):
+        return f"🌐 Network error: {str(e)}"
+    if isinstance(e, FireworksError):
+        return f"🚨 Image generation error: {str(e)}"
+    return f"⚠️ Comic generation failed: {str(e)}"
+
+# =====================
+# COMIC GENERATION JOBS
+# =====================
+@st.cache_resource
+def get_job_engine():
+    """Shared worker pool; its size bounds concurrent load on Groq and Fireworks"""
+    return ComicJobEngine(max_workers=int(os.getenv("COMIC_JOURNAL_JOB_WORKERS", "2")))
+
+def attach_comic_job(job_id):
+    """Follow a job from this session, and from the URL after a refresh"""
+    st.session_state.comic_job_id = job_id
+    st.query_params["job"] = job_id
+
+def job_key(*parts):
+    """Identity of a job's inputs, so identical submissions can share one job"""
+    return hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+def current_comic_job():
+    """The job this session is following, if it still exists and is this user's"""
+    job_id = st.session_state.get("comic_job_id") or st.query_params.get("job")
+    if not job_id:
         return None
-        
-    except requests.exceptions.RequestException as e:
-        st.error(f"🌐 Network error: {str(e)}")
+    job = get_job_engine().get(job_id, owner=current_user_id())
+    if job is None:
+        st.session_state.pop("comic_job_id", None)
+        st.query_params.pop("job", None)
         return None
+    st.session_state.comic_job_id = job_id
+    return job
+
+# =====================
+# SPECULATIVE STORIES
+# =====================
+SPECULATE_AFTER_MESSAGES = 4
+
+@st.cache_resource
+def get_speculation_pool():
+    """Workers of their own, so speculative runs never hold up a comic someone asked for"""
+    return ThreadPoolExecutor(
+        max_workers=int(os.getenv("COMIC_JOURNAL_SPECULATION_WORKERS", "2")), thread_name_prefix="speculate"
+    )
+
+@st.cache_resource
+def get_speculation_stats():
+    """Speculative runs used and wasted across all sessions"""
+    return SpeculationStats()
+
+def get_story_speculator():
+    """Get or create this session's speculative story run"""
+    if "story_speculator" not in st.session_state:
+        st.session_state.story_speculator = StorySpeculator(get_speculation_pool(), get_speculation_stats())
+    return st.session_state.story_speculator
+
+def speculation_enabled():
+    return st.session_state.get("speculate", False) and st.session_state.get("pipeline_mode", "staged") == "staged"
+
+def stop_speculating():
+    """Drop the background run when speculation is switched off"""
+    if not speculation_enabled():
+        get_story_speculator().discard()
+        st.session_state.pop("speculated_through", None)
+
+def restart_speculating():
+    """Drop a background run made under the old reuse setting; the next message starts afresh"""
+    get_story_speculator().discard()
+    st.session_state.pop("speculated_through", None)
+
+def speculate_story():
+    """Write and review the story for the conversation so far in the background.
+
+    Runs once per new message; the previous conversation's run is
+    cancelled or discarded, so only the latest one can be used.
+    """
+    messages = st.session_state.messages
+    if not speculation_enabled() or len(messages) < SPECULATE_AFTER_MESSAGES:
+        return
+    if st.session_state.get("speculated_through") == messages[-1]["id"]:
+        return
+    
+    try:
+        import comic_pipeline as pipeline
+
+        _, story_agent, judge_agent, _ = create_agents()
+        if story_agent is None or judge_agent is None:
+            return
+        registry = get_agent_registry()
+        # Same reuse setting as the comic the story is for, so reuse off means fresh LLM calls
+        memo = get_llm_cache().bind(registry.model, registry.temperature,
+                                    reuse=st.session_state.get("reuse_results", False),
+                                    answering_models=registry.answering_models)
+        limiter = get_rate_limiter()
+        conversation_text = get_conversation_summary().build(messages, STORY_CONTEXT_TOKENS)
     except Exception as e:
-        st.error(f"🚨 Image generation error: {str(e)}")
-        return None
+        logging.warning(f"Not speculating on the story: {e}")
+        return
+    
+    def work(check):
+        with tracing.span("comic.speculate", conversation_chars=len(conversation_text)):
+            story = pipeline.run_story_stage(story_agent, conversation_text, memo=memo, limiter=limiter)
+            check()
+            return story, pipeline.run_judge_stage(judge_agent, story, memo=memo, limiter=limiter)
+    
+    get_story_speculator().refresh(conversation_text, work)
+    st.session_state.speculated_through = messages[-1]["id"]
+
+def show_speculation_stats():
+    stats = get_speculation_stats().snapshot()
+    if not stats["started"]:
+        return
+    st.caption(
+        f"🔮 Speculative stories: {stats['used']} of {stats['started']} used · "
+        f"saved {stats['saved_seconds']:.0f}s · wasted {stats['wasted_seconds']:.0f}s of LLM time"
+    )
+
+# =====================
+# SIMILAR JOURNALS
+# =====================
+@st.cache_resource
+def get_similarity_index():
+    """Shared index of past conversations and the comics made from them.
+
+    COMIC_JOURNAL_REUSE_SHARED=1 lets one journal reuse comics made from
+    another's conversations; by default lookups stay within a journal.
+    """
+    return SimilarityIndex(os.getenv("COMIC_JOURNAL_SIMILARITY_DB", SIMILARITY_DB_PATH),
+                           shared=os.getenv("COMIC_JOURNAL_REUSE_SHARED") == "1")
+
+def reuse_similar_comic(index, user_id, conversation_text, style, tone, panels, layout, report):
+    """``(draft, visual_draft)`` from the closest past comic, or ``(None, None)``.
+
+    The story is reused for any close match; the visual plan only when
+    the comic settings are the same too.
+    """
+    import comic_pipeline as pipeline
+
+    threshold = float(os.getenv("COMIC_JOURNAL_REUSE_THRESHOLD", REUSE_THRESHOLD))
+    matches = index.lookup(user_id, conversation_text, threshold)
+    if not matches:
+        return None, None
+    match = next((m for m in matches if m.same_settings(style, tone, panels, layout) and m.visual_plan),
+                 matches[0])
+    draft = (match.story, match.final_story)
+    if layout == pipeline.STRIP and match.same_settings(style, tone, panels, layout) and match.visual_plan:
+        try:
+            visual_draft = pipeline.VisualSpec.model_validate_json(match.visual_plan)
+        except ValueError as e:
+            logging.warning(f"Stored visual plan is unusable: {e}")
+        else:
+            report("story", 0, f"♻️ Reusing a comic from a {match.similarity:.0%} similar day...")
+            index.record_reuse("full")
+            return draft, visual_draft
+    report("story", 0, f"♻️ Reusing the story from a {match.similarity:.0%} similar day...")
+    index.record_reuse("story")
+    return draft, None
+
+def index_comic(index, user_id, conversation_text, tone, result):
+    """Remember a finished comic so similar conversations can reuse it"""
+    try:
+        index.add(
+            user_id, conversation_text, result.style, tone, result.panels, result.layout,
+            result.story, result.final_story,
+            visual_plan=result.visual_spec.model_dump_json() if result.visual_spec is not None else "",
+            image_prompt=result.image_prompt,
+        )
+    except sqlite3.Error as e:
+        logging.warning(f"Could not index comic for reuse: {e}")
+
+def show_similarity_stats():
+    stats = get_similarity_index().stats()
+    if not stats["lookups"]:
+        return
+    p95 = f", p95 lookup {stats['p95_ms']:.1f} ms" if stats["p95_ms"] is not None else ""
+    st.caption(
+        f"🧭 Similar days: {stats['reused']['full']} comics and {stats['reused']['story']} stories reused "
+        f"in {stats['lookups']} lookups ({stats['reuse_rate']:.0%}) over {stats['entries']} entries{p95}"
+    )
 
 # =====================
 # RATE LIMITING
@@ -229,99 +469,484 @@ def check_rate_limit():
     st.session_state.last_request_time = time.time()
     return True
 
+def show_rate_limits():
+    """Provider concurrency, queue depth and throttle events for monitoring"""
+    stats = get_rate_limiter().stats()
+    with st.expander("🚦 Provider Limits"):
+        for provider, state in stats["providers"].items():
+            paused = f", paused {state['paused_for']:.0f}s" if state["paused_for"] else ""
+            st.caption(f"**{provider}**: {state['in_flight']}/{state['concurrency_limit']} in flight "
+                       f"(max {state['max_concurrency']}){paused}")
+        images = get_fireworks_client().flights.stats()
+        st.caption(f"**Shared work**: {get_job_engine().stats()['coalesced']} comic requests and "
+                   f"{images['coalesced']} image generations joined one already running")
+        polling = get_fireworks_client().poller.stats()
+        typical = polling["completion_seconds"].get(0.5)
+        st.caption(f"**Image queue**: {polling['outstanding']} rendering, "
+                   f"{polling['polls_per_request']:.1f} status checks per image"
+                   + (f", typical render {typical:.1f}s" if typical else ""))
+        if stats["endpoints"]:
+            st.table([
+                {
+                    "endpoint": endpoint,
+                    "queued": state["queued"],
+                    "calls": state["calls"],
+                    "throttled": state["throttles"],
+                    "avg wait": f"{state['avg_wait']:.2f}s",
+                }
+                for endpoint, state in stats["endpoints"].items()
+            ])
+        show_llm_gateway()
+
+def show_llm_gateway():
+    """Hedged LLM calls: how often the fallback model won and what it saved"""
+    gateway = get_agent_registry().gateway
+    if gateway is None:
+        return
+    stats = gateway.stats()
+    st.caption(f"**LLM**: {stats['calls']} calls, {stats['hedged']} hedged, {stats['failovers']} failed over, "
+               f"{stats['saved_seconds']:.1f}s saved")
+    st.table([
+        {
+            "model": state["model"],
+            "circuit": state["circuit"],
+            "wins": f"{state['win_rate']:.0%}",
+            "p95": f"{state['p95_invoke']:.2f}s" if state["p95_invoke"] is not None else "—",
+            "p95 first token": f"{state['p95_first_chunk']:.2f}s" if state["p95_first_chunk"] is not None else "—",
+        }
+        for state in stats["models"].values()
+    ])
+
+# =====================
+# JOURNAL STORE
+# =====================
+# Messages loaded per page, and how many the session keeps before trimming
+MESSAGES_PAGE_SIZE = 20
+MAX_SESSION_MESSAGES = 30
+
+@st.cache_resource
+def get_journal_store():
+    """Shared SQLite journal of every user's entries and comics"""
+    return JournalStore(os.getenv("COMIC_JOURNAL_DB", JOURNAL_DB_PATH))
+
+def is_minted_user_id(value):
+    """Whether ``value`` looks like an ID this app minted: a random uuid4 in lowercase hex"""
+    if not isinstance(value, str) or len(value) != 32:
+        return False
+    try:
+        minted = uuid.UUID(hex=value)
+    except ValueError:
+        return False
+    return minted.version == 4 and minted.hex == value
+
+def current_user_id():
+    """Anonymous journal ID, kept in the URL so a refresh or bookmark reopens the journal.
+
+    The ID is the only thing guarding a journal, so only unguessable IDs
+    minted here are accepted; anything else in ``?user=`` gets a new one.
+    """
+    if "user_id" not in st.session_state:
+        user_id = st.query_params.get("user")
+        if not is_minted_user_id(user_id):
+            if user_id:
+                logging.warning("Ignoring a journal ID the app did not mint")
+            user_id = uuid.uuid4().hex
+        st.query_params["user"] = user_id
+        st.session_state.user_id = user_id
+    return st.session_state.user_id
+
+def load_recent_messages():
+    """Load only the latest page of the current conversation into the session"""
+    store, user_id = get_journal_store(), current_user_id()
+    # Kept in the journal so a cleared chat stays cleared after a refresh or eviction
+    st.session_state.history_start = store.conversation_start(user_id)
+    st.session_state.messages = store.recent_messages(user_id, MESSAGES_PAGE_SIZE,
+                                                      since_id=st.session_state.history_start)
+    st.session_state.older_messages = []
+    # Earlier turns of the conversation go back into the summary when it's next needed,
+    # so loading the page doesn't wait on the LLM stack
+    st.session_state.pop("conversation_summary", None)
+    st.session_state.restore_summary = True
+
+def append_message(role, content):
+    """Save a chat message to the journal and add it to the conversation"""
+    st.session_state.messages.append(get_journal_store().add_message(current_user_id(), role, content))
+
+def oldest_loaded_id():
+    """ID of the earliest message on screen; older pages are fetched before it"""
+    for messages in (st.session_state.older_messages, st.session_state.messages):
+        if messages:
+            return messages[0]["id"]
+    return st.session_state.get("history_start")
+
+def load_older_messages():
+    """Prepend the previous page of the journal to the on-screen history"""
+    before_id = oldest_loaded_id()
+    if before_id is not None:
+        older = get_journal_store().recent_messages(current_user_id(), MESSAGES_PAGE_SIZE, before_id)
+        st.session_state.older_messages[:0] = older
+
+def show_older_messages():
+    """Earlier journal pages, fetched only when asked for"""
+    before_id = oldest_loaded_id()
+    if before_id is not None and get_journal_store().has_messages_before(current_user_id(), before_id):
+        st.button("⬆️ Load older messages", on_click=load_older_messages)
+    for msg in st.session_state.older_messages:
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
+
+def save_comic(store, user_id, result, entry_ids):
+    """Keep a finished comic in the journal next to the entries it came from"""
+    first_entry_id, last_entry_id = entry_ids
+    try:
+        store.add_comic(
+            user_id, result.style, result.panels, result.final_story, result.comic_prompt,
+            image=result.image if isinstance(result.image, bytes) else None,
+            image_url=result.image_url or (result.image if isinstance(result.image, str) else None),
+            first_entry_id=first_entry_id, last_entry_id=last_entry_id,
+        )
+    except sqlite3.Error as e:
+        logging.warning(f"Could not save comic to the journal: {e}")
+
+def chat_exporter():
+    """Export of this conversation since Clear Chat, read from the journal only when downloaded.
+
+    Starts at the saved start of the conversation, not at the first
+    message on screen, so trimmed and never-loaded turns are included.
+    """
+    store, user_id = get_journal_store(), current_user_id()
+    first_id = st.session_state.get("history_start") or 0
+    
+    def export():
+        return "\n".join(f"{m['role'].upper()}: {m['content']}" for m in store.messages_since(user_id, first_id))
+    return export
+
+# Largest journal the sidebar will export; Streamlit holds a download in memory while serving it
+EXPORT_MAX_BYTES = int(os.getenv("COMIC_JOURNAL_EXPORT_MAX_BYTES", 200 * 1024 * 1024))
+
+def journal_exporter(fmt):
+    """Whole-journal archive with comics, written to a temporary file only when downloaded.
+
+    The archive itself is written a day at a time, but Streamlit keeps
+    the finished download in memory, so the sidebar only offers journals
+    up to EXPORT_MAX_BYTES; larger ones export with journal_export.py.
+    """
+    store, user_id = get_journal_store(), current_user_id()
+    
+    def export():
+        with tempfile.NamedTemporaryFile(suffix=".zip", delete=False) as f:
+            path = f.name
+        try:
+            with open(path, "wb") as archive:
+                export_journal(store, user_id, archive, fmt)
+            with open(path, "rb") as archive:
+                return archive.read()
+        finally:
+            os.unlink(path)
+    return export
+
+def show_past_comics():
+    """The most recent comics from this journal"""
+    for comic in get_journal_store().recent_comics(current_user_id(), 3):
+        st.image(comic["image"] or comic["image_url"],
+                 caption=f"{comic['day']} · {comic['panels']}-panel {comic['style']}")
+
 # =====================
 # MEMORY MANAGEMENT
 # =====================
 def get_memory():
-    """Get or create conversation memory (session-specific)"""
+    """Get or create conversation memory (session-specific).
+
+    A plain buffer memory ignores ``max_token_limit``, so its budget is
+    enforced by ``manage_conversation_length`` instead.
+    """
     if 'conversation_memory' not in st.session_state:
+        from langchain.memory import ConversationBufferMemory
+
         st.session_state.conversation_memory = ConversationBufferMemory(
             memory_key="chat_history", 
             return_messages=True,
-            max_token_limit=2000  # Increased limit
         )
     return st.session_state.conversation_memory
 
+# Token budgets for conversation context in prompts
+CHAT_CONTEXT_TOKENS = 1200
+STORY_CONTEXT_TOKENS = 3000
+
+def get_conversation_summary():
+    """Get or create the rolling summaries of older turns, one per prompt budget (session-specific)"""
+    if 'conversation_summary' not in st.session_state:
+        summaries = SummaryPerBudget(
+            llm_summarizer(get_agent_registry().llm, limiter=get_rate_limiter()),
+            budgets=(CHAT_CONTEXT_TOKENS, STORY_CONTEXT_TOKENS),
+        )
+        if st.session_state.pop("restore_summary", False):
+            restore_conversation_summary(summaries)
+        st.session_state.conversation_summary = summaries
+    return st.session_state.conversation_summary
+
+def restore_conversation_summary(summaries):
+    """Fold the turns of the current conversation before the loaded page back into each summary.
+
+    Only the latest page is loaded after a refresh, so the turns before
+    it are read back from the journal. Each summary starts from the one
+    saved by the previous restore, so only newer turns need the LLM.
+    """
+    messages = st.session_state.messages
+    if not messages:
+        return
+    store, user_id = get_journal_store(), current_user_id()
+    first_id = st.session_state.get("history_start")
+    before_id = messages[0]["id"]
+    for budget in summaries.summaries:
+        summary, after_id = "", (first_id or 1) - 1
+        saved = store.saved_summary(user_id, budget)
+        if saved and saved[0] == first_id and saved[1] < before_id:
+            _, after_id, summary = saved
+        turns = store.iter_messages(user_id, MESSAGES_PAGE_SIZE, after_id=after_id, before_id=before_id)
+        through = []
+        
+        def batches():
+            while batch := list(itertools.islice(turns, MESSAGES_PAGE_SIZE)):
+                yield batch
+                through.append(batch[-1]["id"])
+        try:
+            summary = summaries.restore(budget, summary, batches())
+        except Exception as e:
+            logging.warning(f"Could not summarize earlier turns of the conversation: {e}")
+            continue
+        if through:
+            store.save_summary(user_id, budget, first_id, through[-1], summary)
+
+@st.cache_resource
+def get_session_memory():
+    """Process-wide accounting of what each session holds in RAM, with idle eviction"""
+    return SessionMemory(
+        token_budget=int(os.getenv("COMIC_JOURNAL_SESSION_TOKENS", DEFAULT_TOKEN_BUDGET)),
+        byte_budget=int(os.getenv("COMIC_JOURNAL_SESSION_BYTES", DEFAULT_BYTE_BUDGET)),
+        idle_after=float(os.getenv("COMIC_JOURNAL_IDLE_EVICT_SECONDS", 15 * 60)),
+    )
+
+@st.cache_resource
+def get_spill_store():
+    """Finished comic images, kept on disk rather than in job results"""
+    return SpillStore(os.getenv("COMIC_JOURNAL_SPILL_DIR", DEFAULT_SPILL_DIR))
+
+def track_session_memory():
+    """Measure this session's heavy state; returns True if it was evicted and has been reloaded"""
+    if "memory_session_id" not in st.session_state:
+        st.session_state.memory_session_id = uuid.uuid4().hex
+    job = current_comic_job()
+    evicted = get_session_memory().track(
+        st.session_state.memory_session_id,
+        f"{current_user_id()[:8]}/{st.session_state.memory_session_id[:4]}",
+        messages=st.session_state.messages,
+        older_messages=st.session_state.older_messages,
+        conversation_memory=st.session_state.get("conversation_memory"),
+        conversation_summary=st.session_state.get("conversation_summary"),
+        comic=job.result if job is not None else None,
+    )
+    if evicted:
+        # Cleared while idle: pick the conversation up again from the journal, with
+        # its earlier turns folded back into the summary rather than dropped
+        load_recent_messages()
+        st.session_state.pop("speculated_through", None)
+    return evicted
+
+def show_session_memory():
+    """Memory held by every session on this server; open with ?debug=1 on an admin server"""
+    if not debug_panels_open():
+        return
+    with st.expander("🧠 Session Memory"):
+        usage = get_session_memory().usage()
+        spill = get_spill_store().stats()
+        rss = f"{usage['rss'] / 2**20:.0f} MB" if usage["rss"] else "unknown"
+        st.caption(
+            f"{len(usage['sessions'])} sessions hold {usage['total_bytes'] / 2**20:.1f} MB "
+            f"and {usage['total_tokens']} tokens of conversation (process RSS {rss}). "
+            f"{usage['evictions']} idle sessions evicted ({usage['evicted_bytes'] / 2**20:.1f} MB), "
+            f"{usage['trimmed_messages']} messages dropped to stay in budget, "
+            f"{spill['spilled']} images ({spill['spilled_bytes'] / 2**20:.1f} MB) spilled to disk"
+        )
+        st.dataframe([
+            {"session": s["session"], "KB": round(s["bytes"] / 1024, 1), "tokens": s["tokens"],
+             "idle": f"{s['idle_seconds']:.0f}s", "evicted": s["evicted"]}
+            for s in usage["sessions"]
+        ])
+
 def manage_conversation_length():
-    """Keep conversation history manageable"""
-    if "messages" in st.session_state and len(st.session_state.messages) > 30:
-        # Keep last 20 messages to maintain context but limit memory usage
-        st.session_state.messages = st.session_state.messages[-20:]
-        st.info("💡 Conversation history trimmed to improve performance")
+    """Keep the session to the latest page and its token and byte budget.
+
+    Reruns then cost the same however long the journal is, and a few
+    very long messages can't grow the session without bound.
+    """
+    memory = get_session_memory()
+    if 'conversation_memory' in st.session_state:
+        trim_chat_memory(st.session_state.conversation_memory, memory.token_budget)
+    if "messages" not in st.session_state:
+        return
+    
+    # Loaded older pages go first; they can be fetched from the journal again
+    older = st.session_state.older_messages
+    if older:
+        excess = excess_messages(older + st.session_state.messages, memory.token_budget,
+                                 memory.byte_budget, keep=len(st.session_state.messages))
+        if excess:
+            del older[:excess]
+            memory.record_trim(excess)
+    
+    over_budget = excess_messages(st.session_state.messages, memory.token_budget, memory.byte_budget)
+    if len(st.session_state.messages) > MAX_SESSION_MESSAGES or over_budget:
+        # Older messages stay in the journal and live on in the summary for prompts
+        dropped = max(len(st.session_state.messages) - MESSAGES_PAGE_SIZE, over_budget)
+        try:
+            get_conversation_summary().drop_prefix(st.session_state.messages, dropped)
+        except Exception as e:
+            logging.warning(f"Keeping full history, summary unavailable: {e}")
+            return
+        st.session_state.messages = st.session_state.messages[dropped:]
+        st.session_state.older_messages = []
+        memory.record_trim(dropped)
+        st.info("💡 Older messages were folded into a summary; load them again from your journal any time")
+
+# =====================
+# PIPELINE TIMINGS
+# =====================
+def record_stage_timings(mode, timings):
+    """Remember the latest per-stage latencies for each pipeline mode"""
+    if "stage_timings" not in st.session_state:
+        st.session_state.stage_timings = {}
+    st.session_state.stage_timings[mode] = dict(timings, total=sum(timings.values()))
+    logging.info(f"Comic pipeline ({mode}) stage timings: "
+                 + ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in timings.items()))
+
+def show_stage_timings():
+    """Compare the most recent staged and fused runs side by side"""
+    stage_timings = st.session_state.get("stage_timings")
+    if not stage_timings:
+        return
+    with st.expander("⏱️ Pipeline Stage Timings"):
+        stages = ["fused", "story", "judge", "visual", "image", "total"]
+        st.table({
+            mode: {stage: f"{timings[stage]:.2f}s" if stage in timings else "—" for stage in stages}
+            for mode, timings in stage_timings.items()
+        })
 
 # =====================
 # ENHANCED AGENTS WITH ERROR HANDLING
 # =====================
 def create_agents():
-    """Create AI agents with error handling"""
+    """Get this session's AI agents from the shared registry with error handling"""
     try:
-        memory = get_memory()
-        
-        journal_agent = Agent(
-            role="Journal Buddy & Conversation Analyst",
-            goal="Engage users in meaningful conversation while analyzing emotional context",
-            backstory="""You are a warm, empathetic AI companion. Use step-by-step reasoning:
-            1. Analyze the emotional tone and context
-            2. Identify key details and events
-            3. Connect to previous conversations
-            4. Respond with appropriate empathy and questions
-            Keep responses concise but engaging.""",
-            llm=llm,
-            memory=memory,
-            allow_delegation=False,
-            verbose=False
-        )
-        
-        story_agent = Agent(
-            role="Story Weaver",
-            goal="Transform conversations into engaging narratives",
-            backstory="""Master storyteller who thinks systematically:
-            1. Extract main characters, setting, and events
-            2. Organize chronologically with clear structure
-            3. Add narrative flow while staying authentic
-            4. Create engaging but concise stories""",
-            llm=llm,
-            allow_delegation=False,
-            verbose=False
-        )
-        
-        judge_agent = Agent(
-            role="Content Quality Specialist",
-            goal="Ensure story quality and appropriateness",
-            backstory="""Quality control expert with systematic approach:
-            1. Check clarity and engagement
-            2. Review appropriateness for all audiences
-            3. Assess narrative flow and pacing
-            4. Provide specific improvements if needed""",
-            llm=llm,
-            allow_delegation=False,
-            verbose=False
-        )
-        
-        visual_agent = Agent(
-            role="Visual Prompt Creator",
-            goal="Create detailed comic strip prompts",
-            backstory="""Visual storytelling expert who plans systematically:
-            1. Break story into logical panel sequences
-            2. Design consistent characters and settings
-            3. Plan compelling compositions and angles
-            4. Integrate requested art style and tone
+        if "agents" not in st.session_state:
+            with st.spinner("🧠 Waking up the AI agents..."):
+                st.session_state.agents = get_agent_registry().session_agents(get_memory())
+        return st.session_state.agents
+    
+    except Exception as e:
+        st.error(f"⚠️ Failed to create AI agents: {str(e)}")
+        return None, None, None, None
+
+# =====================
+# JOURNAL CHAT
+# =====================
+def stream_journal_reply(user_input, context):
+    """Stream the journal reply into the page as tokens arrive.
+
+    Returns the full reply, or None if streaming failed and the caller
+    should fall back to the Crew path.
+    """
+    llm = get_agent_registry().llm
+    messages = journal_chat_messages(user_input, context)
+    start = time.perf_counter()
+    first_token_at = []
+
+    def tokens():
+        for chunk in llm.stream(messages):
+            if isinstance(chunk.content, str) and chunk.content:
+                if not first_token_at:
+                    first_token_at.append(time.perf_counter() - start)
+                yield chunk.content
+
+    placeholder = st.empty()
+    try:
+        with tracing.span("chat.stream", stage="chat") as chat_span, \
+                get_rate_limiter().slot("groq", "chat"), placeholder.container():
+            response = st.write_stream(tokens())
+            if first_token_at:
+                chat_span.set(first_token=first_token_at[0])
+            if isinstance(response, str):
+                chat_span.set(response_chars=len(response))
+    except Exception as e:
+        placeholder.empty()
+        logging.warning(f"Streaming reply failed, falling back to Crew: {e}")
+        return None
+
+    if not isinstance(response, str) or not response.strip():
+        placeholder.empty()
+        logging.warning("Streaming reply was empty, falling back to Crew")
+        return None
+
+    logging.info(f"Chat reply (stream): first token {first_token_at[0]:.2f}s, "
+                 f"total {time.perf_counter() - start:.2f}s")
+    return response
+
+def crew_journal_reply(journal_agent, user_input, context):
+    """Get the journal reply from a single-agent Crew run"""
+    # Try CrewAI first, fallback to direct LLM
+    try:
+        from crewai import Task, Crew
+
+        task = Task(
+            description=f"""
+            User's message: "{user_input}"
+            Recent context: {context}
             
-            Focus on creating detailed, specific visual descriptions that work well with image generation AI.""",
-            llm=llm,
-            allow_delegation=False,
-            verbose=False
+            Respond step-by-step:
+            1. What emotion/tone do I detect?
+            2. What key details should I remember?
+            3. How does this connect to our conversation?
+            4. What's the most engaging response?
+            
+            Keep response warm, concise (2-3 sentences), and encouraging.
+            """,
+            agent=journal_agent,
+            expected_output="A warm, engaging response that encourages further conversation"
         )
         
-        return journal_agent, story_agent, judge_agent, visual_agent
+        crew = Crew(agents=[journal_agent], tasks=[task], verbose=False)
+        result = get_rate_limiter().call("groq", "chat", crew.kickoff)
+        return str(result) if result is not None else "I'm having trouble responding right now. Could you try again?"
     
+    except Exception as crew_error:
+        st.warning("Using alternative response method...")
+        # Fallback to direct LLM call
+        fallback_prompt = f"""
+        You are a warm, empathetic AI companion helping someone journal about their day.
+        
+        User said: "{user_input}"
+        Recent conversation: {context}
+        
+        Respond warmly and encourage them to share more. Keep it to 2-3 sentences.
+        """
+        return direct_llm_response(fallback_prompt)
+
+def direct_llm_response(prompt):
+    """Plain LLM reply for when the Crew run fails"""
+    try:
+        with tracing.span("chat.direct", stage="chat") as chat_span:
+            response = get_rate_limiter().call("groq", "chat", get_agent_registry().llm.invoke, prompt)
+            text = str(getattr(response, "content", response)).strip()
+            chat_span.set(response_chars=len(text))
     except Exception as e:
-        st.error(f"⚠️ Failed to create AI agents: {str(e)}")
-        return None, None, None, None
+        logging.error(f"Direct LLM reply failed: {e}")
+        return "I'm having trouble responding right now. Could you try again?"
+    return text or "I'm having trouble responding right now. Could you try again?"
 
 # =====================
 # MAIN APPLICATION
 # =====================
+@timed_interaction("page")
 def main():
     # Header
     st.markdown('<h1 class="main-header">📖 AI Comic Journal</h1>', unsafe_allow_html=True)
@@ -329,33 +954,60 @@ def main():
     
     # Initialize session state
     if "messages" not in st.session_state:
-        st.session_state.messages = []
+        load_recent_messages()
     if "processing" not in st.session_state:
         st.session_state.processing = False
     
-    # Create agents
-    journal_agent, story_agent, judge_agent, visual_agent = create_agents()
-    if not all([journal_agent, story_agent, judge_agent, visual_agent]):
-        st.error("Failed to initialize AI agents. Please refresh the page.")
-        return
+    # Chat, comic and sidebar each rerun on their own interactions
+    chat_section()
+    
+    # Agents load on first use; warm them up while the user is typing
+    start_agent_warmup()
+    configure_tracing()
+    
+    st.markdown("---")
+    comic_section()
+    show_debug_panel()
+    show_session_memory()
+    
+    with st.sidebar:
+        sidebar_section()
     
-    # Manage conversation length
+    log_startup_timing("page rendered")
+
+@st.fragment
+@timed_interaction("chat")
+def chat_section():
+    """Conversation and chat input; a chat turn reruns only this section"""
+    if track_session_memory():
+        st.rerun()  # Redraw every section from the reloaded conversation
     manage_conversation_length()
     
     # Main chat interface
     st.subheader("💬 Chat About Your Day")
+    # Counted here rather than in the sidebar, which a chat turn doesn't rerun
+    message_count = st.empty()
+    show_message_count(message_count)
     
-    # Display conversation
+    # Display conversation, with earlier journal pages on demand
+    show_older_messages()
     for msg in st.session_state.messages:
         with st.chat_message(msg["role"]):
             st.markdown(msg["content"])
+    log_startup_timing("chat UI rendered")
     
     # User input
+    messages_before = len(st.session_state.messages)
     if user_input := st.chat_input("Tell me about your day...", disabled=st.session_state.processing):
         if not check_rate_limit():
             return
+        
+        journal_agent = create_agents()[0]
+        if journal_agent is None:
+            st.error("Failed to initialize AI agents. Please refresh the page.")
+            return
             
-        st.session_state.messages.append({"role": "user", "content": user_input})
+        append_message("user", user_input)
         
         with st.chat_message("user"):
             st.markdown(user_input)
@@ -365,60 +1017,53 @@ def main():
             try:
                 st.session_state.processing = True
                 
-                with st.spinner("🤔 Thinking about your message..."):
-                    # Create task with conversation context
-                    context = "\n".join([f"{m['role']}: {m['content']}" 
-                                       for m in st.session_state.messages[-5:]])  # Last 5 messages
-                    
-                    # Try CrewAI first, fallback to direct LLM
-                    try:
-                        task = Task(
-                            description=f"""
-                            User's message: "{user_input}"
-                            Recent context: {context}
-                            
-                            Respond step-by-step:
-                            1. What emotion/tone do I detect?
-                            2. What key details should I remember?
-                            3. How does this connect to our conversation?
-                            4. What's the most engaging response?
-                            
-                            Keep response warm, concise (2-3 sentences), and encouraging.
-                            """,
-                            agent=journal_agent,
-                            expected_output="A warm, engaging response that encourages further conversation"
-                        )
-                        
-                        crew = Crew(agents=[journal_agent], tasks=[task], verbose=False)
-                        result = crew.kickoff()
-                        response = str(result) if result is not None else "I'm having trouble responding right now. Could you try again?"
-                    
-                    except Exception as crew_error:
-                        st.warning("Using alternative response method...")
-                        # Fallback to direct LLM call
-                        fallback_prompt = f"""
-                        You are a warm, empathetic AI companion helping someone journal about their day.
-                        
-                        User said: "{user_input}"
-                        Recent conversation: {context}
-                        
-                        Respond warmly and encourage them to share more. Keep it to 2-3 sentences.
-                        """
-                        response = direct_llm_response(fallback_prompt)
-                    
+                # Create task with conversation context
+                context = get_conversation_summary().build(st.session_state.messages, CHAT_CONTEXT_TOKENS)
+                
+                response = None
+                if st.session_state.get("stream_replies", True):
+                    response = stream_journal_reply(user_input, context)
+                
+                if response is None:
+                    start = time.perf_counter()
+                    with st.spinner("🤔 Thinking about your message..."), \
+                            tracing.span("chat.crew", stage="chat") as chat_span:
+                        response = crew_journal_reply(journal_agent, user_input, context)
+                        chat_span.set(response_chars=len(response))
                     st.markdown(response)
-                    st.session_state.messages.append({"role": "assistant", "content": response})
+                    elapsed = time.perf_counter() - start
+                    logging.info(f"Chat reply (crew): first token {elapsed:.2f}s, total {elapsed:.2f}s")
+                
+                append_message("assistant", response)
                     
             except Exception as e:
                 error_msg = f"⚠️ Sorry, I encountered an error: {str(e)}"
                 st.error(error_msg)
-                st.session_state.messages.append({"role": "assistant", "content": "I'm having some technical difficulties. Please try again."})
+                append_message("assistant", "I'm having some technical difficulties. Please try again.")
                 logging.error(f"Chat error: {str(e)}")
             finally:
                 st.session_state.processing = False
     
-    # Comic generation section
-    st.markdown("---")
+    # Get a head start on the story while the user reads the reply
+    speculate_story()
+    show_message_count(message_count)
+    
+    # The comic section only offers a comic once there's enough conversation,
+    # and the sidebar only offers the chat export once there is any
+    messages_after = len(st.session_state.messages)
+    if messages_before < 4 <= messages_after or messages_before == 0 < messages_after:
+        st.rerun()
+
+def show_message_count(placeholder):
+    count = len(st.session_state.messages)
+    placeholder.caption(f"{count} message{'' if count == 1 else 's'} in this conversation")
+
+@st.fragment
+@timed_interaction("comic")
+def comic_section():
+    """Comic preferences, generation and results; changing them leaves the chat alone"""
+    if track_session_memory():
+        st.rerun()
     st.subheader("🎨 Create Your Comic Strip")
     
     # Preferences
@@ -454,191 +1099,320 @@ def main():
     with col3:
         panels = st.slider("📱 Panels:", 1, 6, 3, help="More panels = more detailed story")
     
+    pipeline_mode = st.radio(
+        "⚡ Pipeline:",
+        ["staged", "fused"],
+        format_func={
+            "staged": "Step by step (story → review → visual)",
+            "fused": "Fused (one LLM call)",
+        }.get,
+        horizontal=True,
+        key="pipeline_mode",
+        on_change=stop_speculating,
+        help="Fused mode writes, reviews and designs the comic in a single call and falls back to step by step if needed",
+    )
+    reuse_results = st.toggle(
+        "♻️ Reuse previous results",
+        value=False,
+        key="reuse_results",
+        on_change=restart_speculating,
+        help="Skip stages whose inputs haven't changed, e.g. keep the story when only the art style changes, "
+             "and start from a past comic made from a very similar conversation",
+    )
+    st.toggle(
+        "🔮 Prepare the story while I chat",
+        value=False,
+        key="speculate",
+        on_change=stop_speculating,
+        help=f"From {SPECULATE_AFTER_MESSAGES} messages on, write and review the story in the background "
+             "after each message so the comic only needs its art; uses extra LLM calls (step by step mode only)",
+    )
+    separate_panels = st.toggle(
+        "🧩 Draw panels separately",
+        value=False,
+        help="Render each panel as its own image at the same time and lay them out locally; "
+             "crisper panel borders, and one panel can be redrawn on its own",
+    )
+    
+    comic_job = current_comic_job()
+    job_running = comic_job is not None and comic_job.active
+    
     # Generate comic button
     if len(st.session_state.messages) >= 4:  # Need some conversation
-        if st.button("✨ Generate My Comic Strip", type="primary", disabled=st.session_state.processing):
+        if st.button("✨ Generate My Comic Strip", type="primary",
+                     disabled=st.session_state.processing or job_running):
             if not check_rate_limit():
                 return
+            
+            _, story_agent, judge_agent, visual_agent = create_agents()
+            if not all([story_agent, judge_agent, visual_agent]):
+                st.error("Failed to initialize AI agents. Please refresh the page.")
+                return
                 
-            generate_comic(story_agent, judge_agent, visual_agent, style, tone, panels)
+            generate_comic(story_agent, judge_agent, visual_agent, style, tone, panels, pipeline_mode,
+                           reuse_results, "panels" if separate_panels else "strip")
+            st.rerun()  # Disable the button while the job runs
     else:
         st.info("💬 Chat with me more to build a story for your comic!")
     
-    # Sidebar with info and controls
-    with st.sidebar:
-        st.markdown("## 📊 Session Stats")
-        st.metric("Messages", len(st.session_state.messages))
-        
-        st.markdown("## 🛠️ Controls")
-        
-        if st.button("🗑️ Clear Chat", help="Start a new conversation"):
-            st.session_state.messages = []
-            if 'conversation_memory' in st.session_state:
-                st.session_state.conversation_memory.clear()
-            st.rerun()
-        
-        if st.session_state.messages:
-            chat_export = "\n".join([f"{m['role'].upper()}: {m['content']}" 
-                                   for m in st.session_state.messages])
-            st.download_button(
-                "📄 Export Chat",
-                data=chat_export,
-                file_name=f"comic_journal_{time.strftime('%Y%m%d_%H%M%S')}.txt",
-                mime="text/plain"
-            )
-        
-        st.markdown("## 💡 Tips")
-        st.info("""
-        - Share specific details about your day
-        - Mention emotions and reactions  
-        - Include interesting people or situations
-        - The more you share, the better your comic!
-        """)
-        
-        st.markdown("## 🔗 Links")
-        st.markdown("- [Report Issues](https://github.com/yourusername/ai-comic-journal/issues)")
-        st.markdown("- [View Source](https://github.com/yourusername/ai-comic-journal)")
+    if job_running:
+        follow_comic_job()
+    elif comic_job is not None:
+        show_comic_job(comic_job)
+    
+    show_stage_timings()
 
-def generate_comic(story_agent, judge_agent, visual_agent, style, tone, panels):
-    """Generate comic strip from conversation using Fireworks AI"""
+@st.fragment
+@timed_interaction("sidebar")
+def sidebar_section():
+    """Stats and controls; refreshed with the page and by its own controls"""
+    if track_session_memory():
+        st.rerun()
+    st.markdown("## 📊 Session Stats")
+    cache_stats = get_image_cache().stats()
+    col_hits, col_misses = st.columns(2)
+    col_hits.metric("Image cache hits", cache_stats["hits"])
+    col_misses.metric("Image cache misses", cache_stats["misses"])
+    llm_cache_stats = get_llm_cache().stats()
+    if llm_cache_stats:
+        st.caption("♻️ Stage cache hit rate: " + " · ".join(
+            f"{stage} {counts['hit_rate']:.0%}" for stage, counts in llm_cache_stats.items()
+        ))
+    show_speculation_stats()
+    show_similarity_stats()
+    
+    show_rate_limits()
+    
+    st.markdown("## 🛠️ Controls")
+    
+    st.toggle("⚡ Stream replies", value=True, key="stream_replies",
+              help="Show the reply word by word as it's written")
+    
+    if st.button("🗑️ Clear Chat", help="Start a new conversation; earlier entries stay in your journal"):
+        st.session_state.history_start = get_journal_store().start_conversation(current_user_id())
+        st.session_state.messages = []
+        st.session_state.older_messages = []
+        if 'conversation_memory' in st.session_state:
+            st.session_state.conversation_memory.clear()
+        st.session_state.pop('conversation_summary', None)
+        st.session_state.pop("restore_summary", None)
+        get_story_speculator().discard()
+        st.session_state.pop("speculated_through", None)
+        st.rerun()
+    
+    if st.session_state.messages:
+        st.download_button(
+            "📄 Export Chat",
+            data=chat_exporter(),
+            file_name=f"comic_journal_{time.strftime('%Y%m%d_%H%M%S')}.txt",
+            mime="text/plain"
+        )
+    
+    st.markdown("## 📚 Journal")
+    export_format = st.selectbox(
+        "📦 Journal export format",
+        EXPORT_FORMATS,
+        format_func={"zip": "Markdown and images", "html": "Web pages"}.get,
+        help="Every entry and comic in your journal, with each comic's story and prompt",
+    )
+    if get_journal_store().journal_bytes(current_user_id()) <= EXPORT_MAX_BYTES:
+        st.download_button(
+            "📦 Export Journal",
+            data=journal_exporter(export_format),
+            file_name=f"comic_journal_{'pages_' if export_format == HTML_EXPORT else ''}"
+                      f"{time.strftime('%Y%m%d_%H%M%S')}.zip",
+            mime="application/zip",
+        )
+    else:
+        st.caption(f"📦 Your journal is over {EXPORT_MAX_BYTES / 2**20:.0f} MB; export it with "
+                   "`python journal_export.py` on the server")
+    if st.toggle("🖼️ Show past comics", value=False):
+        show_past_comics()
+    
+    st.markdown("## 💡 Tips")
+    st.info("""
+    - Share specific details about your day
+    - Mention emotions and reactions  
+    - Include interesting people or situations
+    - The more you share, the better your comic!
+    """)
+    
+    st.markdown("## 🔗 Links")
+    st.markdown("- [Report Issues](https://github.com/yourusername/ai-comic-journal/issues)")
+    st.markdown("- [View Source](https://github.com/yourusername/ai-comic-journal)")
+
+def generate_comic(story_agent, judge_agent, visual_agent, style, tone, panels, pipeline_mode="staged",
+                   reuse_results=False, layout="strip"):
+    """Submit a background job that turns the conversation into a comic strip"""
     try:
-        st.session_state.processing = True
-        progress_bar = st.progress(0)
-        
-        # Step 1: Create story (25%)
-        with st.spinner("📝 Crafting your story..."):
-            conversation_text = "\n".join([f"{m['role']}: {m['content']}" 
-                                         for m in st.session_state.messages])
-            
-            story_task = Task(
-                description=f"""
-                Conversation: {conversation_text}
-                
-                Create story systematically:
-                1. Extract key characters, events, emotions
-                2. Organize chronologically  
-                3. Add narrative structure (beginning, middle, end)
-                4. Keep it concise but engaging (2-3 sentences)
-                
-                Focus on the most interesting or emotional moments.
-                """,
-                agent=story_agent,
-                expected_output="A concise, engaging story capturing the conversation's essence"
-            )
-            
-            story_crew = Crew(agents=[story_agent], tasks=[story_task], verbose=False)
-            result = story_crew.kickoff()
-            story = str(result) if result is not None else "A day filled with interesting moments and conversations."
-            progress_bar.progress(25)
-        
-        # Step 2: Quality check (50%)
-        with st.spinner("🔍 Polishing the narrative..."):
-            judge_task = Task(
-                description=f"""
-                Story: {story}
-                
-                Quality review process:
-                1. Is it clear and engaging?
-                2. Appropriate for all audiences?
-                3. Good narrative flow?
-                4. Any improvements needed?
-                
-                Provide enhanced version if needed, otherwise approve as-is.
-                """,
-                agent=judge_agent,
-                expected_output="Final polished story or approval of current version"
-            )
-            
-            judge_crew = Crew(agents=[judge_agent], tasks=[judge_task], verbose=False)
-            result = judge_crew.kickoff()
-            final_story = str(result) if result is not None else story
-            progress_bar.progress(50)
+        import comic_pipeline as pipeline
+
+        registry = get_agent_registry()
+        memo = get_llm_cache().bind(registry.model, registry.temperature, reuse=reuse_results,
+                                    answering_models=registry.answering_models)
+        conversation_text = get_conversation_summary().build(st.session_state.messages, STORY_CONTEXT_TOKENS)
+        client = get_fireworks_client()
+        image_cache = get_image_cache()
+        limiter = get_rate_limiter()
+        store, user_id = get_journal_store(), current_user_id()
+        messages = st.session_state.messages
+        entry_ids = (messages[0]["id"], messages[-1]["id"])
+        speculator = get_story_speculator() if speculation_enabled() else None
+        spill_store = get_spill_store()
+        similarity_index = get_similarity_index()
         
-        # Step 3: Create visual prompt (75%)
-        with st.spinner("🎨 Designing your comic..."):
-            visual_task = Task(
-                description=f"""
-                Story: {final_story}
-                Style: {style}
-                Tone: {tone}
-                Panels: {panels}
-                
-                Visual planning for comic strip generation:
-                1. Create a {panels}-panel comic strip layout
-                2. Describe consistent characters throughout all panels
-                3. Plan clear sequential storytelling
-                4. Integrate {style} aesthetic with {tone} mood
-                5. Ensure each panel shows clear action/emotion
-                6. Include speech bubbles or thought bubbles where appropriate
-                
-                Create a detailed, specific prompt that will generate a high-quality comic strip.
-                Focus on visual storytelling elements like character expressions, panel composition, and scene setting.
-                """,
-                agent=visual_agent,
-                expected_output=f"Detailed visual prompt for {panels}-panel comic strip generation"
+        def work(job):
+            draft = visual_draft = None
+            if speculator is not None:
+                job.report("story", 0, "🔮 Picking up the story written while you chatted...")
+                draft = speculator.take(conversation_text)
+            if draft is None and reuse_results:
+                draft, visual_draft = reuse_similar_comic(
+                    similarity_index, user_id, conversation_text, style, tone, panels, layout, job.report
+                )
+            result = pipeline.run_comic_pipeline(
+                story_agent, judge_agent, visual_agent, registry.llm, client, image_cache,
+                conversation_text, style, tone, panels, mode=pipeline_mode, memo=memo, report=job.report,
+                limiter=limiter, layout=layout, draft=draft, visual_draft=visual_draft,
             )
-            
-            visual_crew = Crew(agents=[visual_agent], tasks=[visual_task], verbose=False)
-            result = visual_crew.kickoff()
-            comic_prompt = str(result) if result is not None else f"A {panels}-panel {style} comic strip about daily life"
-            progress_bar.progress(75)
-        
-        # Step 4: Generate image with Fireworks AI (100%)
-        with st.spinner("🖼️ Bringing your comic to life..."):
-            # Enhance the prompt for better comic generation
-            enhanced_prompt = f"""
-            {comic_prompt}
-            
-            High quality comic strip illustration, {panels} panels arranged horizontally or in a grid layout, 
-            clear panel borders, consistent character design throughout all panels, 
-            professional comic book illustration style, vibrant colors, detailed artwork,
-            speech bubbles with readable text, dynamic compositions, expressive characters.
-            """
-            
-            img_url = generate_image_with_fireworks(enhanced_prompt)
-            progress_bar.progress(100)
-        
-        if img_url:
-            # Display results
-            st.success("🎉 Your comic strip is ready!")
-            
-            # Show story
-            with st.expander("📖 Your Story"):
-                st.write(final_story)
-            
-            # Show the visual prompt used
-            with st.expander("🎨 Visual Prompt Used"):
-                st.write(comic_prompt)
-            
-            # Display comic
-            if img_url.startswith("data:image"):
-                # Base64 encoded image
-                st.image(img_url, caption=f"Your {panels}-panel {style} comic strip")
-            else:
-                # URL to image
-                st.image(img_url, caption=f"Your {panels}-panel {style} comic strip")
-                st.markdown(f"[🔥 Download Comic]({img_url})")
-            
-            # Store for potential sharing
-            st.session_state.comic_url = img_url
-            
-            # Option to regenerate with same story
-            if st.button("🔄 Generate Another Version", help="Same story, new visual interpretation"):
-                # Regenerate with slightly modified prompt
-                varied_prompt = f"{enhanced_prompt} Alternative visual interpretation, different camera angles and compositions."
-                new_img_url = generate_image_with_fireworks(varied_prompt)
-                if new_img_url:
-                    st.image(new_img_url, caption="Alternative version of your comic")
-        else:
-            st.error("Failed to generate comic. Please try again.")
+            save_comic(store, user_id, result, entry_ids)
+            index_comic(similarity_index, user_id, conversation_text, tone, result)
+            return spill_image(spill_store, result)
         
+        # A double click or a second tab with the same request joins the running job
+        key = job_key("comic", user_id, conversation_text, style, tone, panels, pipeline_mode, reuse_results, layout)
+        job = get_job_engine().submit(work, describe_error=describe_generation_error, key=key, owner=user_id)
+        attach_comic_job(job.job_id)
+    
     except Exception as e:
-        st.error(f"⚠️ Comic generation failed: {str(e)}")
+        st.error(describe_generation_error(e))
         st.info("💡 Please try again in a moment or check if your conversation is detailed enough.")
         logging.error(f"Comic generation error: {str(e)}")
+
+def generate_another_version(result, panel=None):
+    """Submit a job that re-renders the same story with a varied prompt.
+
+    For a comic drawn panel by panel, ``panel`` (0-based) redraws only
+    that panel; the others come back from the image cache.
+    """
+    import dataclasses
+    import comic_pipeline as pipeline
+
+    client = get_fireworks_client()
+    image_cache = get_image_cache()
+    spill_store = get_spill_store()
+    store, user_id = get_journal_store(), current_user_id()
+    messages = st.session_state.messages
+    entry_ids = (messages[0]["id"], messages[-1]["id"]) if messages else (None, None)
+    # Regenerate with slightly modified prompt
+    varied_prompt = pipeline.vary_prompt(result.image_prompt, result.variation + 1)
     
-    finally:
-        st.session_state.processing = False
+    def work(job):
+        job.report("image", 75, "🖼️ Bringing your comic to life...")
+        with tracing.span("comic.regenerate", layout=result.layout) as regenerate_span:
+            if result.layout == pipeline.PANELS:
+                indexes = [panel] if panel is not None else range(len(result.panel_prompts))
+                panel_prompts, image, image_note = pipeline.redo_panels(
+                    client, image_cache, result, indexes, report=job.report
+                )
+                changes = {"image": image, "image_url": None, "image_note": image_note,
+                           "panel_prompts": panel_prompts, "image_prompt": "\n".join(panel_prompts)}
+            else:
+                image, image_url, image_note = pipeline.generate_image_with_fireworks(
+                    client, image_cache, varied_prompt,
+                    on_poll=lambda polls, elapsed: job.report(
+                        "image", 75, f"⏳ Generating image... (check {polls}, {elapsed:.0f}s)"
+                    ),
+                )
+                changes = {"image": image, "image_url": image_url, "image_note": image_note,
+                           "image_prompt": varied_prompt}
+        result_version = dataclasses.replace(result, timings={}, trace_id=regenerate_span.trace_id,
+                                             variation=result.variation + 1, **changes)
+        save_comic(store, user_id, result_version, entry_ids)
+        return spill_image(spill_store, result_version)
+    
+    key = job_key("another", user_id, result.trace_id, result.image_prompt, panel)
+    job = get_job_engine().submit(work, describe_error=describe_generation_error, key=key, owner=user_id)
+    attach_comic_job(job.job_id)
+
+@st.fragment(run_every=1)
+def follow_comic_job():
+    """Progress of the running job, refreshed every second without rerunning the page.
+
+    The job keeps going even if this session goes away.
+    """
+    job = current_comic_job()
+    if job is None or not job.active:
+        st.rerun()  # Show the outcome with the rest of the page
+    state = job.snapshot()
+    st.progress(state["progress"], text=state["message"])
+
+def show_comic_job(job):
+    """Show the outcome of the finished job this session is following"""
+    state = job.snapshot()
+    
+    if state["error"]:
+        st.error(state["error"])
+        st.info("💡 Please try again in a moment or check if your conversation is detailed enough.")
+        return
+    
+    result = state["result"]
+    if st.session_state.get("timed_job") != job.job_id:
+        st.session_state.timed_job = job.job_id
+        if result.timings:
+            record_stage_timings(result.mode, result.timings)
+        if result.trace_id:
+            st.session_state.comic_trace_id = result.trace_id
+    
+    # Display results
+    st.success("🎉 Your comic strip is ready!")
+    st.caption(result.image_note)
+    
+    # Show story
+    with st.expander("📖 Your Story"):
+        st.write(result.final_story)
+    
+    # Show the visual prompt used
+    with st.expander("🎨 Visual Prompt Used"):
+        st.write(result.comic_prompt)
+    
+    # Display comic from the raw image bytes, read back from disk if they were spilled
+    try:
+        image = load_image(result.image)
+    except OSError:
+        st.warning("🧹 This comic's image was cleared from the server; find it under past comics in the sidebar")
+        image = None
+    if image is not None:
+        st.image(image, caption=f"Your {result.panels}-panel {result.style} comic strip")
+    if isinstance(result.image, (bytes, SpilledImage)):
+        if image is not None:
+            st.download_button(
+                "🔥 Download Comic",
+                data=functools.partial(load_image, result.image),
+                file_name=f"comic_{job.job_id[:8]}.jpg",
+                mime="image/jpeg",
+            )
+    else:
+        # URL to image
+        st.markdown(f"[🔥 Download Comic]({result.image})")
+    
+    # Store for potential sharing (the image itself stays on disk or in the job result)
+    st.session_state.comic_url = result.image_url
+    
+    # Option to regenerate with same story
+    if st.button("🔄 Generate Another Version", help="Same story, new visual interpretation"):
+        if check_rate_limit():
+            generate_another_version(result)
+            st.rerun()
+    
+    if result.layout == "panels":
+        col_panel, col_redo = st.columns([2, 1])
+        panel = col_panel.selectbox("Panel", range(len(result.panel_prompts)),
+                                    format_func=lambda i: f"Panel {i + 1}", label_visibility="collapsed")
+        if col_redo.button("🎯 Redraw This Panel", help="Only this panel is regenerated"):
+            if check_rate_limit():
+                generate_another_version(result, panel=panel)
+                st.rerun()
 
 # =====================
 # RUN APP
@@ -0,0 +1,656 @@
+"""Story, review, visual and image stages of the comic pipeline, free of Streamlit.
+
+Two modes produce the same outputs. The staged mode runs the story,
+judge and visual agents as three sequential Crew kickoffs. The fused
+mode asks the LLM for all three in one structured call and is validated
+against ``ComicPlan``; callers fall back to the staged mode when it
+can't be parsed. ``run_comic_pipeline`` chains the stages with the
+Fireworks image generation and reports progress through a callback.
+
+The visual stage and the fused call answer with separate fields
+(characters, setting, per-panel action, look), which ``prompt_compiler`` packs into the image
+model's token budget by priority.
+
+The image is either one Fireworks generation of the whole strip, or,
+in the panels layout, one generation per panel run concurrently and
+composited locally; each panel is cached on its own, so redoing one
+panel reuses the rest.
+"""
+import binascii
+import contextvars
+import json
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Literal
+
+import requests
+from pydantic import BaseModel, ValidationError
+
+from conversation_summary import count_tokens
+from fireworks_client import FireworksError
+from prompt_compiler import (
+    FUSED_MAX_TOKENS, IMAGE_PROMPT_TOKENS, compile_panel_prompt, compile_strip_prompt, fit_prompt, vary_prompt,
+)
+from tracing import span
+
+STAGED = "staged"
+FUSED = "fused"
+
+STRIP = "strip"
+PANELS = "panels"
+
+
+class FusedPlanError(Exception):
+    """Raised when the fused LLM call doesn't return a valid ComicPlan"""
+
+
+class PanelPlanError(Exception):
+    """Raised when the visual stage doesn't describe the requested panels"""
+
+
+class ImageStageError(FireworksError):
+    """Raised when Fireworks finishes but returns no usable image"""
+
+
+class ComicPlan(BaseModel):
+    """Everything the image stage needs, as returned by the fused call.
+
+    The visual plan comes field by field, as from the visual stage.
+    """
+    story: str
+    verdict: Literal["approved", "revised"]
+    final_story: str
+    characters: str = ""
+    setting: str = ""
+    panels: list[str]
+    look: str = ""
+    panel_prompts: list[str] = []
+
+    def visual_spec(self, panels):
+        """The plan's visual fields as a ``VisualSpec`` of at most ``panels`` panels"""
+        return VisualSpec(characters=self.characters, setting=self.setting,
+                          panels=self.panels[:panels], look=self.look)
+
+
+class PanelPlan(BaseModel):
+    """Per-panel scene descriptions plus the characters they share"""
+    characters: str
+    panels: list[str]
+
+
+class VisualSpec(BaseModel):
+    """The visual stage's plan for a whole strip, field by field.
+
+    ``scene`` holds a free-text description when the answer wasn't
+    structured.
+    """
+    characters: str = ""
+    setting: str = ""
+    panels: list[str] = []
+    look: str = ""
+    scene: str = ""
+
+
+@contextmanager
+def timed(timings, stage):
+    """Record how long the wrapped block took under ``timings[stage]``"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
+
+
+def build_conversation_text(messages):
+    """Flatten chat messages into the transcript the story stage reads"""
+    return "\n".join([f"{m['role']}: {m['content']}" for m in messages])
+
+
+def _limited(limiter, stage, fn):
+    """Wrap ``fn`` so it runs inside the limiter's Groq slot for ``stage``"""
+    if limiter is None:
+        return fn
+    return lambda: limiter.call("groq", stage, fn)
+
+
+def _kickoff(agent, description, expected_output, stage=None, memo=None, limiter=None):
+    """Run one single-task Crew, through ``memo(stage, prompt, compute)`` if given"""
+    def kickoff():
+        from crewai import Task, Crew
+
+        task = Task(description=description, agent=agent, expected_output=expected_output)
+        crew = Crew(agents=[agent], tasks=[task], verbose=False)
+        result = crew.kickoff()
+        return str(result) if result is not None else None
+
+    compute = _limited(limiter, stage, kickoff)
+
+    with span("crew.kickoff", stage=stage, prompt_chars=len(description),
+              prompt_tokens=count_tokens(description)) as kickoff_span:
+        if memo is None:
+            kickoff_span.set(cache="off")
+            result = compute()
+        else:
+            result = memo(stage, f"{agent.role}\n{agent.backstory}\n{description}\n{expected_output}", compute)
+        if result is not None:
+            kickoff_span.set(response_chars=len(result), response_tokens=count_tokens(result))
+    return result
+
+
+def run_story_stage(story_agent, conversation_text, memo=None, limiter=None):
+    """Turn the conversation into a short story"""
+    result = _kickoff(
+        story_agent,
+        f"""
+                Conversation: {conversation_text}
+
+                Create story systematically:
+                1. Extract key characters, events, emotions
+                2. Organize chronologically
+                3. Add narrative structure (beginning, middle, end)
+                4. Keep it concise but engaging (2-3 sentences)
+
+                Focus on the most interesting or emotional moments.
+                """,
+        "A concise, engaging story capturing the conversation's essence",
+        stage="story",
+        memo=memo,
+        limiter=limiter,
+    )
+    return result if result is not None else "A day filled with interesting moments and conversations."
+
+
+def run_judge_stage(judge_agent, story, memo=None, limiter=None):
+    """Review the story and return the approved or improved version"""
+    result = _kickoff(
+        judge_agent,
+        f"""
+                Story: {story}
+
+                Quality review process:
+                1. Is it clear and engaging?
+                2. Appropriate for all audiences?
+                3. Good narrative flow?
+                4. Any improvements needed?
+
+                Provide enhanced version if needed, otherwise approve as-is.
+                """,
+        "Final polished story or approval of current version",
+        stage="judge",
+        memo=memo,
+        limiter=limiter,
+    )
+    return result if result is not None else story
+
+
+def _words_per_panel(panels):
+    """Word allowance per panel description that keeps a strip near the image prompt budget"""
+    return max(15, IMAGE_PROMPT_TOKENS // 2 // max(1, panels))
+
+
+def run_visual_stage(visual_agent, final_story, style, tone, panels, memo=None, limiter=None):
+    """Plan the comic strip field by field for the prompt compiler"""
+    result = _kickoff(
+        visual_agent,
+        f"""
+                Story: {final_story}
+                Style: {style}
+                Tone: {tone}
+                Panels: {panels}
+
+                Visual planning for comic strip generation:
+                1. Create a {panels}-panel comic strip layout
+                2. Describe consistent characters throughout all panels
+                3. Plan clear sequential storytelling
+                4. Integrate {style} aesthetic with {tone} mood
+                5. Ensure each panel shows clear action/emotion
+                6. Include speech bubbles or thought bubbles where appropriate
+
+                Be specific and brief; the image model only reads about {IMAGE_PROMPT_TOKENS} tokens.
+                Answer with a single JSON object, nothing else:
+                {{"characters": "what each recurring character looks like, at most 40 words",
+                  "setting": "where it happens, at most 20 words",
+                  "panels": ["panel 1 action, expressions and any bubble text, at most {_words_per_panel(panels)} words", ...],
+                  "look": "how the {style} style and {tone} mood show, at most 20 words"}}
+                """,
+        f"JSON with characters, setting, look and exactly {panels} panel actions",
+        stage="visual",
+        memo=memo,
+        limiter=limiter,
+    )
+    if result is None:
+        return VisualSpec(scene=f"A {panels}-panel {style} comic strip about daily life")
+    return parse_visual_spec(result, panels)
+
+
+def run_panel_stage(visual_agent, final_story, style, tone, panels, memo=None, limiter=None):
+    """Plan the comic panel by panel; raises PanelPlanError if the plan doesn't fit"""
+    result = _kickoff(
+        visual_agent,
+        f"""
+                Story: {final_story}
+                Style: {style}
+                Tone: {tone}
+                Panels: {panels}
+
+                Panel planning for a {panels}-panel comic strip whose panels are drawn separately:
+                1. Describe the recurring characters once, precisely enough to draw them the same way every time
+                2. Split the story into exactly {panels} sequential scenes
+                3. For each scene describe one panel: setting, character actions and expressions,
+                   camera angle, and any speech or thought bubble text
+                4. Integrate {style} aesthetic with {tone} mood
+
+                Answer with a single JSON object, nothing else:
+                {{"characters": "...", "panels": ["panel 1 description", ...]}}
+                """,
+        f"JSON with a character description and exactly {panels} panel descriptions",
+        stage="visual",
+        memo=memo,
+        limiter=limiter,
+    )
+    return parse_panel_plan(result or "", panels)
+
+
+FUSED_PROMPT = """You are a storyteller, content reviewer and comic artist working together.
+
+Conversation:
+{conversation}
+
+Do all three steps and answer with a single JSON object, nothing else:
+1. "story": 2-3 engaging sentences capturing the key characters, events and emotions, in chronological order.
+2. Review that story for clarity, narrative flow and whether it is appropriate for all audiences.
+   Set "verdict" to "approved" if it needs no changes, otherwise "revised".
+   Put the approved or improved story in "final_story".
+3. Plan a {panels}-panel comic strip of final_story in {style} style with a {tone} mood, with
+   consistent characters and clear sequential action and emotion per panel. Be specific and brief;
+   the image model only reads about {image_tokens} tokens.
+   "characters": what each recurring character looks like, at most 40 words.
+   "setting": where it happens, at most 20 words.
+   "panels": exactly {panels} panel actions, expressions and any bubble text, at most {panel_words} words each.
+   "look": how the {style} style and {tone} mood show, at most 20 words.
+
+JSON keys: "story", "verdict", "final_story", "characters", "setting", "panels", "look"."""
+
+
+def _extract_json(text):
+    fenced = re.search(r"```(?:json)?\s*(\{.*\})\s*```", text, re.DOTALL)
+    if fenced:
+        return fenced.group(1)
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        raise FusedPlanError("No JSON object in fused response")
+    return text[start:end + 1]
+
+
+def parse_comic_plan(text):
+    """Validate a fused response, raising FusedPlanError if it doesn't fit"""
+    try:
+        return ComicPlan.model_validate(json.loads(_extract_json(text)))
+    except (json.JSONDecodeError, ValidationError) as e:
+        raise FusedPlanError(f"Invalid fused response: {e}") from e
+
+
+FUSED_PANELS_SUFFIX = """
+The panels are drawn separately, so also include "panel_prompts": a list of exactly {panels}
+self-contained scene descriptions, one per panel, each repeating what the characters look like."""
+
+_PANEL_HEADING = re.compile(r"\bpanel\s*\d+\s*[:.)\-]", re.IGNORECASE)
+
+
+def parse_panel_plan(text, panels):
+    """Per-panel plan from JSON, or from "Panel 1: ... Panel 2: ..." text.
+
+    Raises PanelPlanError unless there are at least ``panels`` descriptions.
+    """
+    try:
+        plan = PanelPlan.model_validate(json.loads(_extract_json(text)))
+    except (FusedPlanError, json.JSONDecodeError, ValidationError):
+        preamble, *descriptions = _PANEL_HEADING.split(text)
+        plan = PanelPlan(characters=preamble.strip(), panels=[d.strip() for d in descriptions if d.strip()])
+    if len(plan.panels) < panels:
+        raise PanelPlanError(f"Expected {panels} panel descriptions, got {len(plan.panels)}")
+    return PanelPlan(characters=plan.characters, panels=plan.panels[:panels])
+
+
+def parse_visual_spec(text, panels):
+    """Visual plan from JSON, from "Panel 1: ... Panel 2: ..." text, or as a free-text scene"""
+    try:
+        spec = VisualSpec.model_validate(json.loads(_extract_json(text)))
+    except (FusedPlanError, json.JSONDecodeError, ValidationError):
+        try:
+            plan = parse_panel_plan(text, panels)
+        except PanelPlanError:
+            return VisualSpec(scene=" ".join(text.split()))
+        return VisualSpec(characters=plan.characters, panels=plan.panels)
+    if not spec.panels and not spec.scene:
+        spec.scene = " ".join(text.split())
+    return spec
+
+
+def describe_visual_spec(spec):
+    """Readable form of a visual plan, shown as the comic's visual prompt"""
+    parts = [
+        f"Characters: {spec.characters}" if spec.characters else "",
+        f"Setting: {spec.setting}" if spec.setting else "",
+        spec.scene,
+        *[f"Panel {i}: {action}" for i, action in enumerate(spec.panels, 1)],
+        f"Look: {spec.look}" if spec.look else "",
+    ]
+    return "\n\n".join(part for part in parts if part)
+
+
+def run_fused_stage(llm, conversation_text, style, tone, panels, memo=None, limiter=None, layout=STRIP):
+    """Produce story, review verdict and visual plan in one LLM call"""
+    prompt = FUSED_PROMPT.format(conversation=conversation_text, style=style, tone=tone, panels=panels,
+                                 image_tokens=IMAGE_PROMPT_TOKENS, panel_words=_words_per_panel(panels))
+    if layout == PANELS:
+        prompt += FUSED_PANELS_SUFFIX.format(panels=panels)
+    invoke = _limited(limiter, "fused", lambda: llm.invoke(prompt, max_tokens=FUSED_MAX_TOKENS))
+
+    def compute():
+        response = invoke()
+        text = getattr(response, "content", str(response))
+        parse_comic_plan(text)  # Only valid plans are worth caching
+        return text
+
+    with span("llm.fused", stage="fused", prompt_chars=len(prompt), prompt_tokens=count_tokens(prompt)) as fused_span:
+        if memo is None:
+            fused_span.set(cache="off")
+            text = compute()
+        else:
+            text = memo("fused", prompt, compute)
+        fused_span.set(response_chars=len(text), response_tokens=count_tokens(text))
+        return parse_comic_plan(text)
+
+
+def build_image_prompt(spec, style, tone, panels):
+    """Compile a visual plan and the fixed comic-strip styling into one image prompt"""
+    return compile_strip_prompt(
+        spec.panels[:panels], style, tone, panels,
+        characters=spec.characters, setting=spec.setting, look=spec.look, scene=spec.scene,
+    )
+
+
+def build_panel_prompt(characters, description, style, index, panels):
+    """Image prompt for one separately drawn panel"""
+    return compile_panel_prompt(description, characters, style, index, panels)
+
+
+def decode_image_sample(sample):
+    """Decode a base64 image sample in a single validating pass.
+
+    Returns the raw image bytes, or None if ``sample`` isn't strict base64.
+    """
+    if not isinstance(sample, str) or not sample:
+        return None
+    with span("image.decode", encoded_chars=len(sample)) as decode_span:
+        try:
+            image = binascii.a2b_base64(sample, strict_mode=True)
+        except (binascii.Error, ValueError):
+            decode_span.set(valid=False)
+            return None
+        decode_span.set(bytes=len(image))
+        return image
+
+
+def generate_image_with_fireworks(client, image_cache, prompt, on_poll=None):
+    """Generate an image, or load it from the cache.
+
+    Returns ``(image, image_url, note)``. ``image`` is the raw image bytes,
+    or the URL itself if an image returned by URL couldn't be fetched;
+    ``image_url`` is set when Fireworks returned a URL, and ``note`` says
+    where the image came from.
+    """
+    prompt = fit_prompt(prompt)  # Prompts from the compiler already fit; others lose trailing clauses
+
+    with span("image.generate", prompt_chars=len(prompt), prompt_tokens=count_tokens(prompt)) as image_span:
+        image, image_url, note = _generate_image(client, image_cache, prompt, on_poll, image_span)
+        if isinstance(image, bytes):
+            image_span.set(bytes=len(image))
+        return image, image_url, note
+
+
+def _generate_image(client, image_cache, prompt, on_poll, image_span):
+    cached = image_cache.get(prompt, client.model) if image_cache else None
+    image_span.set(cache="hit" if cached is not None else ("miss" if image_cache else "off"))
+    if cached is not None:
+        return cached, None, "♻️ Loaded from image cache"
+
+    result = client.generate(
+        prompt,
+        on_poll=on_poll,
+        on_error=lambda req_error: logging.warning(f"Request error during polling: {req_error}"),
+    )
+    note = f"⏱️ Rendered in {result.elapsed:.1f}s after {result.polls} status checks"
+    image_span.set(polls=result.polls, render_seconds=result.elapsed)
+
+    image_data = result.sample
+    image_url = image_data if isinstance(image_data, str) and image_data.startswith("http") else None
+    if image_url:
+        # Image is available via URL
+        try:
+            image = client.download(image_url)
+        except requests.exceptions.RequestException as download_error:
+            logging.warning(f"Could not fetch image from URL: {download_error}")
+            return image_url, image_url, note
+    else:
+        # Base64 encoded image data
+        image = decode_image_sample(image_data)
+        if image is None:
+            raise ImageStageError("Invalid or missing image data returned")
+
+    if image_cache:
+        image_cache.put(prompt, client.model, image)
+    return image, image_url, note
+
+
+def render_panels(client, image_cache, panel_prompts, report=None):
+    """Generate every panel at once and composite them into one strip.
+
+    Returns ``(image, note)``. Panels already in the image cache aren't
+    generated again.
+    """
+    from strip_compositor import composite_panels
+
+    report = report or _no_report
+    total = len(panel_prompts)
+    ready = []
+
+    def on_poll(polls, elapsed):
+        report("image", 75, f"⏳ Generating {total} panels... ({len(ready)}/{total} ready, {elapsed:.0f}s)")
+
+    def generate(prompt):
+        result = generate_image_with_fireworks(client, image_cache, prompt, on_poll=on_poll)
+        ready.append(prompt)
+        return result
+
+    with span("image.panels", panels=total) as panels_span:
+        # Each panel thread gets a copy of this context so its spans nest under this one
+        with ThreadPoolExecutor(max_workers=total, thread_name_prefix="comic-panel") as executor:
+            futures = [executor.submit(contextvars.copy_context().run, generate, prompt) for prompt in panel_prompts]
+            results = [future.result() for future in futures]
+
+        for index, (image, _, _) in enumerate(results, start=1):
+            if not isinstance(image, bytes):
+                raise ImageStageError(f"Panel {index} could not be downloaded")
+        cached = sum(1 for _, _, note in results if note.startswith("♻️"))
+        panels_span.set(cached_panels=cached)
+
+        with span("image.composite", panels=total) as composite_span:
+            image = composite_panels([image for image, _, _ in results])
+            composite_span.set(bytes=len(image))
+
+    note = f"🧩 {total} panels rendered side by side"
+    if cached:
+        note += f", {cached} from the image cache"
+    return image, note
+
+
+def redo_panels(client, image_cache, result, indexes, report=None):
+    """Re-render some panels of a panels-layout result with varied prompts.
+
+    Returns ``(panel_prompts, image, note)``; untouched panels come from the image cache.
+    """
+    panel_prompts = list(result.panel_prompts)
+    for index in indexes:
+        panel_prompts[index] = vary_prompt(panel_prompts[index], result.variation + 1)
+    image, note = render_panels(client, image_cache, panel_prompts, report)
+    return panel_prompts, image, note
+
+
+@dataclass
+class ComicResult:
+    """Outputs of every stage of one comic generation"""
+    story: str
+    final_story: str
+    comic_prompt: str
+    image_prompt: str
+    image: object
+    image_url: object
+    image_note: str
+    mode: str
+    panels: int
+    style: str
+    timings: dict = field(default_factory=dict)
+    trace_id: str = ""
+    layout: str = STRIP
+    panel_prompts: list = field(default_factory=list)
+    visual_spec: object = None
+    variation: int = 0  # Regenerations this result is away from the original
+
+
+def _no_report(stage, progress, message):
+    pass
+
+
+def run_comic_pipeline(story_agent, judge_agent, visual_agent, llm, client, image_cache,
+                       conversation_text, style, tone, panels, mode=STAGED, memo=None, report=None,
+                       limiter=None, layout=STRIP, draft=None, visual_draft=None):
+    """Run every stage from conversation text to finished image.
+
+    ``report(stage, progress, message)`` is called as each stage starts
+    and while the image is being polled. With ``layout=PANELS`` each
+    panel is generated separately, falling back to one strip image if
+    the visual stage doesn't return a usable per-panel plan. A ``draft``
+    of ``(story, final_story)`` prepared earlier skips the story and
+    judge stages, and a ``visual_draft`` ``VisualSpec`` from an earlier
+    strip skips the visual stage as well.
+    """
+    with span("comic.pipeline", mode=mode, layout=layout, panels=panels,
+              conversation_chars=len(conversation_text), speculated=draft is not None,
+              reused_visual=visual_draft is not None) as pipeline_span:
+        result = _run_comic_pipeline(
+            story_agent, judge_agent, visual_agent, llm, client, image_cache, conversation_text,
+            style, tone, panels, mode, memo, report or _no_report, limiter, layout, draft, visual_draft,
+        )
+        pipeline_span.set(mode=result.mode, layout=result.layout)
+        result.trace_id = pipeline_span.trace_id
+        return result
+
+
+def _run_comic_pipeline(story_agent, judge_agent, visual_agent, llm, client, image_cache,
+                        conversation_text, style, tone, panels, mode, memo, report, limiter, layout, draft,
+                        visual_draft):
+    timings = {}
+    panel_plan = None
+    visual_spec = None
+
+    # Fused mode: story, review and visual prompt in one call
+    plan = None
+    if mode == FUSED and draft is None:
+        report("story", 5, "⚡ Writing, reviewing and designing in one pass...")
+        try:
+            with timed(timings, "fused"):
+                plan = run_fused_stage(llm, conversation_text, style, tone, panels, memo=memo, limiter=limiter,
+                                       layout=layout)
+            story, final_story = plan.story, plan.final_story
+            visual_spec = plan.visual_spec(panels)
+            comic_prompt = describe_visual_spec(visual_spec)
+        except FusedPlanError as e:
+            logging.warning(f"Fused pipeline fell back to staged mode: {e}")
+            report("story", 5, "↩️ Falling back to the step-by-step pipeline...")
+
+        if plan is not None and layout == PANELS:
+            if len(plan.panel_prompts) >= panels:
+                panel_plan = PanelPlan(characters="", panels=plan.panel_prompts[:panels])
+            elif len(plan.panels) >= panels:
+                panel_plan = PanelPlan(characters=plan.characters, panels=plan.panels[:panels])
+            else:
+                logging.warning(f"Fused plan has {len(plan.panels)} of {panels} panels, rendering one strip")
+
+    if plan is None and draft is not None:
+        story, final_story = draft
+    elif plan is None:
+        report("story", 0, "📝 Crafting your story...")
+        with timed(timings, "story"):
+            story = run_story_stage(story_agent, conversation_text, memo=memo, limiter=limiter)
+
+        report("judge", 25, "🔍 Polishing the narrative...")
+        with timed(timings, "judge"):
+            final_story = run_judge_stage(judge_agent, story, memo=memo, limiter=limiter)
+
+    if plan is None and visual_draft is not None and layout == STRIP:
+        visual_spec = visual_draft
+        comic_prompt = describe_visual_spec(visual_spec)
+    elif plan is None:
+        report("visual", 50, "🎨 Designing your comic...")
+        with timed(timings, "visual"):
+            if layout == PANELS:
+                try:
+                    panel_plan = run_panel_stage(
+                        visual_agent, final_story, style, tone, panels, memo=memo, limiter=limiter
+                    )
+                    comic_prompt = "\n\n".join(
+                        [panel_plan.characters] + [f"Panel {i}: {d}" for i, d in enumerate(panel_plan.panels, 1)]
+                    ).strip()
+                except PanelPlanError as e:
+                    logging.warning(f"No usable panel plan, rendering one strip: {e}")
+            if panel_plan is None:
+                visual_spec = run_visual_stage(
+                    visual_agent, final_story, style, tone, panels, memo=memo, limiter=limiter
+                )
+                comic_prompt = describe_visual_spec(visual_spec)
+
+    report("image", 75, "🖼️ Bringing your comic to life...")
+    panel_prompts = []
+    image_url = None
+    if panel_plan is not None:
+        panel_prompts = [
+            build_panel_prompt(panel_plan.characters, description, style, index, panels)
+            for index, description in enumerate(panel_plan.panels, start=1)
+        ]
+        image_prompt = "\n".join(panel_prompts)
+        with timed(timings, "image"):
+            image, image_note = render_panels(client, image_cache, panel_prompts, report)
+    else:
+        if visual_spec is None:
+            visual_spec = parse_visual_spec(comic_prompt, panels)
+        image_prompt = build_image_prompt(visual_spec, style, tone, panels)
+        with timed(timings, "image"):
+            image, image_url, image_note = generate_image_with_fireworks(
+                client, image_cache, image_prompt,
+                on_poll=lambda polls, elapsed: report(
+                    "image", 75, f"⏳ Generating image... (check {polls}, {elapsed:.0f}s)"
+                ),
+            )
+
+    return ComicResult(
+        story=story,
+        final_story=final_story,
+        comic_prompt=comic_prompt,
+        image_prompt=image_prompt,
+        image=image,
+        image_url=image_url,
+        image_note=image_note,
+        mode=FUSED if plan is not None else STAGED,
+        panels=panels,
+        style=style,
+        timings=timings,
+        layout=PANELS if panel_plan is not None else STRIP,
+        panel_prompts=panel_prompts,
+        visual_spec=visual_spec,
+    )
@@ -0,0 +1,216 @@
+"""Token-budgeted rolling summary of a journal conversation.
+
+Older turns are summarized once and the summary is only ever extended
+with turns that haven't been folded in yet, so the prompt stays roughly
+the same size however long the journal grows, without dropping content.
+
+A summary is only right for the budget it was built for: one kept for a
+small chat prompt would fold turns that a larger story prompt still has
+room for. ``SummaryPerBudget`` keeps one per budget.
+"""
+import logging
+
+from tracing import span
+
+DEFAULT_ENCODING = "cl100k_base"
+
+SUMMARY_PROMPT = """You keep a running summary of someone's journal conversation with an AI companion.
+
+Current summary:
+{summary}
+
+New conversation turns:
+{turns}
+
+Rewrite the summary so it also covers the new turns. Keep every person, event, place,
+feeling and detail that could matter for a comic strip about their day, in chronological
+order. Use at most {max_tokens} tokens. Reply with the summary only."""
+
+_encodings = {}
+
+
+def _get_encoding(name):
+    if name not in _encodings:
+        try:
+            import tiktoken
+
+            _encodings[name] = tiktoken.get_encoding(name)
+        except Exception as e:
+            logging.warning(f"tiktoken unavailable ({e}); estimating tokens from length")
+            _encodings[name] = None
+    return _encodings[name]
+
+
+def count_tokens(text, encoding=DEFAULT_ENCODING):
+    """Number of tokens in ``text``, estimated if tiktoken can't load"""
+    enc = _get_encoding(encoding)
+    if enc is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens, encoding=DEFAULT_ENCODING):
+    """Cut ``text`` down to at most ``max_tokens`` tokens"""
+    enc = _get_encoding(encoding)
+    if enc is None:
+        return text[:max_tokens * 4]
+    tokens = enc.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return enc.decode(tokens[:max_tokens])
+
+
+def format_turn(message):
+    return f"{message['role']}: {message['content']}"
+
+
+def llm_summarizer(llm, limiter=None):
+    """Summarize callable backed by a LangChain chat model"""
+    def summarize(summary, turns, max_tokens):
+        prompt = SUMMARY_PROMPT.format(summary=summary or "(none yet)", turns=turns, max_tokens=max_tokens)
+        with span("llm.summary", prompt_chars=len(prompt), prompt_tokens=count_tokens(prompt)) as summary_span:
+            if limiter is None:
+                response = llm.invoke(prompt)
+            else:
+                response = limiter.call("groq", "summary", llm.invoke, prompt)
+            text = str(getattr(response, "content", response)).strip()
+            summary_span.set(response_chars=len(text), response_tokens=count_tokens(text))
+            return text
+    return summarize
+
+
+class RollingSummary:
+    """Summary of older turns plus the newest turns verbatim.
+
+    ``summarize(summary, turns, max_tokens)`` extends an existing summary
+    with new turns. It is only called when the unsummarized turns outgrow
+    their share of the budget, and then folds in enough of them that the
+    next few turns fit without another call.
+    """
+
+    def __init__(self, summarize, summary_share=0.35, encoding=DEFAULT_ENCODING):
+        self.summarize = summarize
+        self.summary_share = summary_share
+        self.encoding = encoding
+        self.summary = ""
+        self.summarized_count = 0
+
+    def reset(self):
+        self.summary = ""
+        self.summarized_count = 0
+
+    def _tokens(self, text):
+        return count_tokens(text, self.encoding)
+
+    def absorb(self, messages, max_tokens):
+        """Fold ``messages`` into the summary"""
+        if not messages:
+            return
+        turns = "\n".join(format_turn(m) for m in messages)
+        summary = self.summarize(self.summary, turns, max_tokens)
+        if self._tokens(summary) > max_tokens:
+            logging.warning("Conversation summary exceeded its budget; truncating")
+            summary = truncate_tokens(summary, max_tokens, self.encoding)
+        self.summary = summary
+        self.summarized_count += len(messages)
+
+    def fold_prefix(self, messages, count, budget):
+        """Make sure the first ``count`` messages are in the summary"""
+        if self.summarized_count < count:
+            self.absorb(messages[self.summarized_count:count], int(budget * self.summary_share))
+
+    def drop_prefix(self, messages, count, budget):
+        """Summarize the first ``count`` messages before the caller discards them"""
+        self.fold_prefix(messages, count, budget)
+        self.summarized_count -= count
+
+    def build(self, messages, budget):
+        """Render the conversation for a prompt in at most ``budget`` tokens"""
+        if len(messages) < self.summarized_count:
+            # The conversation was cleared or replaced underneath us
+            self.reset()
+
+        summary_budget = int(budget * self.summary_share)
+        recent_budget = budget - summary_budget
+
+        pending = messages[self.summarized_count:]
+        costs = [self._tokens(format_turn(m)) + 1 for m in pending]
+        if sum(costs) > recent_budget:
+            # Keep the newest turns that fit half the recent budget, fold the rest
+            keep, used = 0, 0
+            for cost in reversed(costs):
+                if keep and used + cost > recent_budget // 2:
+                    break
+                keep += 1
+                used += cost
+            try:
+                self.absorb(pending[:len(pending) - keep], summary_budget)
+            except Exception as e:
+                # Try again next time; meanwhile the newest turns still fit below
+                logging.warning(f"Could not extend conversation summary: {e}")
+
+        recent_turns = [format_turn(m) for m in messages[self.summarized_count:]]
+        recent = "\n".join(recent_turns)
+        if self._tokens(recent) > recent_budget:
+            # Oversized turns or a failed summary; keep the latest part
+            recent = self._tail_tokens(recent, recent_budget)
+
+        if not self.summary:
+            return recent
+        return f"Summary of earlier conversation:\n{self.summary}\n\nRecent conversation:\n{recent}"
+
+    def _tail_tokens(self, text, max_tokens):
+        enc = _get_encoding(self.encoding)
+        if enc is None:
+            return text[-max_tokens * 4:]
+        tokens = enc.encode(text, disallowed_special=())
+        return enc.decode(tokens[-max_tokens:])
+
+
+class SummaryPerBudget:
+    """One ``RollingSummary`` per prompt budget, so a small budget never shrinks a larger one's context.
+
+    Summaries for ``budgets`` exist from the start, so turns dropped from
+    the session are folded into each of them; other budgets get a
+    summary on first use.
+    """
+
+    def __init__(self, summarize, budgets=(), **options):
+        self.summarize = summarize
+        self.options = options
+        self.summaries = {budget: RollingSummary(summarize, **options) for budget in budgets}
+
+    def _summary(self, budget):
+        if budget not in self.summaries:
+            self.summaries[budget] = RollingSummary(self.summarize, **self.options)
+        return self.summaries[budget]
+
+    def build(self, messages, budget):
+        """Render the conversation for a prompt in at most ``budget`` tokens"""
+        return self._summary(budget).build(messages, budget)
+
+    def drop_prefix(self, messages, count):
+        """Fold the first ``count`` messages into every summary before the caller discards them"""
+        # Fold into all of them before shifting any count, so after a failure every count still
+        # matches the undropped messages, which the caller then keeps
+        for budget, summary in self.summaries.items():
+            summary.fold_prefix(messages, count, budget)
+        for summary in self.summaries.values():
+            summary.summarized_count -= count
+
+    def restore(self, budget, summary, batches):
+        """Rebuild one budget's summary from a saved ``summary`` and turns no longer in the session.
+
+        ``batches`` are lists of those turns, oldest first, all from
+        before the session's first message. Returns the new summary.
+        """
+        rolling = self._summary(budget)
+        rolling.reset()
+        rolling.summary = summary
+        for batch in batches:
+            rolling.drop_prefix(batch, len(batch), budget)
+        return rolling.summary
+
+    def clear(self):
+        for summary in self.summaries.values():
+            summary.reset()
@@ -0,0 +1,422 @@
+"""Pooled Fireworks AI client with a shared, adaptive result poller."""
+import contextvars
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from dataclasses import dataclass, field
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_limiter import is_rate_limited, retry_after_seconds
+from single_flight import SingleFlight
+from tracing import span
+
+FIREWORKS_WORKFLOW_URL = "https://api.fireworks.ai/inference/v1/workflows/accounts/fireworks/models/flux-kontext-pro"
+READY_STATUSES = ("Ready", "Complete", "Finished")
+FAILED_STATUSES = ("Failed", "Error")
+# How long past the poll deadline a caller keeps waiting for the poller to resolve a request
+WAIT_GRACE_SECONDS = 5.0
+
+
+class FireworksError(Exception):
+    """Raised when Fireworks AI rejects or fails a generation"""
+
+
+class FireworksTimeout(FireworksError):
+    """Raised when a generation does not finish before the poll deadline"""
+
+    def __init__(self, message, polls=0, elapsed=0.0):
+        super().__init__(message)
+        self.polls = polls
+        self.elapsed = elapsed
+
+
+@dataclass
+class PollSchedule:
+    """When to check on a submitted generation.
+
+    A quick first check catches fast renders, later checks back off
+    exponentially with jitter, and the whole loop is bounded by a
+    wall-clock deadline rather than an attempt count.
+    """
+    first_delay: float = 0.5
+    base_delay: float = 1.0
+    factor: float = 1.5
+    max_delay: float = 4.0
+    jitter: float = 0.2
+    deadline: float = 90.0
+
+    def delay(self, polls):
+        """The sleep before the next check, after ``polls`` checks so far"""
+        if polls == 0:
+            return self.first_delay
+        delay = min(self.base_delay * self.factor ** (polls - 1), self.max_delay)
+        spread = delay * self.jitter
+        return max(0.0, delay + random.uniform(-spread, spread))
+
+
+class CompletionTimes:
+    """Recent submit-to-ready times, used to decide when a render is worth checking on"""
+
+    # Points of the completion-time distribution at which to poll
+    QUANTILES = (0.1, 0.25, 0.4, 0.5, 0.6, 0.75, 0.9, 0.95, 0.99)
+
+    def __init__(self, size=200, min_samples=10):
+        self.min_samples = min_samples
+        self._recent = deque(maxlen=size)
+        self._points = ()
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._recent.append(seconds)
+            if len(self._recent) >= self.min_samples:
+                ordered = sorted(self._recent)
+                self._points = tuple(ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in self.QUANTILES)
+
+    def next_check(self, elapsed, min_gap):
+        """Seconds from ``elapsed`` until the next quantile point, or None without enough history"""
+        with self._lock:
+            points = self._points
+        if not points:
+            return None
+        for point in points:
+            if point >= elapsed + min_gap:
+                return point - elapsed
+        return None  # Slower than nearly every render seen so far
+
+    def percentiles(self):
+        with self._lock:
+            return dict(zip(self.QUANTILES, self._points))
+
+
+@dataclass(eq=False)
+class PendingGeneration:
+    """A submitted request the poller is watching; compared by identity"""
+    request_id: str
+    deadline: float
+    on_error: object = None
+    started: float = field(default_factory=time.monotonic)
+    polls: int = 0
+    future: Future = field(default_factory=Future)
+    context: object = field(default_factory=contextvars.copy_context)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+
+class FireworksPoller:
+    """One scheduler that checks on every outstanding request of a client.
+
+    Instead of a sleeping loop per caller, each submitted request is put
+    on a shared timetable and checked by a small worker pool; callers get
+    a future. Until enough renders have been seen, checks follow the
+    client's ``PollSchedule``. After that they are timed to the observed
+    completion-time quantiles, so a request isn't checked long before
+    it's likely to be done and is checked more often around the typical
+    finish time, never more than ``max_delay`` apart.
+    """
+
+    def __init__(self, client, workers=8, min_gap=0.25):
+        self.client = client
+        self.min_gap = min_gap
+        self.completions = CompletionTimes()
+        self._timetable = []
+        self._order = itertools.count()
+        self._outstanding = set()
+        self._counts = {"polls": 0, "ready": 0, "failed": 0, "timed_out": 0, "errors": 0}
+        self._cond = threading.Condition()
+        self._workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fireworks-poll")
+        self._thread = None
+        self._stopped = False
+
+    def track(self, request_id, on_error=None):
+        """Start watching a submitted request; its result arrives on ``pending.future``"""
+        pending = PendingGeneration(request_id, deadline=time.monotonic() + self.client.schedule.deadline,
+                                    on_error=on_error)
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="fireworks-poller", daemon=True)
+                self._thread.start()
+            if self._stopped:
+                raise FireworksError("Fireworks client is closed")
+            self._outstanding.add(pending)
+            self._schedule(pending, self.client.schedule.delay(0))
+        return pending
+
+    def _delay(self, pending):
+        """Time until the next check of a request that is still rendering"""
+        schedule = self.client.schedule
+        adaptive = self.completions.next_check(pending.elapsed, self.min_gap)
+        if adaptive is not None:
+            return min(adaptive, schedule.max_delay)
+        if self.completions.percentiles():
+            return schedule.max_delay  # Past every quantile: back off to the slowest rate
+        return schedule.delay(pending.polls)
+
+    def _schedule(self, pending, delay):
+        # Caller holds self._cond
+        due = min(time.monotonic() + delay, pending.deadline)
+        heapq.heappush(self._timetable, (due, next(self._order), pending))
+        self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped and (not self._timetable or self._timetable[0][0] > time.monotonic()):
+                    self._cond.wait(self._timetable[0][0] - time.monotonic() if self._timetable else None)
+                if self._stopped:
+                    return
+                _, _, pending = heapq.heappop(self._timetable)
+            # Each request keeps the trace context of the caller that submitted it
+            try:
+                self._workers.submit(pending.context.run, self._check, pending)
+            except RuntimeError as e:  # Workers shut down by close()
+                self._finish(pending, "failed", exception=FireworksError(f"Fireworks poller stopped: {e}"))
+
+    def _check(self, pending):
+        """Check on one request; whatever goes wrong, it ends resolved or scheduled again"""
+        if pending.future.done():
+            return  # Abandoned by its caller or failed by close()
+        try:
+            self._check_status(pending)
+        except Exception as e:
+            logging.warning(f"Fireworks {pending.request_id[:8]} check failed: {e}")
+            self._finish(pending, "failed", exception=e)
+
+    def _check_status(self, pending):
+        if time.monotonic() >= pending.deadline:
+            self._finish(pending, "timed_out", exception=FireworksTimeout(
+                f"Generation timed out after {self.client.schedule.deadline:.0f} seconds",
+                polls=pending.polls, elapsed=pending.elapsed,
+            ))
+            logging.warning(f"Fireworks {pending.request_id[:8]} timed out after {pending.polls} polls")
+            return
+
+        pending.polls += 1
+        with self._cond:
+            self._counts["polls"] += 1
+        try:
+            poll_result = self.client.poll(pending.request_id)
+        except requests.exceptions.RequestException as req_error:
+            with self._cond:
+                self._counts["errors"] += 1
+            if pending.on_error:
+                pending.on_error(req_error)
+            with self._cond:
+                self._schedule(pending, self._delay(pending))  # Transport errors are retried until the deadline
+            return
+        except Exception as e:
+            self._finish(pending, "failed", exception=e)
+            return
+
+        status = poll_result.get("status")
+        if status in READY_STATUSES:
+            elapsed = pending.elapsed
+            self.completions.add(elapsed)
+            logging.info(f"Fireworks {pending.request_id[:8]} ready after {pending.polls} polls in {elapsed:.1f}s")
+            self._finish(pending, "ready", result=GenerationResult(
+                request_id=pending.request_id,
+                sample=(poll_result.get("result") or {}).get("sample"),
+                polls=pending.polls,
+                elapsed=elapsed,
+            ))
+        elif status in FAILED_STATUSES:
+            self._finish(pending, "failed", exception=FireworksError(
+                f"Generation failed: {poll_result.get('details', 'Unknown error')}"
+            ))
+        else:
+            # Anything else (Processing, Queued, ...) means check again later
+            with self._cond:
+                self._schedule(pending, self._delay(pending))
+
+    def _finish(self, pending, outcome, result=None, exception=None):
+        with self._cond:
+            if pending not in self._outstanding:
+                return  # Already resolved
+            self._outstanding.discard(pending)
+            self._counts[outcome] += 1
+        if exception is not None:
+            pending.future.set_exception(exception)
+        else:
+            pending.future.set_result(result)
+
+    def abandon(self, pending, exception):
+        """Resolve a request its caller stopped waiting for; it is no longer checked"""
+        self._finish(pending, "timed_out", exception=exception)
+
+    def stats(self):
+        """Outstanding requests, poll counts and the completion times the schedule follows"""
+        with self._cond:
+            counts = dict(self._counts, outstanding=len(self._outstanding))
+        finished = counts["ready"] + counts["failed"] + counts["timed_out"]
+        counts["polls_per_request"] = counts["polls"] / finished if finished else 0.0
+        counts["completion_seconds"] = self.completions.percentiles()
+        return counts
+
+    def close(self):
+        """Stop polling and fail every request still outstanding, so no caller waits on it"""
+        with self._cond:
+            self._stopped = True
+            outstanding = list(self._outstanding)
+            self._timetable.clear()
+            self._cond.notify()
+        self._workers.shutdown(wait=False, cancel_futures=True)
+        for pending in outstanding:
+            self._finish(pending, "failed", exception=FireworksError("Fireworks client closed while waiting"))
+
+
+@dataclass
+class GenerationResult:
+    """Finished generation plus how long it took to get it"""
+    request_id: str
+    sample: object
+    polls: int
+    elapsed: float
+
+
+class FireworksClient:
+    """Reusable Fireworks client backed by a keep-alive connection pool"""
+
+    def __init__(self, api_key, model_url=FIREWORKS_WORKFLOW_URL, schedule=None,
+                 pool_size=10, submit_timeout=30, poll_timeout=10, limiter=None, submit_retries=3):
+        self.model_url = model_url
+        self.model = model_url.rstrip("/").rsplit("/", 1)[-1]
+        self.result_url = f"{model_url}/get_result"
+        self.schedule = schedule or PollSchedule()
+        self.submit_timeout = submit_timeout
+        self.poll_timeout = poll_timeout
+        self.limiter = limiter
+        self.submit_retries = submit_retries
+        # Identical prompts generating at the same time share one request
+        self.flights = SingleFlight()
+        self.poller = FireworksPoller(self, workers=pool_size)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        })
+
+    def _post(self, endpoint, url, headers, payload, timeout):
+        def post():
+            response = self.session.post(url, headers=headers, json=payload, timeout=timeout)
+            response.raise_for_status()
+            return response
+
+        if self.limiter is None:
+            return post()
+        return self.limiter.call("fireworks", endpoint, post)
+
+    def submit(self, prompt):
+        """Submit a generation request and return its request ID.
+
+        A 429 is retried a few times; the limiter (or, without one, the
+        ``Retry-After`` header) decides how long to wait first.
+        """
+        with span("fireworks.submit", model=self.model, prompt_chars=len(prompt)) as submit_span:
+            for attempt in range(self.submit_retries + 1):
+                submit_span.set(retries=attempt)
+                try:
+                    response = self._post(
+                        "submit", self.model_url, {"Accept": "application/json"}, {"prompt": prompt},
+                        self.submit_timeout,
+                    )
+                    break
+                except requests.exceptions.HTTPError as e:
+                    if attempt == self.submit_retries or not is_rate_limited(e):
+                        raise
+                    if self.limiter is None:
+                        time.sleep(retry_after_seconds(e))
+
+            request_id = response.json().get("request_id")
+            if not request_id:
+                raise FireworksError("No request ID returned from Fireworks AI")
+            return request_id
+
+    def poll(self, request_id):
+        """Fetch the current state of a submitted generation"""
+        with span("fireworks.poll", model=self.model) as poll_span:
+            response = self._post(
+                "poll", self.result_url, {"Accept": "image/jpeg"}, {"id": request_id}, self.poll_timeout,
+            )
+            poll_span.set(response_chars=len(response.content))
+            poll_result = response.json()
+            poll_span.set(status=poll_result.get("status"))
+            return poll_result
+
+    def wait(self, request_id, on_poll=None, on_error=None):
+        """Wait for a submitted generation, checked by the shared poller.
+
+        ``on_poll(polls, elapsed)`` is called about once a second while
+        waiting, and ``on_error(exc)`` whenever a check fails at the
+        transport level; such failures are retried until the deadline.
+        The wait itself gives up a little after the poll deadline, in
+        case the poller can't resolve the request.
+        """
+        pending = self.poller.track(request_id, on_error=on_error)
+        give_up = pending.deadline + self.poll_timeout + WAIT_GRACE_SECONDS
+        while True:
+            try:
+                return pending.future.result(timeout=1.0)
+            except TimeoutError:
+                if time.monotonic() >= give_up:
+                    self.poller.abandon(pending, FireworksTimeout(
+                        f"Gave up waiting after {pending.elapsed:.0f} seconds",
+                        polls=pending.polls, elapsed=pending.elapsed,
+                    ))
+                    return pending.future.result()
+                if on_poll:
+                    on_poll(pending.polls, pending.elapsed)
+
+    def generate(self, prompt, on_submit=None, on_poll=None, on_error=None):
+        """Submit a prompt and block until its image is ready.
+
+        If the same prompt is already being generated, no new request is
+        submitted: the caller waits for that one and gets its result, with
+        ``on_poll`` reporting the other caller's progress.
+        """
+        def run(flight):
+            request_id = self.submit(prompt)
+            flight.progress = {"request_id": request_id, "polls": 0}
+            if on_submit:
+                on_submit(request_id)
+
+            def track(polls, elapsed):
+                flight.progress["polls"] = polls
+                if on_poll:
+                    on_poll(polls, elapsed)
+
+            with span("fireworks.wait", model=self.model) as wait_span:
+                result = self.wait(request_id, on_poll=track, on_error=on_error)
+                wait_span.set(polls=result.polls)
+                return result
+
+        def follow(flight, elapsed):
+            if on_poll:
+                on_poll((flight.progress or {}).get("polls", 0), elapsed)
+
+        return self.flights.do(prompt, run, on_wait=follow)
+
+    def download(self, url):
+        """Fetch a finished image that was returned as a URL"""
+        # Image URLs point at a CDN, so don't send the API key along
+        with span("fireworks.download") as download_span:
+            response = self.session.get(url, headers={"Authorization": None}, timeout=self.submit_timeout)
+            response.raise_for_status()
+            download_span.set(bytes=len(response.content))
+            return response.content
+
+    def close(self):
+        self.poller.close()
+        self.session.close()
@@ -0,0 +1,119 @@
+"""Content-addressed on-disk cache for generated comic images."""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "images")
+
+
+class ImageCache:
+    """Decoded image bytes keyed by model and normalized prompt.
+
+    Files are named after the SHA-256 of the key. A file's mtime records
+    when it was written (for the TTL) and its atime is bumped on every
+    hit, so least-recently-used eviction survives process restarts.
+    """
+
+    SUFFIX = ".img"
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=256 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(prompt, model):
+        """Hash of the model name plus the whitespace-normalized prompt"""
+        normalized = " ".join(prompt.split())
+        return hashlib.sha256(f"{model}\n{normalized}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def get(self, prompt, model):
+        """Return cached image bytes, or None on a miss"""
+        path = self._path(self.make_key(prompt, model))
+        with self._lock:
+            try:
+                stat = os.stat(path)
+                if time.time() - stat.st_mtime > self.ttl:
+                    os.remove(path)
+                    raise FileNotFoundError(path)
+                with open(path, "rb") as f:
+                    data = f.read()
+                # Record the access without disturbing the write time
+                os.utime(path, (time.time(), stat.st_mtime))
+            except OSError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return data
+
+    def put(self, prompt, model, data):
+        """Store image bytes and evict old entries past the size budget"""
+        path = self._path(self.make_key(prompt, model))
+        with self._lock:
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logging.warning(f"Could not write image cache entry: {e}")
+                return
+            self._evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                entries.append((path, os.stat(path)))
+            except OSError:
+                continue
+        return entries
+
+    def _evict(self):
+        now = time.time()
+        live = []
+        total = 0
+        for path, stat in self._entries():
+            if now - stat.st_mtime > self.ttl:
+                self._remove(path)
+            else:
+                live.append((stat.st_atime, stat.st_size, path))
+                total += stat.st_size
+
+        live.sort()
+        for _, size, path in live:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        """Hit/miss counters plus current size on disk"""
+        with self._lock:
+            entries = self._entries()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(entries),
+                "bytes": sum(stat.st_size for _, stat in entries),
+            }
@@ -0,0 +1,264 @@
+"""Streaming export of a whole journal: messages, comics and their metadata.
+
+Two formats, both written as a zip archive:
+
+- ``zip``: one Markdown file per day under ``entries/``, and each comic
+  under ``comics/`` as its image plus a JSON file with its story,
+  visual prompt, style and panels.
+- ``html``: a browsable bundle, ``index.html`` plus pages of
+  ``days_per_page`` days each with the comics shown inline, and the
+  images under ``images/``.
+
+The journal is read from the store a batch at a time, oldest first, and
+a day at a time is written out. Images are copied from SQLite into the
+archive in chunks and stored uncompressed, since they already are, so
+memory stays flat however many months and images a journal holds. The
+archive can go to any writable binary file, including a non-seekable
+stream.
+
+    python journal_export.py <journal ID> journal.zip --format html
+"""
+import argparse
+import html
+import json
+import os
+import sys
+import time
+import zipfile
+from dataclasses import dataclass, field
+
+from journal_store import DEFAULT_DB_PATH, JournalStore
+from tracing import span
+
+ZIP = "zip"
+HTML = "html"
+FORMATS = (ZIP, HTML)
+
+_IMAGE_TYPES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"RIFF", "webp"),
+    (b"GIF8", "gif"),
+)
+
+
+@dataclass
+class JournalDay:
+    """One day's messages and the comics made that day"""
+    day: str
+    messages: list = field(default_factory=list)
+    comics: list = field(default_factory=list)
+
+
+@dataclass
+class ExportStats:
+    days: int = 0
+    messages: int = 0
+    comics: int = 0
+    image_bytes: int = 0
+    seconds: float = 0.0
+
+
+def journal_days(store, user_id):
+    """The journal a day at a time, oldest first, merging messages and comics by day"""
+    messages, comics = store.iter_messages(user_id), store.iter_comics(user_id)
+    message, comic = next(messages, None), next(comics, None)
+    while message is not None or comic is not None:
+        current = JournalDay(min(item["day"] for item in (message, comic) if item is not None))
+        while message is not None and message["day"] == current.day:
+            current.messages.append(message)
+            message = next(messages, None)
+        while comic is not None and comic["day"] == current.day:
+            current.comics.append(comic)
+            comic = next(comics, None)
+        yield current
+
+
+def image_extension(head):
+    """File extension for image bytes starting with ``head``"""
+    for magic, extension in _IMAGE_TYPES:
+        if head.startswith(magic):
+            return extension
+    return "img"
+
+
+def _text_entry(archive, name, text):
+    archive.writestr(zipfile.ZipInfo(name, _timestamp()), text, compress_type=zipfile.ZIP_DEFLATED)
+
+
+def _timestamp(created=None):
+    return time.localtime(created or time.time())[:6]
+
+
+def _copy_image(store, archive, comic, stem, stats):
+    """Copy a comic's image into the archive chunk by chunk; returns its path or None"""
+    if not comic["image_bytes"]:
+        return None
+    chunks = store.comic_image_chunks(comic["id"])
+    first = next(chunks, b"")
+    name = f"{stem}.{image_extension(first)}"
+    info = zipfile.ZipInfo(name, _timestamp(comic["created"]))
+    info.compress_type = zipfile.ZIP_STORED
+    info.file_size = comic["image_bytes"]  # Known up front, so no ZIP64 guesswork
+    with archive.open(info, "w") as out:
+        out.write(first)
+        for chunk in chunks:
+            out.write(chunk)
+    stats.image_bytes += comic["image_bytes"]
+    return name
+
+
+def _comic_metadata(comic, image_path):
+    return {
+        "id": comic["id"],
+        "day": comic["day"],
+        "created": comic["created"],
+        "style": comic["style"],
+        "panels": comic["panels"],
+        "story": comic["story"],
+        "visual_prompt": comic["visual_prompt"],
+        "image": image_path,
+        "image_url": comic["image_url"],
+        "first_entry_id": comic["first_entry_id"],
+        "last_entry_id": comic["last_entry_id"],
+    }
+
+
+def export_zip(store, user_id, fileobj):
+    """Write the journal as Markdown days plus comic images and metadata"""
+    stats = ExportStats()
+    with zipfile.ZipFile(fileobj, "w") as archive:
+        for day in journal_days(store, user_id):
+            lines = [f"# {day.day}", ""]
+            for message in day.messages:
+                lines += [f"**{message['role'].upper()}:** {message['content']}", ""]
+            for comic in day.comics:
+                stem = f"comics/{day.day}_{comic['id']}"
+                image_path = _copy_image(store, archive, comic, stem, stats)
+                _text_entry(archive, f"{stem}.json",
+                            json.dumps(_comic_metadata(comic, image_path), ensure_ascii=False, indent=2))
+                target = f"../{image_path}" if image_path else comic["image_url"]
+                if target:
+                    lines += [f"![{comic['panels']}-panel {comic['style']} comic]({target})", ""]
+                lines += [f"> {comic['story'] or ''}", ""]
+            _text_entry(archive, f"entries/{day.day}.md", "\n".join(lines))
+            stats.days += 1
+            stats.messages += len(day.messages)
+            stats.comics += len(day.comics)
+    return stats
+
+
+_PAGE_HEAD = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body {{ font-family: sans-serif; max-width: 46rem; margin: 2rem auto; line-height: 1.5; }}
+.user {{ font-weight: bold; }} figure img {{ max-width: 100%; }} nav {{ margin: 2rem 0; }}
+</style></head><body>
+<h1>{title}</h1>
+"""
+
+
+def _page_name(number):
+    return f"pages/page-{number:04d}.html"
+
+
+def _html_day(store, archive, day, stats):
+    parts = [f"<section><h2>{html.escape(day.day)}</h2>"]
+    for message in day.messages:
+        parts.append(f'<p class="{html.escape(message["role"])}">{html.escape(message["role"].title())}: '
+                     f'{html.escape(message["content"])}</p>')
+    for comic in day.comics:
+        image_path = _copy_image(store, archive, comic, f"images/{day.day}_{comic['id']}", stats)
+        source = f"../{image_path}" if image_path else comic["image_url"]
+        caption = f"{comic['panels']}-panel {comic['style']} comic"
+        parts.append("<figure>")
+        if source:
+            parts.append(f'<img src="{html.escape(source)}" alt="{html.escape(caption)}" loading="lazy">')
+        parts.append(f"<figcaption>{html.escape(comic['story'] or '')}</figcaption>")
+        if comic["visual_prompt"]:
+            parts.append(f"<details><summary>Visual prompt</summary><pre>{html.escape(comic['visual_prompt'])}"
+                         "</pre></details>")
+        parts.append("</figure>")
+    parts.append("</section>")
+    return "\n".join(parts)
+
+
+def _nav(number, has_next):
+    links = ['<a href="../index.html">Contents</a>']
+    if number > 1:
+        links.insert(0, f'<a href="page-{number - 1:04d}.html">&larr; Earlier</a>')
+    if has_next:
+        links.append(f'<a href="page-{number + 1:04d}.html">Later &rarr;</a>')
+    return f"<nav>{' · '.join(links)}</nav>\n</body></html>"
+
+
+def export_html(store, user_id, fileobj, days_per_page=7):
+    """Write the journal as an HTML bundle paginated by day.
+
+    Only one page of text is held at a time; images go straight into
+    the archive as each day is reached.
+    """
+    stats = ExportStats()
+    pages = []
+    with zipfile.ZipFile(fileobj, "w") as archive:
+        days = journal_days(store, user_id)
+        day = next(days, None)
+        while day is not None:
+            number = len(pages) + 1
+            sections, first_day = [], day.day
+            for _ in range(days_per_page):
+                sections.append(_html_day(store, archive, day, stats))
+                stats.days += 1
+                stats.messages += len(day.messages)
+                stats.comics += len(day.comics)
+                last_day = day.day
+                day = next(days, None)
+                if day is None:
+                    break
+            title = first_day if first_day == last_day else f"{first_day} to {last_day}"
+            _text_entry(archive, _page_name(number),
+                        _PAGE_HEAD.format(title=html.escape(title)) + "\n".join(sections)
+                        + _nav(number, day is not None))
+            pages.append((number, title))
+
+        contents = "\n".join(f'<li><a href="{_page_name(number)}">{html.escape(title)}</a></li>'
+                             for number, title in pages) or "<li>No entries yet</li>"
+        _text_entry(archive, "index.html",
+                    _PAGE_HEAD.format(title="Comic Journal") + f"<ul>\n{contents}\n</ul>\n</body></html>")
+    return stats
+
+
+def export_journal(store, user_id, fileobj, fmt=ZIP, **options):
+    """Stream ``user_id``'s journal to ``fileobj`` in one of ``FORMATS``"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    start = time.perf_counter()
+    with span("journal.export", format=fmt) as export_span:
+        stats = (export_zip if fmt == ZIP else export_html)(store, user_id, fileobj, **options)
+        stats.seconds = time.perf_counter() - start
+        export_span.set(days=stats.days, messages=stats.messages, comics=stats.comics, bytes=stats.image_bytes)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("user", help="journal ID (the ?user= value in the app's URL)")
+    parser.add_argument("output", help="archive to write, or - for standard output")
+    parser.add_argument("--format", choices=FORMATS, default=ZIP)
+    parser.add_argument("--days-per-page", type=int, default=7, help="days per HTML page")
+    parser.add_argument("--db", default=os.getenv("COMIC_JOURNAL_DB", DEFAULT_DB_PATH))
+    args = parser.parse_args()
+
+    store = JournalStore(args.db)
+    options = {"days_per_page": args.days_per_page} if args.format == HTML else {}
+    if args.output == "-":
+        stats = export_journal(store, args.user, sys.stdout.buffer, args.format, **options)
+    else:
+        with open(args.output, "wb") as f:
+            stats = export_journal(store, args.user, f, args.format, **options)
+    print(f"Exported {stats.days} days, {stats.messages} messages and {stats.comics} comics "
+          f"({stats.image_bytes / (1024 * 1024):.1f} MB of images) in {stats.seconds:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
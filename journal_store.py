@@ -0,0 +1,246 @@
+"""SQLite-backed journal store: chat entries and comics, per user and day.
+
+Messages are read newest-first a page at a time using keyset pagination
+on the entry ID, so loading a page costs the same however long someone
+has been journaling. Exports walk the whole journal oldest-first the
+same way, and read comic images in chunks.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_DB_PATH = os.path.join("data", "journal.sqlite3")
+
+
+class JournalStore:
+    """Persistent, indexed store of journal entries and generated comics"""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_user_id ON entries (user_id, id);
+                CREATE INDEX IF NOT EXISTS entries_user_day ON entries (user_id, day, id);
+
+                CREATE TABLE IF NOT EXISTS comics (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    first_entry_id INTEGER,
+                    last_entry_id INTEGER,
+                    style TEXT,
+                    panels INTEGER,
+                    story TEXT,
+                    visual_prompt TEXT,
+                    image BLOB,
+                    image_url TEXT
+                );
+                CREATE INDEX IF NOT EXISTS comics_user_id ON comics (user_id, id);
+
+                -- Where each user's current conversation starts, set by Clear Chat
+                CREATE TABLE IF NOT EXISTS conversations (
+                    user_id TEXT PRIMARY KEY,
+                    first_entry_id INTEGER NOT NULL
+                );
+
+                -- Summary of a conversation's turns up to through_entry_id, one per prompt budget
+                CREATE TABLE IF NOT EXISTS conversation_summaries (
+                    user_id TEXT NOT NULL,
+                    budget INTEGER NOT NULL,
+                    first_entry_id INTEGER,
+                    through_entry_id INTEGER NOT NULL,
+                    summary TEXT NOT NULL,
+                    PRIMARY KEY (user_id, budget)
+                );
+            """)
+
+    @staticmethod
+    def _day(created):
+        return time.strftime("%Y-%m-%d", time.localtime(created))
+
+    @staticmethod
+    def _message(row):
+        return {"id": row["id"], "role": row["role"], "content": row["content"], "day": row["day"]}
+
+    def add_message(self, user_id, role, content):
+        """Store one chat message and return it with its entry ID"""
+        created = time.time()
+        day = self._day(created)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO entries (user_id, day, created, role, content) VALUES (?, ?, ?, ?, ?)",
+                (user_id, day, created, role, content),
+            )
+        return {"id": cursor.lastrowid, "role": role, "content": content, "day": day}
+
+    def recent_messages(self, user_id, limit, before_id=None, since_id=None):
+        """Up to ``limit`` messages older than ``before_id`` and from ``since_id`` on, oldest first"""
+        query, params = "SELECT * FROM entries WHERE user_id = ?", [user_id]
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+        if since_id is not None:
+            query += " AND id >= ?"
+            params.append(since_id)
+        with self._lock:
+            rows = self._conn.execute(f"{query} ORDER BY id DESC LIMIT ?", (*params, limit)).fetchall()
+        return [self._message(row) for row in reversed(rows)]
+
+    def messages_since(self, user_id, first_id):
+        """Every message from ``first_id`` on, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM entries WHERE user_id = ? AND id >= ? ORDER BY id",
+                (user_id, first_id),
+            ).fetchall()
+        return [self._message(row) for row in rows]
+
+    def has_messages_before(self, user_id, before_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT EXISTS (SELECT 1 FROM entries WHERE user_id = ? AND id < ?)",
+                (user_id, before_id),
+            ).fetchone()[0] == 1
+
+    def conversation_start(self, user_id):
+        """ID of the first entry in the user's current conversation, or None if never cleared"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT first_entry_id FROM conversations WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return row["first_entry_id"] if row else None
+
+    def start_conversation(self, user_id):
+        """Start a new conversation after the user's latest entry; returns where it starts"""
+        with self._lock, self._conn:
+            first_id = self._conn.execute(
+                "SELECT COALESCE(MAX(id), 0) + 1 FROM entries WHERE user_id = ?", (user_id,)
+            ).fetchone()[0]
+            self._conn.execute(
+                """INSERT INTO conversations (user_id, first_entry_id) VALUES (?, ?)
+                   ON CONFLICT (user_id) DO UPDATE SET first_entry_id = excluded.first_entry_id""",
+                (user_id, first_id),
+            )
+        return first_id
+
+    def saved_summary(self, user_id, budget):
+        """``(first_entry_id, through_entry_id, summary)`` last saved for this budget, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT first_entry_id, through_entry_id, summary FROM conversation_summaries
+                   WHERE user_id = ? AND budget = ?""",
+                (user_id, budget),
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def save_summary(self, user_id, budget, first_entry_id, through_entry_id, summary):
+        """Remember a summary of the conversation starting at ``first_entry_id`` up to ``through_entry_id``"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO conversation_summaries (user_id, budget, first_entry_id, through_entry_id, summary)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (user_id, budget) DO UPDATE SET first_entry_id = excluded.first_entry_id,
+                       through_entry_id = excluded.through_entry_id, summary = excluded.summary""",
+                (user_id, budget, first_entry_id, through_entry_id, summary),
+            )
+
+    def add_comic(self, user_id, style, panels, story, visual_prompt, image=None, image_url=None,
+                  first_entry_id=None, last_entry_id=None):
+        """Store a generated comic alongside the entries it was made from"""
+        created = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                """INSERT INTO comics (user_id, day, created, first_entry_id, last_entry_id,
+                                       style, panels, story, visual_prompt, image, image_url)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (user_id, self._day(created), created, first_entry_id, last_entry_id,
+                 style, panels, story, visual_prompt, image, image_url),
+            )
+        return cursor.lastrowid
+
+    def recent_comics(self, user_id, limit, before_id=None):
+        """Up to ``limit`` comics older than ``before_id``, newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM comics WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (user_id, before_id if before_id is not None else 2 ** 63 - 1, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def iter_messages(self, user_id, batch_size=500, after_id=0, before_id=None):
+        """Every message after ``after_id`` and before ``before_id``, oldest first, ``batch_size`` at a time"""
+        before_id = before_id if before_id is not None else 2 ** 63 - 1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT * FROM entries WHERE user_id = ? AND id > ? AND id < ? ORDER BY id LIMIT ?",
+                    (user_id, after_id, before_id, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._message(row)
+            after_id = rows[-1]["id"]
+
+    def iter_comics(self, user_id, batch_size=100):
+        """Every comic oldest first, without its image; ``image_bytes`` gives the image size"""
+        after_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    """SELECT id, day, created, first_entry_id, last_entry_id, style, panels, story,
+                              visual_prompt, image_url, COALESCE(length(image), 0) AS image_bytes
+                       FROM comics WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?""",
+                    (user_id, after_id, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+            after_id = rows[-1]["id"]
+
+    def journal_bytes(self, user_id):
+        """Approximate size of everything an export of this journal would contain"""
+        with self._lock:
+            text = self._conn.execute(
+                "SELECT COALESCE(SUM(length(content)), 0) FROM entries WHERE user_id = ?", (user_id,)
+            ).fetchone()[0]
+            comics = self._conn.execute(
+                """SELECT COALESCE(SUM(COALESCE(length(image), 0) + COALESCE(length(story), 0)
+                                       + COALESCE(length(visual_prompt), 0)), 0)
+                   FROM comics WHERE user_id = ?""",
+                (user_id,),
+            ).fetchone()[0]
+        return text + comics
+
+    def comic_image_chunks(self, comic_id, chunk_size=1024 * 1024):
+        """A comic's image in chunks of at most ``chunk_size`` bytes, read incrementally"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COALESCE(length(image), 0) FROM comics WHERE id = ?", (comic_id,)
+            ).fetchone()
+        size = row[0] if row else 0
+        for offset in range(0, size, chunk_size):
+            with self._lock:
+                with self._conn.blobopen("comics", "image", comic_id, readonly=True) as blob:
+                    blob.seek(offset)
+                    chunk = blob.read(chunk_size)
+            yield chunk
@@ -0,0 +1,143 @@
+"""SQLite-backed memoization of LLM stage responses.
+
+Entries are keyed by stage, model, temperature and a hash of the stage
+prompt, so changing only the art style reuses the cached story and
+review and reruns just the visual stage. A response is recorded under
+the model that actually answered it, so one from a fallback model is
+never served as the primary's. Because the pipeline samples
+at a non-zero temperature, reusing a response is opt-in; responses are
+always recorded so they're available once reuse is switched on.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+from tracing import annotate
+
+DEFAULT_DB_PATH = os.path.join(".cache", "llm_responses.sqlite3")
+
+
+class LLMResponseCache:
+    """Persistent stage-response cache with age and size based eviction"""
+
+    def __init__(self, path=DEFAULT_DB_PATH, max_age=7 * 24 * 3600, max_bytes=50 * 1024 * 1024):
+        self.path = path
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    stage TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    temperature REAL NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    @staticmethod
+    def make_key(stage, model, temperature, prompt):
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return f"{stage}:{model}:{temperature:g}:{prompt_hash}"
+
+    def get(self, stage, model, temperature, prompt):
+        """Return the cached response, or None on a miss"""
+        key = self.make_key(stage, model, temperature, prompt)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age:
+                self.misses[stage] += 1
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits[stage] += 1
+            return row[0]
+
+    def put(self, stage, model, temperature, prompt, response):
+        """Record a response and evict entries past the age or size limit"""
+        key = self.make_key(stage, model, temperature, prompt)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, stage, model, temperature, response, len(response.encode("utf-8")), now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.max_age,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_used"
+        ).fetchall():
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def memoize(self, stage, model, temperature, prompt, compute, reuse=True, answering_models=None):
+        """Return a cached response if reuse is on, otherwise compute and record it.
+
+        ``compute`` returns the response text, or None for a result that
+        shouldn't be cached. ``answering_models()``, if given, is a
+        context manager yielding the list of models that answered the
+        calls ``compute`` made; the response is recorded under those
+        rather than ``model``.
+        """
+        if reuse:
+            cached = self.get(stage, model, temperature, prompt)
+            if cached is not None:
+                annotate(cache="hit")
+                return cached
+        annotate(cache="miss" if reuse else "off")
+        with answering_models() if answering_models is not None else nullcontext([]) as answered:
+            response = compute()
+        if response is not None:
+            try:
+                self.put(stage, "+".join(sorted(set(answered))) or model, temperature, prompt, response)
+            except sqlite3.Error as e:
+                logging.warning(f"Could not cache {stage} response: {e}")
+        return response
+
+    def bind(self, model, temperature, reuse=True, answering_models=None):
+        """Memo callable ``memo(stage, prompt, compute)`` for one LLM setup"""
+        def memo(stage, prompt, compute):
+            return self.memoize(stage, model, temperature, prompt, compute, reuse=reuse,
+                                answering_models=answering_models)
+        return memo
+
+    def stats(self):
+        """Per-stage hit/miss counts and hit rate since the process started"""
+        with self._lock:
+            stages = sorted(set(self.hits) | set(self.misses))
+            return {
+                stage: {
+                    "hits": self.hits[stage],
+                    "misses": self.misses[stage],
+                    "hit_rate": self.hits[stage] / max(1, self.hits[stage] + self.misses[stage]),
+                }
+                for stage in stages
+            }
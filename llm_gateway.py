@@ -0,0 +1,459 @@
+"""Hedged LLM calls with a fallback model and per-model circuit breakers.
+
+``LLMGateway`` sends each call to the primary model. If no answer has
+arrived by the primary's recent p95 latency, the same call also goes to
+a secondary model (or provider), and whichever answers first wins; the
+other is cancelled if it hasn't started, or its answer dropped. A
+primary that fails outright fails over to the secondary at once.
+Streams are hedged the same way on time to first token, and the losing
+stream is closed.
+
+Each model has a circuit breaker: after repeated failures it is skipped
+for a while, then one trial call decides whether to close it again.
+
+``HedgedChatModel`` wraps a gateway as a LangChain chat model, so CrewAI
+agents, the fused stage, the summarizer and streaming chat all go
+through it unchanged.
+"""
+import bisect
+import contextvars
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from tracing import annotate, span
+
+PRIMARY = "primary"
+SECONDARY = "secondary"
+
+
+# Models that answered the calls made inside ``answering_models()``
+_answered = contextvars.ContextVar("llm_answered", default=None)
+
+
+class CircuitOpenError(Exception):
+    """Raised when no model is available because every circuit is open"""
+
+
+@contextmanager
+def answering_models():
+    """Collect the name of the model that answers each gateway call made inside the block"""
+    models = []
+    token = _answered.set(models)
+    try:
+        yield models
+    finally:
+        _answered.reset(token)
+
+
+class LatencyWindow:
+    """Recent latencies of one model, sorted for cheap percentiles"""
+
+    def __init__(self, size=200):
+        self._recent = deque(maxlen=size)
+        self._sorted = []
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            if len(self._recent) == self._recent.maxlen:
+                oldest = self._recent[0]
+                del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+            self._recent.append(seconds)
+            bisect.insort(self._sorted, seconds)
+
+    def __len__(self):
+        return len(self._recent)
+
+    def percentile(self, fraction):
+        with self._lock:
+            if not self._sorted:
+                return None
+            return self._sorted[min(len(self._sorted) - 1, int(len(self._sorted) * fraction))]
+
+
+class CircuitBreaker:
+    """Closed until ``failure_threshold`` failures in a row, then open for ``reset_after`` seconds.
+
+    Once that has passed it is half-open: one trial call is let through,
+    and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_after=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.opens = 0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_after:
+            return "open"
+        return "half-open"
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self.opens += 1
+            self._trial = False
+
+
+class _Route:
+    """One model behind the gateway, with its breaker and latency history"""
+
+    def __init__(self, name, model, breaker):
+        self.name = name
+        self.model = model
+        self.breaker = breaker
+        self.latency = {"invoke": LatencyWindow(), "stream": LatencyWindow()}
+
+
+class LLMGateway:
+    """Hedges slow calls to a secondary model and routes around failing ones"""
+
+    def __init__(self, primary, secondary=None, hedge_quantile=0.95, initial_delay=4.0, min_delay=0.5,
+                 min_samples=20, failure_threshold=5, reset_after=30.0, max_hedges=4, max_workers=32):
+        self.routes = {PRIMARY: _Route(PRIMARY, primary, CircuitBreaker(failure_threshold, reset_after))}
+        if secondary is not None:
+            self.routes[SECONDARY] = _Route(SECONDARY, secondary, CircuitBreaker(failure_threshold, reset_after))
+        self.hedge_quantile = hedge_quantile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._hedge_slots = threading.BoundedSemaphore(max_hedges)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-gateway")
+        self._counts = {"calls": 0, "hedged": 0, "failovers": 0, "wins_primary": 0, "wins_secondary": 0,
+                        "errors": 0, "saved_seconds": 0.0}
+        self._lock = threading.Lock()
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._counts[name] += delta
+
+    def hedge_delay(self, kind):
+        """How long the primary gets before the call is hedged: its recent p95"""
+        window = self.routes[PRIMARY].latency[kind]
+        if len(window) < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, window.percentile(self.hedge_quantile))
+
+    def _call(self, route, kind, call, started):
+        """Run ``call`` on one route, recording latency and breaker outcome"""
+        try:
+            result = call(route.model)
+        except Exception:
+            route.breaker.record_failure()
+            raise
+        route.breaker.record_success()
+        elapsed = time.perf_counter() - started
+        route.latency[kind].add(elapsed)
+        return result, elapsed
+
+    def _submit(self, route, kind, call, hedge=False):
+        started = time.perf_counter()
+        run = contextvars.copy_context().run  # Keep the caller's trace span
+
+        future = self._executor.submit(run, self._call, route, kind, call, started)
+        if hedge:
+            future.add_done_callback(lambda f: self._hedge_slots.release())  # Also runs if cancelled
+        return future
+
+    def _can_hedge(self):
+        secondary = self.routes.get(SECONDARY)
+        if secondary is None:
+            return False
+        if not self._hedge_slots.acquire(blocking=False):
+            return False  # Too many hedges in flight already; don't pile onto the secondary
+        if not secondary.breaker.allow():
+            self._hedge_slots.release()
+            return False
+        return True
+
+    def invoke(self, messages, **kwargs):
+        """``model.invoke(messages, **kwargs)`` on whichever model answers first"""
+        return self._hedged("invoke", lambda model: model.invoke(messages, **kwargs))
+
+    def _hedged(self, kind, call):
+        self._count(calls=1)
+        primary, secondary = self.routes[PRIMARY], self.routes.get(SECONDARY)
+        start = time.perf_counter()
+
+        futures = {}
+        if primary.breaker.allow():
+            futures[self._submit(primary, kind, call)] = primary
+        elif self._can_hedge():
+            futures[self._submit(secondary, kind, call, hedge=True)] = secondary
+            self._count(failovers=1)
+            annotate(llm_circuit="open")
+        else:
+            self._count(errors=1)
+            raise CircuitOpenError("Every LLM circuit is open; try again shortly")
+
+        hedge_at = start + self.hedge_delay(kind)
+        tried_secondary = secondary is None or secondary in futures.values()
+        errors = []
+        pending = set(futures)
+        while pending:
+            timeout = None if tried_secondary else max(0.0, hedge_at - time.perf_counter())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                try:
+                    result, _ = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                winner = futures[future]
+                for loser in pending:
+                    if not loser.cancel():
+                        self._track_loser(loser, futures[loser], time.perf_counter() - start)
+                self._record_win(winner, len(futures) > 1)
+                return result
+
+            if not tried_secondary:
+                # The primary is slower than usual (no result yet) or failed: ask the secondary too
+                tried_secondary = True
+                if self._can_hedge():
+                    pending.add(self._hedge(futures, secondary, kind, call, failover=bool(errors)))
+
+        self._count(errors=1)
+        raise errors[-1]
+
+    def _hedge(self, futures, secondary, kind, call, failover):
+        future = self._submit(secondary, kind, call, hedge=True)
+        futures[future] = secondary
+        self._count(**({"failovers": 1} if failover else {"hedged": 1}))
+        annotate(llm_hedged=True)
+        return future
+
+    def _record_win(self, route, contested):
+        self._count(**{f"wins_{route.name}": 1})
+        models = _answered.get()
+        if models is not None:
+            models.append(getattr(route.model, "model_name", "") or route.name)
+        if contested:
+            annotate(llm_winner=route.name)
+
+    def _track_loser(self, future, route, winner_elapsed):
+        """Once a slower primary finishes anyway, count the time the hedge saved"""
+        if route.name != PRIMARY:
+            return
+
+        def done(f):
+            if not f.cancelled() and f.exception() is None:
+                self._count(saved_seconds=max(0.0, f.result()[1] - winner_elapsed))
+        future.add_done_callback(done)
+
+    def stream(self, messages, **kwargs):
+        """``model.stream(messages, **kwargs)``, hedged on time to first chunk"""
+        self._count(calls=1)
+        primary, secondary = self.routes[PRIMARY], self.routes.get(SECONDARY)
+        start = time.perf_counter()
+        chunks = queue.Queue()
+        pumps = {}
+        race = {}
+
+        def primary_first_chunk(elapsed):
+            # A primary that lost the race still reports when it would have started answering
+            if race.get("winner") == SECONDARY:
+                self._count(saved_seconds=max(0.0, elapsed - race["elapsed"]))
+
+        def launch(route, hedge=False):
+            pump = _StreamPump(route, lambda model: model.stream(messages, **kwargs), chunks, start,
+                               self._hedge_slots if hedge else None,
+                               primary_first_chunk if route.name == PRIMARY else None)
+            pumps[route.name] = pump
+            pump.start()
+
+        if primary.breaker.allow():
+            launch(primary)
+        elif self._can_hedge():
+            launch(secondary, hedge=True)
+            self._count(failovers=1)
+        else:
+            self._count(errors=1)
+            raise CircuitOpenError("Every LLM circuit is open; try again shortly")
+
+        hedge_at = start + self.hedge_delay("stream")
+        tried_secondary = secondary is None or SECONDARY in pumps
+        winner, errors, finished = None, [], set()
+        try:
+            while True:
+                if winner is None and not tried_secondary:
+                    timeout = max(0.0, hedge_at - time.perf_counter())
+                else:
+                    timeout = None
+                try:
+                    name, kind, payload = chunks.get(timeout=timeout)
+                except queue.Empty:
+                    name, kind, payload = None, None, None
+
+                if kind == "chunk" and winner is None:
+                    winner = name
+                    race.update(winner=name, elapsed=time.perf_counter() - start)
+                    for other, pump in pumps.items():
+                        if other != winner:
+                            pump.stop()
+                    self._record_win(self.routes[winner], len(pumps) > 1)
+                if kind == "chunk" and name == winner:
+                    yield payload
+                    continue
+                if kind == "end" and name == winner:
+                    return
+                if kind == "error":
+                    if name == winner:
+                        self._count(errors=1)
+                        raise payload  # Already streaming from this model; too late to switch
+                    errors.append(payload)
+                if kind in ("end", "error"):
+                    finished.add(name)
+
+                if winner is None and not tried_secondary and (kind is None or kind == "error"):
+                    tried_secondary = True
+                    if self._can_hedge():
+                        launch(secondary, hedge=True)
+                        self._count(**({"failovers": 1} if kind == "error" else {"hedged": 1}))
+                        annotate(llm_hedged=True)
+                if winner is None and finished >= set(pumps) and tried_secondary:
+                    self._count(errors=1)
+                    if errors:
+                        raise errors[-1]
+                    return
+        finally:
+            for pump in pumps.values():
+                pump.stop()
+
+    def stats(self):
+        """Call counts, hedge win rates, latency saved and circuit state per model"""
+        with self._lock:
+            counts = dict(self._counts)
+        contested = counts["wins_primary"] + counts["wins_secondary"]
+        counts["models"] = {
+            route.name: {
+                "model": getattr(route.model, "model_name", ""),
+                "circuit": route.breaker.state,
+                "opens": route.breaker.opens,
+                "p95_invoke": route.latency["invoke"].percentile(0.95),
+                "p95_first_chunk": route.latency["stream"].percentile(0.95),
+                "win_rate": counts[f"wins_{route.name}"] / contested if contested else 0.0,
+            }
+            for route in self.routes.values()
+        }
+        return counts
+
+
+class _StreamPump(threading.Thread):
+    """Reads one model's stream into a shared queue until told to stop"""
+
+    def __init__(self, route, open_stream, chunks, started, hedge_slots, on_first_chunk=None):
+        super().__init__(name=f"llm-stream-{route.name}", daemon=True)
+        self.route = route
+        self.open_stream = open_stream
+        self.chunks = chunks
+        self.started = started
+        self.hedge_slots = hedge_slots
+        self.on_first_chunk = on_first_chunk
+        self._stopped = threading.Event()
+        self._run_in = contextvars.copy_context().run
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        self._run_in(self._pump)
+
+    def _pump(self):
+        stream = None
+        first = True
+        try:
+            stream = self.open_stream(self.route.model)
+            for chunk in stream:
+                if first:
+                    first = False
+                    elapsed = time.perf_counter() - self.started
+                    self.route.latency["stream"].add(elapsed)
+                    if self.on_first_chunk is not None:
+                        self.on_first_chunk(elapsed)
+                if self._stopped.is_set():
+                    break
+                self.chunks.put((self.route.name, "chunk", chunk))
+            self.route.breaker.record_success()
+            self.chunks.put((self.route.name, "end", None))
+        except Exception as e:
+            if not self._stopped.is_set():
+                self.route.breaker.record_failure()
+                logging.warning(f"LLM stream from {self.route.name} model failed: {e}")
+            self.chunks.put((self.route.name, "error", e))
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()  # Closes the HTTP response of a stream that lost the race
+            if self.hedge_slots is not None:
+                self.hedge_slots.release()
+
+
+class HedgedChatModel(BaseChatModel):
+    """LangChain chat model that sends every call through an ``LLMGateway``.
+
+    ``max_tokens`` caps the length of each answer when set.
+    """
+    gateway: Any = None
+    model_name: str = ""
+    max_tokens: int | None = None
+
+    @property
+    def _llm_type(self):
+        return "hedged-chat"
+
+    def _limits(self, kwargs):
+        if self.max_tokens is not None:
+            kwargs.setdefault("max_tokens", self.max_tokens)
+        return kwargs
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        kwargs = self._limits(kwargs)
+        with span("llm.gateway", kind="invoke"):
+            message = self.gateway.invoke(messages, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        kwargs = self._limits(kwargs)
+        for chunk in self.gateway.stream(messages, stop=stop, **kwargs):
+            if run_manager is not None:
+                run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
@@ -0,0 +1,224 @@
+"""Pack visual-stage output into an image prompt that fits the model's budget.
+
+The image model only reads so much of a prompt, so cutting one at a
+fixed character count tends to drop the styling at its end mid-word.
+Prompts are instead compiled from separate elements, each with a
+priority: the panel layout and what happens in each panel come first,
+then the characters, style and tone, then the setting, and the fixed
+comic-strip styling last. Elements are added in priority order while
+they fit the token budget; one that doesn't fit is tried in its short
+form (its first sentence) and otherwise left out, never cut mid-word.
+The kept elements are written out in reading order.
+"""
+import re
+from dataclasses import dataclass
+
+from conversation_summary import count_tokens
+
+# About the 1000 characters that used to be sent to Fireworks
+IMAGE_PROMPT_TOKENS = 240
+# Caps the visual stage's answer; room for every field plus the model's own reasoning
+VISUAL_MAX_TOKENS = 1024
+# Caps the fused answer, which adds the story and its reviewed version to the visual fields
+FUSED_MAX_TOKENS = VISUAL_MAX_TOKENS + 512
+
+# Element priorities, most important first
+LAYOUT, ACTION, CHARACTERS, LOOK, SETTING, STYLING = range(6)
+
+STRIP_STYLING = [
+    "clear panel borders",
+    "consistent character design throughout all panels",
+    "speech bubbles with readable text",
+    "expressive characters",
+    "vibrant colors",
+    "detailed artwork",
+    "dynamic compositions",
+    "professional comic book illustration style",
+]
+
+PANEL_STYLING = [
+    "one scene filling the frame",
+    "no panel borders or grid",
+    "consistent character design",
+    "speech bubbles with readable text",
+    "expressive characters",
+    "vibrant colors",
+    "detailed artwork",
+]
+
+VARIATION = "Alternative visual interpretation {take}, different camera angle and composition."
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_CLAUSE_END = re.compile(r"(?<=[.!?;,])\s+")
+_VARIATION_LEAD = re.compile(r"^Alternative visual interpretation(?: \d+)?, different camera angle and composition\.\s*")
+
+
+@dataclass
+class Element:
+    """One piece of a prompt; lower ``(tier, order)`` priority is packed first"""
+    text: str
+    priority: tuple
+    short: str = ""
+
+
+def first_sentence(text):
+    return _SENTENCE_END.split(text.strip(), maxsplit=1)[0]
+
+
+def _shortened(text):
+    short = first_sentence(text)
+    return short if short != text.strip() else ""
+
+
+def _cost(text):
+    return count_tokens(text) + 1
+
+
+def pack(elements, max_tokens=IMAGE_PROMPT_TOKENS):
+    """Join as many whole elements as fit in ``max_tokens``, in their original order.
+
+    Elements of equal priority are treated alike: if they don't all fit
+    in full, each gets its short form first and the remaining room goes
+    to full forms in order.
+    """
+    elements = [e for e in elements if e.text.strip()]
+    chosen = {}
+    used = 0
+    for priority in sorted({e.priority for e in elements}):
+        tier = [i for i, e in enumerate(elements) if e.priority == priority]
+        full = {i: elements[i].text.strip() for i in tier}
+        if used + sum(_cost(text) for text in full.values()) <= max_tokens:
+            chosen.update(full)
+            used += sum(_cost(text) for text in full.values())
+            continue
+        for i in tier:
+            text = elements[i].short or full[i]
+            if used + _cost(text) <= max_tokens:
+                chosen[i] = text
+                used += _cost(text)
+        for i in tier:
+            if i in chosen and chosen[i] != full[i]:
+                extra = _cost(full[i]) - _cost(chosen[i])
+                if used + extra <= max_tokens:
+                    chosen[i] = full[i]
+                    used += extra
+
+    # Per-element counts can drift from the joined text's; drop the least important until it fits
+    kept = sorted(chosen)
+    while len(kept) > 1 and count_tokens(_join(chosen[i] for i in kept)) > max_tokens:
+        kept.remove(max(kept, key=lambda i: (elements[i].priority, i)))
+    return _join(chosen[i] for i in kept)
+
+
+def _join(texts):
+    prompt = " ".join(texts)
+    return f"{prompt[:-1]}." if prompt.endswith(",") else prompt
+
+
+def _sentence(text):
+    text = text.strip()
+    return text if not text or text[-1] in ".!?" else f"{text}."
+
+
+def _labelled(label, text, tier):
+    short = _shortened(text)
+    return Element(f"{label}: {_sentence(text)}", (tier, 0), f"{label}: {short}" if short else "")
+
+
+def _styling(clauses):
+    """Each styling clause as its own element, so the least important go first"""
+    last = len(clauses) - 1
+    return [
+        Element(f"{clause}{'.' if i == last else ','}", (STYLING, i))
+        for i, clause in enumerate(clauses)
+    ]
+
+
+def _scene_elements(scene):
+    """Free-text description as one element per sentence, earlier sentences first"""
+    return [
+        Element(sentence, (ACTION, i))
+        for i, sentence in enumerate(_SENTENCE_END.split(scene.strip()))
+        if sentence
+    ]
+
+
+def strip_elements(panel_actions, style, tone, panels, characters="", setting="", look="", scene=""):
+    """Elements of a prompt that draws the whole strip in one image"""
+    elements = [Element(f"A {panels}-panel {style} comic strip with a {tone} mood, "
+                        f"panels arranged horizontally or in a grid.", (LAYOUT, 0))]
+    if characters:
+        elements.append(_labelled("Characters", characters, CHARACTERS))
+    if setting:
+        elements.append(_labelled("Setting", setting, SETTING))
+    elements.extend(_labelled(f"Panel {index}", action, ACTION)
+                    for index, action in enumerate(panel_actions, start=1))
+    elements.extend(_scene_elements(scene))
+    if look:
+        elements.append(Element(_sentence(look), (LOOK, 0), _shortened(look)))
+    return elements + _styling(STRIP_STYLING)
+
+
+def compile_strip_prompt(panel_actions, style, tone, panels, characters="", setting="", look="", scene="",
+                         max_tokens=IMAGE_PROMPT_TOKENS):
+    """Image prompt for a whole strip, packed into ``max_tokens``"""
+    return pack(strip_elements(panel_actions, style, tone, panels, characters, setting, look, scene), max_tokens)
+
+
+def compile_panel_prompt(description, characters, style, index, panels, max_tokens=IMAGE_PROMPT_TOKENS):
+    """Image prompt for one separately drawn panel, packed into ``max_tokens``"""
+    elements = [
+        Element(_sentence(description), (LAYOUT, 0), _shortened(description)),
+        Element(f"Panel {index} of {panels}, a single comic panel illustration in {style} style.", (ACTION, 0)),
+    ]
+    if characters:
+        elements.append(_labelled("Characters", characters, CHARACTERS))
+    return pack(elements + _styling(PANEL_STYLING), max_tokens)
+
+
+def fit_prompt(prompt, max_tokens=IMAGE_PROMPT_TOKENS):
+    """Keep the leading clauses of an already built prompt that fit ``max_tokens``.
+
+    A first clause that is over budget on its own is cut after its last
+    whole word that fits.
+    """
+    prompt = " ".join(prompt.split())
+    if count_tokens(prompt) <= max_tokens:
+        return prompt
+    kept, used = [], 0
+    for clause in _CLAUSE_END.split(prompt):
+        used += _cost(clause)
+        if used > max_tokens:
+            if not kept:
+                kept.append(_leading_words(clause, max_tokens - 1))
+            break
+        kept.append(clause)
+    return _join(kept)
+
+
+def _leading_words(text, max_tokens):
+    """The most leading whole words of ``text`` that fit ``max_tokens``"""
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle])) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low])
+
+
+def unvaried(prompt):
+    """``prompt`` without the request a previous ``vary_prompt`` put in front of it"""
+    return _VARIATION_LEAD.sub("", prompt.strip())
+
+
+def vary_prompt(prompt, take=1, max_tokens=IMAGE_PROMPT_TOKENS):
+    """Ask for another take on ``prompt``; the request leads so it always survives fitting.
+
+    A prompt that is already a variation has its request replaced rather
+    than stacked, and the take number keeps each regeneration's prompt,
+    and so its image cache entry, distinct.
+    """
+    return fit_prompt(f"{VARIATION.format(take=take)} {unvaried(prompt)}", max_tokens)
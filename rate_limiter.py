@@ -0,0 +1,236 @@
+"""Process-wide rate limiting for Groq and Fireworks calls.
+
+Every endpoint (chat, each story stage, image submit, image poll) has its
+own token bucket, and every provider has an adaptive concurrency limit.
+A 429 or ``Retry-After`` from the provider halves that provider's limit
+and pauses new calls until the retry time; successful calls then grow
+the limit back additively.
+"""
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from tracing import annotate
+
+# provider -> max concurrency and endpoint -> (requests per second, burst)
+DEFAULT_LIMITS = {
+    "groq": {
+        "concurrency": 8,
+        "endpoints": {
+            "chat": (5.0, 10),
+            "summary": (1.0, 2),
+            "story": (2.0, 4),
+            "judge": (2.0, 4),
+            "visual": (2.0, 4),
+            "fused": (2.0, 4),
+        },
+    },
+    "fireworks": {
+        "concurrency": 4,
+        "endpoints": {
+            "submit": (2.0, 6),  # A full six-panel set can go out at once
+            "poll": (10.0, 20),
+        },
+    },
+}
+DEFAULT_ENDPOINT_LIMIT = (2.0, 4)
+DEFAULT_RETRY_AFTER = 1.0
+
+
+def _status_code(exc):
+    for candidate in (exc, getattr(exc, "response", None)):
+        code = getattr(candidate, "status_code", None)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def is_rate_limited(exc):
+    """Whether an exception (or what caused it) is a provider 429"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if _status_code(exc) == 429:
+            return True
+        message = str(exc).lower()
+        if re.search(r"\b429\b", message) or "rate limit" in message:
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def retry_after_seconds(exc):
+    """Seconds to back off, from a Retry-After header if the error carries one"""
+    while exc is not None:
+        headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                return DEFAULT_RETRY_AFTER
+        exc = exc.__cause__
+    return DEFAULT_RETRY_AFTER
+
+
+class TokenBucket:
+    """Classic token bucket; callers reserve a token and sleep off any debt"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take one token and return how long to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+
+class AdaptiveConcurrency:
+    """Concurrency limit with multiplicative decrease and additive increase"""
+
+    def __init__(self, max_limit, min_limit=1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                wait = self.blocked_until - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                elif self.in_flight < max(self.min_limit, int(self.limit)):
+                    break
+                else:
+                    self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False, retry_after=None):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(float(self.min_limit), self.limit / 2)
+                if retry_after:
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            else:
+                # Roughly +1 per limit's worth of successful calls
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class _EndpointStats:
+    def __init__(self):
+        self.waiting = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.throttles = 0
+        self.wait_seconds = 0.0
+
+
+class RateLimiter:
+    """Token buckets per endpoint plus adaptive concurrency per provider"""
+
+    def __init__(self, limits=None):
+        limits = limits or DEFAULT_LIMITS
+        self._limits = limits
+        self._concurrency = {
+            provider: AdaptiveConcurrency(config["concurrency"]) for provider, config in limits.items()
+        }
+        self._buckets = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, provider, endpoint):
+        key = (provider, endpoint)
+        with self._lock:
+            if key not in self._buckets:
+                if provider not in self._concurrency:
+                    self._concurrency[provider] = AdaptiveConcurrency(4)
+                rate, burst = self._limits.get(provider, {}).get("endpoints", {}).get(endpoint, DEFAULT_ENDPOINT_LIMIT)
+                self._buckets[key] = TokenBucket(rate, burst)
+                self._stats[key] = _EndpointStats()
+            return self._buckets[key], self._stats[key]
+
+    @contextmanager
+    def slot(self, provider, endpoint):
+        """Wait for a token and a concurrency slot, then run the block.
+
+        Raising a rate-limit error out of the block counts as a throttle.
+        """
+        bucket, stats = self._endpoint(provider, endpoint)
+        concurrency = self._concurrency[provider]
+
+        started = time.monotonic()
+        with self._lock:
+            stats.waiting += 1
+        try:
+            delay = bucket.reserve()
+            if delay:
+                time.sleep(delay)
+            concurrency.acquire()
+        finally:
+            waited = time.monotonic() - started
+            with self._lock:
+                stats.waiting -= 1
+                stats.wait_seconds += waited
+        annotate(limiter_wait=waited)
+
+        with self._lock:
+            stats.in_flight += 1
+            stats.calls += 1
+        throttled, retry_after = False, None
+        try:
+            yield
+        except Exception as e:
+            if is_rate_limited(e):
+                throttled, retry_after = True, retry_after_seconds(e)
+                with self._lock:
+                    stats.throttles += 1
+                logging.warning(f"{provider}/{endpoint} throttled; backing off {retry_after:.1f}s")
+            raise
+        finally:
+            with self._lock:
+                stats.in_flight -= 1
+            concurrency.release(throttled=throttled, retry_after=retry_after)
+
+    def call(self, provider, endpoint, fn, *args, **kwargs):
+        """Run ``fn`` inside a rate-limited slot"""
+        with self.slot(provider, endpoint):
+            return fn(*args, **kwargs)
+
+    def stats(self):
+        """Per-provider limits and per-endpoint queue depth and throttle counts"""
+        with self._lock:
+            providers = {
+                provider: {
+                    "concurrency_limit": int(c.limit),
+                    "max_concurrency": c.max_limit,
+                    "in_flight": c.in_flight,
+                    "paused_for": max(0.0, c.blocked_until - time.monotonic()),
+                }
+                for provider, c in self._concurrency.items()
+            }
+            endpoints = {
+                f"{provider}/{endpoint}": {
+                    "queued": s.waiting,
+                    "in_flight": s.in_flight,
+                    "calls": s.calls,
+                    "throttles": s.throttles,
+                    "avg_wait": s.wait_seconds / s.calls if s.calls else 0.0,
+                }
+                for (provider, endpoint), s in self._stats.items()
+            }
+        return {"providers": providers, "endpoints": endpoints}
@@ -0,0 +1,321 @@
+"""Per-session memory accounting, budgets and idle eviction.
+
+Every browser tab is a Streamlit session with its own conversation,
+loaded journal pages, summary, agent memory and finished comic. On a
+shared server with many open or abandoned tabs that adds up, so
+``SessionMemory`` keeps track of what each session holds:
+
+- conversation memory is held to a token and a byte budget; turns that
+  don't fit are dropped from RAM (they stay in the journal on disk and
+  can be loaded again),
+- finished comic images are spilled to disk (``SpillStore``) and the job
+  result keeps only a small ``SpilledImage`` reference,
+- sessions that have been idle for a while are marked for eviction;
+  each clears its own heavy state on its next run and reloads it from
+  the journal.
+"""
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import deque
+from dataclasses import dataclass
+
+from conversation_summary import count_tokens
+
+DEFAULT_SPILL_DIR = os.path.join(".cache", "spill")
+DEFAULT_TOKEN_BUDGET = 6000
+DEFAULT_BYTE_BUDGET = 2 * 1024 * 1024
+
+# Shared or unmeasurable objects a session merely points at
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+           threading.Thread, type(threading.Lock()))
+
+
+def deep_size(obj, seen=None, max_depth=12):
+    """Approximate bytes held by ``obj`` and everything it refers to.
+
+    Objects are counted once however often they are referenced; classes,
+    modules, functions, threads and locks are not followed.
+    """
+    seen = set() if seen is None else seen
+    stack = [(obj, 0)]
+    total = 0
+    while stack:
+        item, depth = stack.pop()
+        if id(item) in seen or isinstance(item, _OPAQUE):
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item, 0)
+        if depth >= max_depth or isinstance(item, (str, bytes, bytearray, int, float, complex, bool)):
+            continue
+        if isinstance(item, dict):
+            children = [*item.keys(), *item.values()]
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            children = list(item)
+        else:
+            children = list(getattr(item, "__dict__", {}).values())
+            children += [getattr(item, slot) for slot in getattr(type(item), "__slots__", ()) if hasattr(item, slot)]
+        stack.extend((child, depth + 1) for child in children)
+    return total
+
+
+def message_tokens(messages):
+    return sum(count_tokens(m["content"]) for m in messages)
+
+
+def excess_messages(messages, max_tokens, max_bytes, keep=2):
+    """How many of the oldest ``messages`` to drop so the rest fit both budgets.
+
+    The newest ``keep`` messages are never counted as excess.
+    """
+    tokens = message_tokens(messages)
+    size = deep_size(messages)
+    drop = 0
+    while drop < len(messages) - keep and (tokens > max_tokens or size > max_bytes):
+        tokens -= count_tokens(messages[drop]["content"])
+        size -= deep_size(messages[drop])
+        drop += 1
+    return drop
+
+
+def trim_chat_memory(memory, max_tokens):
+    """Drop the oldest turns of a LangChain chat memory until it fits ``max_tokens``.
+
+    ``ConversationBufferMemory`` accepts a ``max_token_limit`` but never
+    enforces it, so the budget is applied here. Returns the number of
+    turns dropped.
+    """
+    messages = memory.chat_memory.messages
+    tokens = sum(count_tokens(str(m.content)) for m in messages)
+    dropped = 0
+    while messages and tokens > max_tokens:
+        tokens -= count_tokens(str(messages.pop(0).content))
+        dropped += 1
+    return dropped
+
+
+@dataclass(frozen=True)
+class SpilledImage:
+    """A finished image kept on disk instead of in the job result"""
+    path: str
+    nbytes: int
+
+    def load(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+class SpillStore:
+    """Content-addressed files for images spilled out of RAM.
+
+    Entries outlive the job results that point at them (``ttl``) and the
+    oldest go first once the directory passes ``max_bytes``.
+    """
+
+    SUFFIX = ".spill"
+
+    def __init__(self, directory=DEFAULT_SPILL_DIR, max_bytes=512 * 1024 * 1024, ttl=3 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spilled = 0
+        self.spilled_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, data):
+        """Write ``data`` to disk and return a ``SpilledImage``, or None if it couldn't be written"""
+        path = os.path.join(self.directory, hashlib.sha256(data).hexdigest() + self.SUFFIX)
+        with self._lock:
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logging.warning(f"Could not spill image to disk: {e}")
+                return None
+            self.spilled += 1
+            self.spilled_bytes += len(data)
+            self._evict()
+        return SpilledImage(path, len(data))
+
+    def _evict(self):
+        now = time.time()
+        live = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.ttl:
+                _remove(path)
+            else:
+                live.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        live.sort()
+        for _, size, path in live:
+            if total <= self.max_bytes:
+                break
+            _remove(path)
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            return {"spilled": self.spilled, "spilled_bytes": self.spilled_bytes}
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def spill_image(store, result):
+    """``result`` with its image bytes moved to disk, or unchanged if they can't be"""
+    import dataclasses
+
+    if store is None or not isinstance(result.image, bytes):
+        return result
+    spilled = store.put(result.image)
+    return dataclasses.replace(result, image=spilled) if spilled is not None else result
+
+
+def load_image(image):
+    """Image bytes or URL for display, reading a spilled image back from disk"""
+    return image.load() if isinstance(image, SpilledImage) else image
+
+
+def process_rss():
+    """Resident memory of this process in bytes, or None where it can't be read"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class _Session:
+    def __init__(self, label):
+        self.label = label
+        self.items = {}
+        self.last_seen = time.monotonic()
+        self.evicted = False
+        self.bytes = 0
+        self.tokens = 0
+
+
+class SessionMemory:
+    """Process-wide view of what every session holds, with idle eviction.
+
+    Each script run calls ``track`` with the session's heavy objects.
+    A sweep from any session only marks the ones idle for ``idle_after``
+    seconds and lets go of their objects; it never touches another
+    session's state, which that session's own script thread may be
+    using. A marked session clears its objects in place (lists emptied,
+    memories cleared) on its next ``track`` and reloads from the
+    journal. Sessions idle for ``forget_after`` are dropped from the
+    registry altogether.
+    """
+
+    def __init__(self, token_budget=DEFAULT_TOKEN_BUDGET, byte_budget=DEFAULT_BYTE_BUDGET,
+                 idle_after=15 * 60, forget_after=6 * 3600, sweep_every=30):
+        self.token_budget = token_budget
+        self.byte_budget = byte_budget
+        self.idle_after = idle_after
+        self.forget_after = forget_after
+        self.sweep_every = sweep_every
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.trimmed_messages = 0
+        self._sessions = {}
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+
+    def track(self, session_id, label, **items):
+        """Record this session's heavy objects and measure them.
+
+        Returns True if the session was marked for eviction while it
+        was idle; its objects have then just been cleared and the caller
+        should reload them.
+        """
+        size = deep_size(items)
+        tokens = message_tokens(items.get("messages") or []) + message_tokens(items.get("older_messages") or [])
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session(label)
+            evicted, session.evicted = session.evicted, False
+            if evicted:
+                self.evictions += 1
+                self.evicted_bytes += size
+        if evicted:
+            # On this session's own thread, so nothing else is using these objects
+            _clear(items)
+            size, tokens = deep_size(items), 0
+            logging.info(f"Evicted idle session {label}")
+        with self._lock:
+            session.items = items
+            session.last_seen = time.monotonic()
+            session.bytes = size
+            session.tokens = tokens
+            if session.last_seen - self._last_sweep > self.sweep_every:
+                self._last_sweep = session.last_seen
+                self._sweep(session.last_seen)
+        return evicted
+
+    def record_trim(self, count):
+        with self._lock:
+            self.trimmed_messages += count
+
+    def _sweep(self, now):
+        # Caller holds self._lock
+        for session_id, session in list(self._sessions.items()):
+            idle = now - session.last_seen
+            if idle > self.forget_after:
+                del self._sessions[session_id]
+            elif idle > self.idle_after and session.items:
+                # The session clears its own state when it next runs
+                session.items = {}
+                session.evicted = True
+                logging.info(f"Marked idle session {session.label} for eviction after {idle:.0f}s")
+
+    def usage(self):
+        """Per-session and total footprint, newest activity first"""
+        now = time.monotonic()
+        with self._lock:
+            sessions = [
+                {"session": s.label, "bytes": s.bytes, "tokens": s.tokens,
+                 "idle_seconds": now - s.last_seen, "evicted": s.evicted}
+                for s in sorted(self._sessions.values(), key=lambda s: s.last_seen, reverse=True)
+            ]
+            return {
+                "sessions": sessions,
+                "total_bytes": sum(s["bytes"] for s in sessions),
+                "total_tokens": sum(s["tokens"] for s in sessions),
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes,
+                "trimmed_messages": self.trimmed_messages,
+                "rss": process_rss(),
+            }
+
+
+def _clear(items):
+    for value in items.values():
+        if isinstance(value, (list, dict, deque)):
+            value.clear()
+        elif hasattr(value, "clear"):
+            try:
+                value.clear()
+            except Exception as e:
+                logging.warning(f"Could not clear {type(value).__name__}: {e}")
@@ -0,0 +1,263 @@
+"""Similarity index over past conversations and the comics made from them.
+
+Each indexed conversation gets a MinHash signature of its word
+shingles, split into bands. A lookup only scores entries that share at
+least one band with the query, then estimates their Jaccard similarity
+from the fraction of matching signature slots. Signatures and band keys
+live in NumPy arrays, so a lookup is a couple of vectorized comparisons
+however many entries there are; the stage outputs stay in SQLite and are
+only read for a match.
+
+Entries record the story, review, visual plan and image prompt of a
+finished comic. A close enough match lets the pipeline skip the story
+and judge stages, and, when the style, tone, panels and layout are the
+same, the visual stage too; the recompiled image prompt then comes back
+from the image cache. Lookups are limited to the asking user's own
+journal unless the index is shared.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass
+
+import numpy as np
+
+from tracing import span
+
+DEFAULT_DB_PATH = os.path.join(".cache", "similarity.sqlite3")
+DEFAULT_THRESHOLD = 0.8
+
+_WORD = re.compile(r"\w+")
+
+
+@dataclass
+class Match:
+    """A past comic whose conversation resembles the query"""
+    similarity: float
+    user_id: str
+    style: str
+    tone: str
+    panels: int
+    layout: str
+    story: str
+    final_story: str
+    visual_plan: str
+    image_prompt: str
+
+    def same_settings(self, style, tone, panels, layout):
+        return (self.style, self.tone, self.panels, self.layout) == (style, tone, panels, layout)
+
+
+class MinHasher:
+    """MinHash signatures of word shingles, with a fixed seed so they persist"""
+
+    def __init__(self, num_perm=64, bands=16, shingle=3, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle = shingle
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: ((a * x + b) mod 2**64) >> 32, with odd a
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        rows = num_perm // bands
+        self._band_mix = rng.integers(1, 2 ** 63, size=rows, dtype=np.uint64) | np.uint64(1)
+
+    def shingles(self, text):
+        words = _WORD.findall(text.lower())
+        if len(words) <= self.shingle:
+            return {" ".join(words)} if words else set()
+        return {" ".join(words[i:i + self.shingle]) for i in range(len(words) - self.shingle + 1)}
+
+    def signature(self, text):
+        """uint32 signature of ``num_perm`` slots; all-max for empty text"""
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in self.shingles(text)), dtype=np.uint64
+        )
+        if not len(hashes):
+            return np.full(self.num_perm, 0xFFFFFFFF, dtype=np.uint32)
+        with np.errstate(over="ignore"):
+            permuted = (hashes[:, None] * self._a + self._b) >> np.uint64(32)
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def band_keys(self, signature):
+        """One 64-bit key per band (per row, for a stack of signatures); sharing a key makes a candidate"""
+        rows = signature.reshape(*signature.shape[:-1], self.bands, -1).astype(np.uint64)
+        with np.errstate(over="ignore"):
+            return (rows * self._band_mix).sum(axis=-1, dtype=np.uint64)
+
+
+class SimilarityIndex:
+    """Persistent MinHash index of conversations and their comic outputs"""
+
+    def __init__(self, path=DEFAULT_DB_PATH, hasher=None, shared=False):
+        self.path = path
+        self.hasher = hasher or MinHasher()
+        self.shared = shared
+        self.lookups = 0
+        self.reused = {"full": 0, "story": 0}
+        self._latencies = deque(maxlen=1000)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    style TEXT,
+                    tone TEXT,
+                    panels INTEGER,
+                    layout TEXT,
+                    signature BLOB NOT NULL,
+                    story TEXT,
+                    final_story TEXT,
+                    visual_plan TEXT,
+                    image_prompt TEXT
+                )
+            """)
+
+        self._size = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._owners = np.empty(0, dtype=np.int32)
+        self._signatures = np.empty((0, self.hasher.num_perm), dtype=np.uint32)
+        self._bands = np.empty((0, self.hasher.bands), dtype=np.uint64)
+        self._user_numbers = {}
+        self.build_seconds = self._load()
+
+    def __len__(self):
+        return self._size
+
+    def _user_number(self, user_id):
+        return self._user_numbers.setdefault(user_id, len(self._user_numbers))
+
+    def _grow(self, needed):
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        self._ids = np.resize(self._ids, capacity)
+        self._owners = np.resize(self._owners, capacity)
+        self._signatures = np.resize(self._signatures, (capacity, self.hasher.num_perm))
+        self._bands = np.resize(self._bands, (capacity, self.hasher.bands))
+
+    def _append(self, entry_id, user_id, signature):
+        self._grow(self._size + 1)
+        self._ids[self._size] = entry_id
+        self._owners[self._size] = self._user_number(user_id)
+        self._signatures[self._size] = signature
+        self._bands[self._size] = self.hasher.band_keys(signature)
+        self._size += 1
+
+    def _load(self):
+        """Rebuild the in-memory arrays from SQLite; returns the seconds it took"""
+        start = time.perf_counter()
+        width = self.hasher.num_perm * 4
+        rows = [
+            row for row in self._conn.execute("SELECT id, user_id, signature FROM entries ORDER BY id")
+            if len(row[2]) == width
+        ]
+        self._grow(len(rows))
+        size = len(rows)
+        if size:
+            signatures = np.frombuffer(b"".join(row[2] for row in rows), dtype=np.uint32).reshape(size, -1)
+            self._ids[:size] = [row[0] for row in rows]
+            self._owners[:size] = [self._user_number(row[1]) for row in rows]
+            self._signatures[:size] = signatures
+            self._bands[:size] = self.hasher.band_keys(signatures)
+        self._size = size
+        return time.perf_counter() - start
+
+    def add(self, user_id, conversation_text, style, tone, panels, layout, story, final_story,
+            visual_plan="", image_prompt=""):
+        """Index a finished comic under its conversation"""
+        signature = self.hasher.signature(conversation_text)
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    """INSERT INTO entries (user_id, created, style, tone, panels, layout, signature,
+                                            story, final_story, visual_plan, image_prompt)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (user_id, time.time(), style, tone, panels, layout, signature.tobytes(),
+                     story, final_story, visual_plan, image_prompt),
+                )
+            self._append(cursor.lastrowid, user_id, signature)
+        return cursor.lastrowid
+
+    def lookup(self, user_id, conversation_text, threshold=DEFAULT_THRESHOLD, limit=5):
+        """Past comics at least ``threshold`` similar to this conversation, closest first"""
+        if not self.hasher.shingles(conversation_text):
+            return []
+        start = time.perf_counter()
+        with span("similarity.lookup", entries=self._size) as lookup_span:
+            signature = self.hasher.signature(conversation_text)
+            bands = self.hasher.band_keys(signature)
+            with self._lock:
+                size = self._size
+                candidates = (self._bands[:size] == bands).any(axis=1)
+                if not self.shared:
+                    candidates &= self._owners[:size] == self._user_numbers.get(user_id, -1)
+                rows = np.flatnonzero(candidates)
+                scores = (self._signatures[rows] == signature).mean(axis=1)
+                ids = self._ids[rows]
+            order = np.argsort(-scores)[:limit]
+            best = [(int(ids[i]), float(scores[i])) for i in order if scores[i] >= threshold]
+            matches = self._fetch(best)
+            lookup_span.set(candidates=len(rows), matches=len(matches),
+                            similarity=matches[0].similarity if matches else 0.0)
+
+        with self._lock:
+            self.lookups += 1
+            self._latencies.append(time.perf_counter() - start)
+        return matches
+
+    def _fetch(self, scored):
+        if not scored:
+            return []
+        similarity = dict(scored)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT id, user_id, style, tone, panels, layout, story, final_story, visual_plan, image_prompt
+                    FROM entries WHERE id IN ({",".join("?" * len(scored))})""",
+                list(similarity),
+            ).fetchall()
+        matches = [Match(similarity[row[0]], *row[1:]) for row in rows]
+        return sorted(matches, key=lambda m: -m.similarity)
+
+    def record_reuse(self, kind):
+        """Count a lookup whose match was used: ``"full"`` or ``"story"``"""
+        with self._lock:
+            self.reused[kind] += 1
+
+    def stats(self):
+        """Entries, lookups, reuse rate and lookup latency percentiles (ms)"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            reused = dict(self.reused)
+            lookups = self.lookups
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+        return {
+            "entries": self._size,
+            "build_seconds": self.build_seconds,
+            "lookups": lookups,
+            "reused": reused,
+            "reuse_rate": sum(reused.values()) / lookups if lookups else 0.0,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+        }
+
@@ -0,0 +1,74 @@
+"""Share one in-flight computation between identical concurrent requests.
+
+A double click, a second browser tab or a retry while the first attempt
+is still running would otherwise start the same work twice. With
+``SingleFlight.do(key, fn)`` the first caller for a key runs ``fn`` and
+every caller that arrives with the same key before it finishes waits
+for that result (or exception) instead of starting its own.
+"""
+import threading
+import time
+
+from tracing import annotate
+
+
+class Flight:
+    """One in-flight computation; ``progress`` is whatever the leader wants followers to see"""
+
+    def __init__(self):
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.followers = 0
+        self.started = time.monotonic()
+        self._done = threading.Event()
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls by key and counts what it saved"""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, on_wait=None, wait_interval=1.0):
+        """Return ``fn(flight)``, or the result of an identical call already in flight.
+
+        A follower calls ``on_wait(flight, elapsed)`` every
+        ``wait_interval`` seconds while it waits.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+                self.leaders += 1
+            else:
+                flight.followers += 1
+                self.coalesced += 1
+
+        if not leader:
+            annotate(coalesced=True)
+            while not flight._done.wait(wait_interval):
+                if on_wait:
+                    on_wait(flight, time.monotonic() - flight.started)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn(flight)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight._done.set()
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._flights), "leaders": self.leaders, "coalesced": self.coalesced}
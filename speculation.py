@@ -0,0 +1,153 @@
+"""Speculative story and review runs while the user is still chatting.
+
+Once a conversation is long enough, the app can start the story and
+judge stages in the background. Each new message supersedes the run for
+the previous conversation: a run that hasn't started is cancelled, and
+one in flight stops after its current stage and is discarded. When the
+user asks for a comic, a finished (or nearly finished) run for the same
+conversation means only the visual and image stages are left.
+
+``SpeculationStats`` is shared across sessions and counts what that
+costs and buys: LLM seconds spent on runs that were never used, and
+seconds taken off comic generation by runs that were.
+"""
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import CancelledError, TimeoutError
+
+
+class SpeculationCancelled(Exception):
+    """Raised inside a run that was superseded between stages"""
+
+
+class SpeculationStats:
+    """Process-wide counts of speculative work used and wasted"""
+
+    def __init__(self):
+        self.started = 0
+        self.used = 0
+        self.cancelled = 0
+        self.wasted = 0
+        self.wasted_seconds = 0.0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "started": self.started,
+                "used": self.used,
+                "cancelled": self.cancelled,
+                "wasted": self.wasted,
+                "wasted_seconds": self.wasted_seconds,
+                "saved_seconds": self.saved_seconds,
+            }
+
+
+class _Run:
+    def __init__(self, key):
+        self.key = key
+        self.future = None
+        self.cancelled = threading.Event()
+        self.taken = False
+        self.finished = False
+        self.seconds = 0.0
+        self._counted = False
+        self._lock = threading.Lock()
+
+    def settle(self, stats):
+        """Count a finished, superseded run as wasted, exactly once"""
+        with self._lock:
+            if self.finished and self.cancelled.is_set() and not self._counted:
+                self._counted = True
+                stats.add(wasted=1, wasted_seconds=self.seconds)
+
+
+def conversation_key(conversation_text):
+    return hashlib.sha256(conversation_text.encode("utf-8")).hexdigest()
+
+
+class StorySpeculator:
+    """One session's speculative run: at most one current, keyed by conversation"""
+
+    def __init__(self, executor, stats):
+        self.executor = executor
+        self.stats = stats
+        self._current = None
+        self._lock = threading.Lock()
+
+    def refresh(self, conversation_text, work):
+        """Make sure a run for this conversation exists, superseding any other.
+
+        ``work(check)`` returns ``(story, final_story)``; it should call
+        ``check()`` between stages so a superseded run stops early.
+        """
+        key = conversation_key(conversation_text)
+        with self._lock:
+            if self._current is not None and self._current.key == key:
+                return
+            self._discard(self._current)
+            run = _Run(key)
+            self._current = run
+        self.stats.add(started=1)
+        run.future = self.executor.submit(self._run, run, work)
+
+    def _run(self, run, work):
+        def check():
+            if run.cancelled.is_set():
+                raise SpeculationCancelled()
+
+        start = time.perf_counter()
+        try:
+            return work(check)
+        finally:
+            run.seconds = time.perf_counter() - start
+            run.finished = True
+            run.settle(self.stats)
+
+    def _discard(self, run):
+        if run is None or run.taken:
+            return
+        run.cancelled.set()
+        if run.future is not None and run.future.cancel():
+            self.stats.add(cancelled=1)  # Never started, so nothing was wasted
+        else:
+            run.settle(self.stats)
+
+    def discard(self):
+        """Drop the current run, e.g. when the conversation is cleared"""
+        with self._lock:
+            self._discard(self._current)
+            self._current = None
+
+    def take(self, conversation_text, timeout=60):
+        """The speculated ``(story, final_story)`` for this conversation, or None.
+
+        Waits for a run that is still in flight, since it is already
+        ahead of starting over.
+        """
+        key = conversation_key(conversation_text)
+        with self._lock:
+            run = self._current
+            if run is None or run.key != key or run.future is None:
+                return None
+            run.taken = True
+
+        waited_from = time.perf_counter()
+        try:
+            draft = run.future.result(timeout=timeout)
+        except (CancelledError, TimeoutError, SpeculationCancelled):
+            return None
+        except Exception as e:
+            logging.warning(f"Speculative story run failed: {e}")
+            return None
+        waited = time.perf_counter() - waited_from
+        self.stats.add(used=1, saved_seconds=max(0.0, run.seconds - waited))
+        return draft
@@ -0,0 +1,57 @@
+"""Lay separately rendered comic panels out as one bordered strip.
+
+Panels are scaled to a common size and copied into a NumPy canvas:
+up to three panels side by side, four as a 2x2 grid, five or six as two
+rows of three with a short last row centred.
+"""
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+BACKGROUND = (255, 255, 255)
+BORDER_COLOR = (20, 20, 20)
+
+
+def grid_shape(count):
+    """(rows, columns) for ``count`` panels"""
+    if count <= 3:
+        return 1, count
+    if count == 4:
+        return 2, 2
+    return 2, 3
+
+
+def composite_panels(images, border=6, gutter=16, max_panel_width=768, quality=90):
+    """Combine panel images (raw bytes) into one JPEG strip and return its bytes"""
+    if not images:
+        raise ValueError("No panels to composite")
+    decoded = [Image.open(BytesIO(data)).convert("RGB") for data in images]
+
+    # Every panel takes the size of the smallest one, capped for sane output sizes
+    width = min(min(img.width for img in decoded), max_panel_width)
+    height = min(round(img.height * width / img.width) for img in decoded)
+    cell_width, cell_height = width + 2 * border, height + 2 * border
+
+    rows, columns = grid_shape(len(decoded))
+    canvas = np.full(
+        (rows * cell_height + (rows + 1) * gutter, columns * cell_width + (columns + 1) * gutter, 3),
+        BACKGROUND,
+        dtype=np.uint8,
+    )
+
+    for index, img in enumerate(decoded):
+        row, column = divmod(index, columns)
+        in_row = min(columns, len(decoded) - row * columns)
+        offset = (columns - in_row) * (cell_width + gutter) // 2
+        top = gutter + row * (cell_height + gutter)
+        left = offset + gutter + column * (cell_width + gutter)
+
+        if img.size != (width, height):
+            img = img.resize((width, height), Image.LANCZOS)
+        canvas[top:top + cell_height, left:left + cell_width] = BORDER_COLOR
+        canvas[top + border:top + border + height, left + border:left + border + width] = np.asarray(img)
+
+    output = BytesIO()
+    Image.fromarray(canvas).save(output, format="JPEG", quality=quality)
+    return output.getvalue()
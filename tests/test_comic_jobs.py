@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from comic_jobs import DONE, FAILED, ComicJobEngine
+
+
+@pytest.fixture
+def engine():
+    return ComicJobEngine(max_workers=2)
+
+
+def wait_for(job):
+    for _ in range(200):
+        if not job.active:
+            return job.snapshot()
+        threading.Event().wait(0.01)
+    raise AssertionError("job never finished")
+
+
+def test_jobs_are_only_found_by_their_owner(engine):
+    job = engine.submit(lambda job: "comic", owner="alice")
+
+    assert engine.get(job.job_id, owner="alice") is job
+    assert engine.get(job.job_id, owner="bob") is None
+    assert engine.get("unknown", owner="alice") is None
+    assert wait_for(job)["result"] == "comic"
+
+
+def test_same_key_joins_the_running_job_only_for_the_same_owner(engine):
+    release = threading.Event()
+
+    def work(job):
+        release.wait(2)
+        return job.owner
+
+    first = engine.submit(work, key="request", owner="alice")
+    again = engine.submit(work, key="request", owner="alice")
+    other = engine.submit(work, key="request", owner="bob")
+    release.set()
+
+    assert again is first and other is not first
+    assert engine.stats()["coalesced"] == 1
+    assert wait_for(other)["result"] == "bob"
+
+
+def test_failures_are_described(engine):
+    def fail(job):
+        raise ValueError("no story")
+
+    state = wait_for(engine.submit(fail, describe_error=lambda e: f"Sorry: {e}"))
+
+    assert state["status"] == FAILED
+    assert state["error"] == "Sorry: no story"
+    assert wait_for(engine.submit(lambda job: None))["status"] == DONE
@@ -0,0 +1,93 @@
+from conversation_summary import RollingSummary, SummaryPerBudget, count_tokens
+
+CHAT_BUDGET = 1200
+STORY_BUDGET = 3000
+
+
+def fake_summarizer(calls):
+    def summarize(summary, turns, max_tokens):
+        calls.append(turns)
+        return f"{summary} [{turns.count(chr(10)) + 1} turns]".strip()
+    return summarize
+
+
+def conversation(count, words=75):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"message{i} " + "word " * words}
+        for i in range(count)
+    ]
+
+
+def test_story_context_keeps_turns_that_fit_its_budget_while_chatting():
+    calls = []
+    summaries = SummaryPerBudget(fake_summarizer(calls), budgets=(CHAT_BUDGET, STORY_BUDGET))
+    messages = []
+    for message in conversation(16):
+        messages.append(message)
+        summaries.build(messages, CHAT_BUDGET)
+
+    story = summaries.build(messages, STORY_BUDGET)
+
+    assert sum(count_tokens(m["content"]) for m in messages) < STORY_BUDGET * 0.65
+    assert "Summary of earlier conversation" not in story
+    assert all(m["content"] in story for m in messages)
+    assert calls  # The chat budget did need summarizing
+
+
+def test_each_budget_stays_within_its_limit():
+    summaries = SummaryPerBudget(fake_summarizer([]), budgets=(CHAT_BUDGET, STORY_BUDGET))
+    messages = conversation(60)
+    for budget in (CHAT_BUDGET, STORY_BUDGET):
+        assert count_tokens(summaries.build(messages, budget)) <= budget
+
+
+def test_drop_prefix_folds_dropped_turns_into_every_summary():
+    calls = []
+    summaries = SummaryPerBudget(fake_summarizer(calls), budgets=(CHAT_BUDGET, STORY_BUDGET))
+    messages = conversation(10)
+    summaries.drop_prefix(messages, 4)
+    remaining = messages[4:]
+
+    for budget in (CHAT_BUDGET, STORY_BUDGET):
+        context = summaries.build(remaining, budget)
+        assert "[4 turns]" in context
+        assert remaining[0]["content"] in context
+
+
+def test_failed_drop_shifts_no_summarized_count():
+    def flaky(summary, turns, max_tokens):
+        if max_tokens > 500:
+            raise RuntimeError("summarizer down")
+        return "summary"
+
+    summaries = SummaryPerBudget(flaky, budgets=(CHAT_BUDGET, STORY_BUDGET))
+    messages = conversation(10)
+    try:
+        summaries.drop_prefix(messages, 4)
+    except RuntimeError:
+        pass
+    # The chat summary already holds the first 4 turns, counted against the messages the caller keeps
+    assert summaries.summaries[CHAT_BUDGET].summarized_count == 4
+    assert summaries.summaries[STORY_BUDGET].summarized_count == 0
+
+
+def test_rolling_summary_resets_when_conversation_is_replaced():
+    summary = RollingSummary(fake_summarizer([]))
+    summary.build(conversation(40), 400)
+    assert summary.summarized_count > 0
+    assert summary.build(conversation(1), 400) == f"user: {conversation(1)[0]['content']}"
+
+
+def test_restore_folds_earlier_turns_onto_a_saved_summary():
+    calls = []
+    summaries = SummaryPerBudget(fake_summarizer(calls), budgets=(CHAT_BUDGET, STORY_BUDGET))
+    earlier, loaded = conversation(30)[:20], conversation(30)[20:]
+
+    summary = summaries.restore(STORY_BUDGET, "saved", [earlier[:10], earlier[10:]])
+    context = summaries.build(loaded, STORY_BUDGET)
+
+    assert summary == "saved [10 turns] [10 turns]"
+    assert len(calls) == 2
+    assert context.startswith(f"Summary of earlier conversation:\n{summary}")
+    assert all(m["content"] in context for m in loaded)
+    assert summaries.summaries[STORY_BUDGET].summarized_count == 0
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import fireworks_client
+from fireworks_client import FireworksClient, FireworksError, FireworksPoller, FireworksTimeout, PollSchedule
+
+FAST = PollSchedule(first_delay=0.01, base_delay=0.01, factor=1.0, max_delay=0.02, jitter=0.0, deadline=2.0)
+
+
+class FakeClient:
+    """Answers polls from a script of statuses, exceptions or raw results"""
+
+    def __init__(self, replies, schedule=FAST):
+        self.schedule = schedule
+        self.replies = list(replies)
+        self.polls = 0
+
+    def poll(self, request_id):
+        self.polls += 1
+        reply = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+@pytest.fixture
+def make_poller():
+    pollers = []
+
+    def make(replies, schedule=FAST):
+        poller = FireworksPoller(FakeClient(replies, schedule), workers=2, min_gap=0.0)
+        pollers.append(poller)
+        return poller
+    yield make
+    for poller in pollers:
+        poller.close()
+
+
+def test_ready_request_resolves_with_its_sample(make_poller):
+    poller = make_poller([{"status": "Processing"}, {"status": "Ready", "result": {"sample": "https://img"}}])
+    result = poller.track("request-1").future.result(timeout=2)
+
+    assert result.sample == "https://img"
+    assert result.polls == 2
+    assert poller.stats()["outstanding"] == 0
+
+
+def test_transport_errors_are_reported_and_retried(make_poller):
+    errors = []
+    poller = make_poller([requests.exceptions.ConnectionError("reset"), {"status": "Ready", "result": {}}])
+    result = poller.track("request-1", on_error=errors.append).future.result(timeout=2)
+
+    assert result.sample is None
+    assert len(errors) == 1
+    assert poller.stats()["errors"] == 1
+
+
+def test_failed_status_resolves_with_an_error(make_poller):
+    poller = make_poller([{"status": "Failed", "details": "bad prompt"}])
+
+    with pytest.raises(FireworksError, match="bad prompt"):
+        poller.track("request-1").future.result(timeout=2)
+
+
+@pytest.mark.parametrize("reply", [
+    {"status": "Ready", "result": "not a dict"},
+    requests.exceptions.ConnectionError("reset"),
+])
+def test_unexpected_failures_still_resolve_the_future(make_poller, reply):
+    def broken_callback(error):
+        raise RuntimeError("callback broke")
+
+    poller = make_poller([reply])
+    pending = poller.track("request-1", on_error=broken_callback)
+
+    with pytest.raises(Exception):
+        pending.future.result(timeout=2)
+    assert poller.stats()["outstanding"] == 0
+
+
+def test_deadline_times_out(make_poller):
+    poller = make_poller([{"status": "Processing"}], PollSchedule(
+        first_delay=0.01, base_delay=0.01, max_delay=0.02, jitter=0.0, deadline=0.1,
+    ))
+
+    with pytest.raises(FireworksTimeout):
+        poller.track("request-1").future.result(timeout=2)
+
+
+def test_close_fails_outstanding_requests(make_poller):
+    poller = make_poller([{"status": "Processing"}], PollSchedule(first_delay=5.0, deadline=30.0))
+    pending = poller.track("request-1")
+    threading.Timer(0.05, poller.close).start()
+
+    start = time.monotonic()
+    with pytest.raises(FireworksError, match="closed"):
+        pending.future.result(timeout=2)
+    assert time.monotonic() - start < 1
+    with pytest.raises(FireworksError):
+        poller.track("request-2")
+
+
+def test_wait_gives_up_when_the_poller_never_resolves(monkeypatch):
+    monkeypatch.setattr(fireworks_client, "WAIT_GRACE_SECONDS", 0.1)
+    client = FireworksClient("key", schedule=PollSchedule(first_delay=0.01, deadline=0.2), poll_timeout=0)
+    release = threading.Event()
+    monkeypatch.setattr(client, "poll", lambda request_id: release.wait(5) or {"status": "Ready"})
+    try:
+        start = time.monotonic()
+        with pytest.raises(FireworksTimeout):
+            client.wait("request-1")
+        assert time.monotonic() - start < 3
+    finally:
+        release.set()
+        client.close()
@@ -0,0 +1,108 @@
+import io
+import json
+import time
+import zipfile
+
+import pytest
+
+import journal_store
+from journal_export import HTML, ZIP, export_journal, journal_days
+from journal_store import JournalStore
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 40
+DAYS = ["2026-03-01", "2026-03-02", "2026-03-04"]
+
+
+class NonSeekable(io.RawIOBase):
+    """A write-only stream, like standard output piped elsewhere"""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, chunk):
+        self.data += chunk
+        return len(chunk)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = JournalStore(str(tmp_path / "journal.sqlite3"))
+    for number, day in enumerate(DAYS):
+        noon = time.mktime(time.strptime(f"{day} 12:00", "%Y-%m-%d %H:%M"))
+        monkeypatch.setattr(journal_store.time, "time", lambda noon=noon: noon)
+        store.add_message("alice", "user", f"Entry {number} <b>on</b> {day}")
+        store.add_message("alice", "assistant", f"Reply {number}")
+        if number != 1:
+            store.add_comic("alice", "Manga", 3, f"Story {number}", f"Panel 1: prompt {number}", image=PNG)
+    store.add_message("bob", "user", "Not alice's")
+    monkeypatch.undo()
+    return store
+
+
+def archive(store, fmt, **options):
+    out = io.BytesIO()
+    stats = export_journal(store, "alice", out, fmt, **options)
+    out.seek(0)
+    return zipfile.ZipFile(out), stats
+
+
+def test_journal_days_merge_messages_and_comics_by_day(store):
+    days = list(journal_days(store, "alice"))
+
+    assert [d.day for d in days] == DAYS
+    assert [len(d.messages) for d in days] == [2, 2, 2]
+    assert [len(d.comics) for d in days] == [1, 0, 1]
+
+
+def test_zip_export_round_trips_messages_images_and_metadata(store):
+    zf, stats = archive(store, ZIP)
+    names = zf.namelist()
+
+    assert (stats.days, stats.messages, stats.comics, stats.image_bytes) == (3, 6, 2, 2 * len(PNG))
+    assert sorted(n for n in names if n.startswith("entries/")) == [f"entries/{d}.md" for d in DAYS]
+    first_day = zf.read(f"entries/{DAYS[0]}.md").decode()
+    assert "**USER:** Entry 0 <b>on</b> 2026-03-01" in first_day
+    assert "Not alice's" not in "".join(zf.read(n).decode() for n in names if n.endswith(".md"))
+
+    images = [n for n in names if n.startswith("comics/") and n.endswith(".png")]
+    assert len(images) == 2
+    assert all(zf.read(n) == PNG for n in images)
+    metadata = json.loads(zf.read(images[0].replace(".png", ".json")))
+    assert metadata["story"] == "Story 0"
+    assert metadata["image"] == images[0]
+    assert f"](../{images[0]})" in first_day
+
+
+def test_html_export_paginates_and_escapes(store):
+    zf, stats = archive(store, HTML, days_per_page=2)
+    names = zf.namelist()
+
+    assert stats.days == 3
+    assert [n for n in names if n.startswith("pages/")] == ["pages/page-0001.html", "pages/page-0002.html"]
+    index = zf.read("index.html").decode()
+    assert f"{DAYS[0]} to {DAYS[1]}" in index and DAYS[2] in index
+    first_page = zf.read("pages/page-0001.html").decode()
+    assert "Entry 0 &lt;b&gt;on&lt;/b&gt;" in first_page
+    assert "Later &rarr;" in first_page
+    images = [n for n in names if n.startswith("images/")]
+    assert all(zf.read(n) == PNG for n in images) and len(images) == 2
+
+
+def test_export_writes_to_a_non_seekable_stream(store):
+    out = NonSeekable()
+    export_journal(store, "alice", out, ZIP)
+
+    zf = zipfile.ZipFile(io.BytesIO(bytes(out.data)))
+    assert zf.testzip() is None
+    assert len([n for n in zf.namelist() if n.endswith(".png")]) == 2
+
+
+def test_empty_journal_and_unknown_format(store):
+    out = io.BytesIO()
+    assert export_journal(store, "nobody", out, HTML).days == 0
+    assert "No entries yet" in zipfile.ZipFile(out).read("index.html").decode()
+    with pytest.raises(ValueError):
+        export_journal(store, "alice", io.BytesIO(), "pdf")
@@ -0,0 +1,58 @@
+import pytest
+
+from journal_store import JournalStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JournalStore(str(tmp_path / "journal.sqlite3"))
+
+
+def test_cleared_conversation_stays_cleared_after_reopening(store):
+    for i in range(3):
+        store.add_message("alice", "user", f"before {i}")
+    store.add_message("bob", "user", "someone else")
+
+    first_id = store.start_conversation("alice")
+    store.add_message("alice", "user", "after")
+
+    reopened = JournalStore(store.path)
+    assert reopened.conversation_start("alice") == first_id
+    current = reopened.recent_messages("alice", 20, since_id=first_id)
+    assert [m["content"] for m in current] == ["after"]
+    earlier = reopened.recent_messages("alice", 20, before_id=first_id)
+    assert [m["content"] for m in earlier] == ["before 0", "before 1", "before 2"]
+
+
+def test_conversation_start_is_per_user(store):
+    store.add_message("alice", "user", "hello")
+    store.start_conversation("alice")
+
+    assert store.conversation_start("bob") is None
+    assert [m["content"] for m in store.recent_messages("bob", 20, since_id=None)] == []
+
+
+def test_clearing_again_moves_the_start_forward(store):
+    store.add_message("alice", "user", "one")
+    first = store.start_conversation("alice")
+    store.add_message("alice", "user", "two")
+    second = store.start_conversation("alice")
+
+    assert second > first
+    assert store.conversation_start("alice") == second
+    assert store.recent_messages("alice", 20, since_id=second) == []
+
+
+def test_earlier_turns_and_their_saved_summary(store):
+    ids = [store.add_message("alice", "user", f"turn {i}")["id"] for i in range(6)]
+
+    between = store.iter_messages("alice", batch_size=2, after_id=ids[0], before_id=ids[4])
+    assert [m["content"] for m in between] == ["turn 1", "turn 2", "turn 3"]
+
+    assert store.saved_summary("alice", 3000) is None
+    store.save_summary("alice", 3000, None, ids[3], "first")
+    store.save_summary("alice", 3000, ids[1], ids[4], "second")
+    store.save_summary("alice", 1200, None, ids[2], "chat")
+    assert store.saved_summary("alice", 3000) == (ids[1], ids[4], "second")
+    assert store.saved_summary("alice", 1200) == (None, ids[2], "chat")
+    assert store.saved_summary("bob", 3000) is None
@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+
+import pytest
+
+from llm_cache import LLMResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LLMResponseCache(str(tmp_path / "llm.sqlite3"))
+
+
+def answered_by(*names):
+    @contextmanager
+    def answering_models():
+        models = []
+        yield models
+        models.extend(names)
+    return answering_models
+
+
+def test_responses_are_reused_per_stage_and_prompt(cache):
+    memo = cache.bind("primary", 0.7)
+
+    assert memo("story", "prompt", lambda: "first") == "first"
+    assert memo("story", "prompt", lambda: "second") == "first"
+    assert memo("judge", "prompt", lambda: "third") == "third"
+    assert cache.stats()["story"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_fallback_answers_are_not_served_as_the_primarys(cache):
+    fallback = cache.bind("primary", 0.7, answering_models=answered_by("fallback"))
+    primary = cache.bind("primary", 0.7, answering_models=answered_by("primary"))
+
+    assert fallback("story", "prompt", lambda: "from fallback") == "from fallback"
+    assert cache.get("story", "fallback", 0.7, "prompt") == "from fallback"
+    assert primary("story", "prompt", lambda: "from primary") == "from primary"
+    assert primary("story", "prompt", lambda: "again") == "from primary"
+
+
+def test_uncacheable_results_are_not_recorded(cache):
+    memo = cache.bind("primary", 0.7)
+
+    assert memo("fused", "prompt", lambda: None) is None
+    assert cache.get("fused", "primary", 0.7, "prompt") is None
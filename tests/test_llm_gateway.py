@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from llm_gateway import CircuitBreaker, CircuitOpenError, LLMGateway, answering_models  # noqa: E402
+
+
+class FakeModel:
+    """Answers with its own name after ``delay`` seconds, or raises ``error``"""
+
+    def __init__(self, model_name, delay=0.0, error=None):
+        self.model_name = model_name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def invoke(self, messages, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.model_name
+
+    def stream(self, messages, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        yield from self.model_name.split("-")
+
+
+def gateway(primary, secondary=None, **options):
+    return LLMGateway(primary, secondary, initial_delay=0.05, min_delay=0.01, **options)
+
+
+def test_slow_primary_is_hedged_and_the_faster_answer_wins():
+    slow, fast = FakeModel("slow-model", delay=0.5), FakeModel("fast-model")
+
+    with answering_models() as models:
+        assert gateway(slow, fast).invoke("hi") == "fast-model"
+    assert models == ["fast-model"]
+
+
+def test_failing_primary_fails_over_at_once():
+    broken, backup = FakeModel("primary", error=RuntimeError("500")), FakeModel("backup")
+    llm = LLMGateway(broken, backup, initial_delay=5.0)
+
+    start = time.perf_counter()
+    assert llm.invoke("hi") == "backup"
+    assert time.perf_counter() - start < 1
+    assert llm.stats()["failovers"] == 1
+
+
+def test_open_circuit_skips_the_primary_until_it_resets():
+    broken, backup = FakeModel("primary", error=RuntimeError("500")), FakeModel("backup")
+    llm = gateway(broken, backup, failure_threshold=2, reset_after=60)
+
+    for _ in range(3):
+        assert llm.invoke("hi") == "backup"
+    assert broken.calls == 2
+    assert llm.stats()["models"]["primary"]["circuit"] == "open"
+
+
+def test_every_circuit_open_raises():
+    broken = FakeModel("primary", error=RuntimeError("500"))
+    llm = gateway(broken, failure_threshold=1, reset_after=60)
+
+    with pytest.raises(RuntimeError):
+        llm.invoke("hi")
+    with pytest.raises(CircuitOpenError):
+        llm.invoke("hi")
+
+
+def test_streams_are_hedged_on_the_first_chunk():
+    slow, fast = FakeModel("slow-model", delay=0.5), FakeModel("fast-model")
+
+    with answering_models() as models:
+        assert list(gateway(slow, fast).stream("hi")) == ["fast", "model"]
+    assert models == ["fast-model"]
+
+
+def test_half_open_breaker_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_after=0.01)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.02)
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
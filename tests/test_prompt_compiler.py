@@ -0,0 +1,101 @@
+from conversation_summary import count_tokens
+from prompt_compiler import (
+    STRIP_STYLING, Element, compile_panel_prompt, compile_strip_prompt, fit_prompt, pack, unvaried, vary_prompt,
+)
+
+ACTIONS = [
+    "Maya spills coffee on her laptop at the bus stop. She stares at it in disbelief.",
+    "A stranger offers her a napkin and a grin. They both laugh.",
+    "Maya types the last line of her report on the stranger's phone. The bus finally arrives.",
+]
+CHARACTERS = "Maya, a tall woman with curly red hair and a green raincoat. She carries a battered laptop bag."
+SETTING = "A rainy city bus stop at dawn. Neon signs reflect in the puddles."
+
+
+def strip(max_tokens):
+    return compile_strip_prompt(ACTIONS, "Manga", "Funny", 3, characters=CHARACTERS, setting=SETTING,
+                                look="Soft watercolor shading with bold ink outlines.", max_tokens=max_tokens)
+
+
+def test_generous_budget_keeps_every_element_in_reading_order():
+    prompt = strip(2000)
+
+    assert prompt.startswith("A 3-panel Manga comic strip with a Funny mood")
+    positions = [prompt.index(text) for text in ("Characters:", "Setting:", "Panel 1:", "Panel 2:", "Panel 3:")]
+    assert positions == sorted(positions)
+    assert all(clause in prompt for clause in STRIP_STYLING)
+    assert prompt.endswith(".")
+
+
+def test_tight_budget_drops_styling_before_panel_actions():
+    full = strip(2000)
+    budget = count_tokens(full) // 2
+    prompt = strip(budget)
+
+    assert count_tokens(prompt) <= budget
+    assert prompt.startswith("A 3-panel Manga comic strip")
+    for index in (1, 2, 3):
+        assert f"Panel {index}:" in prompt
+    assert STRIP_STYLING[-1] not in prompt
+
+
+def test_element_that_does_not_fit_falls_back_to_its_first_sentence():
+    elements = [
+        Element("Layout first.", (0, 0)),
+        Element("Keep this sentence. Drop this much longer second sentence about the weather.", (1, 0),
+                "Keep this sentence."),
+    ]
+    budget = count_tokens("Layout first. Keep this sentence.") + 2
+
+    assert pack(elements, budget) == "Layout first. Keep this sentence."
+
+
+def test_elements_are_kept_whole_or_left_out():
+    texts = [f"Element {word} has several words in it." for word in ("one", "two", "three", "four", "five")]
+    elements = [Element(text, (i, 0)) for i, text in enumerate(texts)]
+    budget = count_tokens(" ".join(texts)) // 2
+    prompt = pack(elements, budget)
+
+    assert count_tokens(prompt) <= budget
+    kept = [text for text in texts if text in prompt]
+    assert kept == texts[:len(kept)] and kept
+    assert prompt == " ".join(kept)
+
+
+def test_panel_prompt_fits_and_names_its_panel():
+    prompt = compile_panel_prompt(ACTIONS[1], CHARACTERS, "Manga", 2, 3, max_tokens=80)
+
+    assert count_tokens(prompt) <= 80
+    assert prompt.startswith("A stranger offers her a napkin")
+    assert "Panel 2 of 3" in prompt
+
+
+def test_fit_prompt_keeps_leading_clauses():
+    prompt = ", ".join(f"clause number {i}" for i in range(200))
+    fitted = fit_prompt(prompt, 50)
+
+    assert count_tokens(fitted) <= 50
+    assert fitted.startswith("clause number 0, clause number 1,")
+    assert fitted.endswith(".")
+    assert fit_prompt("short prompt.", 50) == "short prompt."
+
+
+def test_fit_prompt_cuts_an_overlong_first_clause_between_words():
+    words = [f"word{i}" for i in range(300)]
+    fitted = fit_prompt(" ".join(words), 50)
+
+    assert count_tokens(fitted) <= 50
+    assert fitted.split() == words[:len(fitted.split())]
+    assert len(fitted.split()) > 5
+
+
+def test_variation_is_replaced_not_stacked():
+    base = strip(240)
+    once = vary_prompt(base, 1)
+    again = vary_prompt(once, 2)
+
+    assert once.startswith("Alternative visual interpretation 1,")
+    assert again.startswith("Alternative visual interpretation 2,")
+    assert again.count("Alternative visual interpretation") == 1
+    assert unvaried(again) == unvaried(once)
+    assert count_tokens(again) <= 240
@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+from rate_limiter import AdaptiveConcurrency, RateLimiter, TokenBucket, is_rate_limited, retry_after_seconds
+
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = Response(status_code, headers)
+
+
+LIMITS = {"groq": {"concurrency": 4, "endpoints": {"chat": (1000.0, 1000)}}}
+
+
+def test_rate_limits_are_recognised_through_causes():
+    assert is_rate_limited(HTTPError(429))
+    assert is_rate_limited(RuntimeError("Rate limit reached for model"))
+    try:
+        try:
+            raise HTTPError(429, {"Retry-After": "2.5"})
+        except HTTPError as e:
+            raise RuntimeError("LLM call failed") from e
+    except RuntimeError as wrapped:
+        assert is_rate_limited(wrapped)
+        assert retry_after_seconds(wrapped) == 2.5
+    assert not is_rate_limited(HTTPError(500))
+
+
+def test_throttle_halves_concurrency_and_pauses_new_calls():
+    limiter = RateLimiter(LIMITS)
+
+    def throttled():
+        raise HTTPError(429, {"Retry-After": "0.2"})
+
+    with pytest.raises(HTTPError):
+        limiter.call("groq", "chat", throttled)
+    provider = limiter.stats()["providers"]["groq"]
+    assert provider["concurrency_limit"] == 2
+    assert provider["paused_for"] > 0.1
+
+    start = time.monotonic()
+    assert limiter.call("groq", "chat", lambda: "ok") == "ok"
+    assert time.monotonic() - start >= 0.15
+    assert limiter.stats()["endpoints"]["groq/chat"]["throttles"] == 1
+
+
+def test_successes_grow_the_limit_back_additively():
+    concurrency = AdaptiveConcurrency(4)
+    concurrency.acquire()
+    concurrency.release(throttled=True)
+    assert concurrency.limit == 2
+
+    for _ in range(4):
+        concurrency.acquire()
+        concurrency.release()
+    assert 3 <= concurrency.limit <= 4
+    for _ in range(100):
+        concurrency.acquire()
+        concurrency.release()
+    assert concurrency.limit == 4
+
+
+def test_concurrency_limit_is_enforced():
+    limiter = RateLimiter({"groq": {"concurrency": 2, "endpoints": {"chat": (1000.0, 1000)}}})
+    running, peak, lock = 0, 0, threading.Lock()
+
+    def work():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+
+    threads = [threading.Thread(target=limiter.call, args=("groq", "chat", work)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak == 2
+
+
+def test_token_bucket_makes_callers_past_the_burst_wait():
+    bucket = TokenBucket(rate=10.0, capacity=2)
+
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.02)
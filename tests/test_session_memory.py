@@ -0,0 +1,48 @@
+from session_memory import SessionMemory, excess_messages
+
+
+def messages(count, words=50):
+    return [{"role": "user", "content": "word " * words} for _ in range(count)]
+
+
+def test_sweep_only_marks_other_sessions_and_they_clear_themselves():
+    memory = SessionMemory(idle_after=10, sweep_every=0)
+    idle_messages = messages(5)
+    memory.track("idle", "idle", messages=idle_messages)
+    memory._sessions["idle"].last_seen -= 60
+
+    assert memory.track("active", "active", messages=messages(1)) is False
+    assert len(idle_messages) == 5  # Not touched from the other session's thread
+    assert memory.usage()["evictions"] == 0
+    assert memory._sessions["idle"].items == {}
+
+    assert memory.track("idle", "idle", messages=idle_messages) is True
+    assert idle_messages == []
+    assert memory.usage()["evictions"] == 1
+    assert memory.track("idle", "idle", messages=idle_messages) is False
+
+
+def test_active_sessions_are_not_marked():
+    memory = SessionMemory(idle_after=10, sweep_every=0)
+    kept = messages(3)
+    memory.track("a", "a", messages=kept)
+    memory.track("b", "b", messages=messages(1))
+
+    assert memory.track("a", "a", messages=kept) is False
+    assert len(kept) == 3
+
+
+def test_long_idle_sessions_are_forgotten():
+    memory = SessionMemory(idle_after=10, forget_after=100, sweep_every=0)
+    memory.track("gone", "gone", messages=messages(1))
+    memory._sessions["gone"].last_seen -= 1000
+    memory.track("here", "here", messages=messages(1))
+
+    assert [s["session"] for s in memory.usage()["sessions"]] == ["here"]
+
+
+def test_excess_messages_keeps_the_newest():
+    history = messages(10)
+
+    assert excess_messages(history, max_tokens=10 ** 6, max_bytes=10 ** 9) == 0
+    assert excess_messages(history, max_tokens=1, max_bytes=10 ** 9, keep=2) == 8
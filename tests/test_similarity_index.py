@@ -0,0 +1,76 @@
+import pytest
+
+from similarity_index import MinHasher, SimilarityIndex
+
+DAY = """user: the bus was late again so I walked to work in the rain and got soaked
+assistant: that sounds miserable, did the walk at least clear your head before the meeting
+user: a little, then my boss loved the project demo and we all went out for cake"""
+OTHER_DAY = """user: spent the whole weekend at the beach with my sister building sand castles
+assistant: what a lovely break, did you swim too
+user: only once, the water was freezing but the sunset over the mountain was worth it"""
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SimilarityIndex(str(tmp_path / "similarity.sqlite3"))
+
+
+def add(index, user_id, text, style="Manga", tone="Funny", panels=3, layout="strip", story="story"):
+    return index.add(user_id, text, style, tone, panels, layout, story, f"final {story}", "{}", "prompt")
+
+
+def test_edited_conversation_matches_and_unrelated_one_does_not(index):
+    add(index, "alice", DAY, story="rainy walk")
+    add(index, "alice", OTHER_DAY, story="beach")
+
+    matches = index.lookup("alice", f"{DAY}\nassistant: cake makes everything better", threshold=0.7)
+
+    assert [m.story for m in matches] == ["rainy walk"]
+    assert matches[0].similarity >= 0.7
+    assert index.lookup("alice", "user: I repaired the garden fence and fed the dog", threshold=0.7) == []
+
+
+def test_lookups_stay_within_the_users_journal_unless_shared(tmp_path):
+    path = str(tmp_path / "similarity.sqlite3")
+    private = SimilarityIndex(path)
+    add(private, "alice", DAY)
+
+    assert private.lookup("bob", DAY) == []
+    assert [m.user_id for m in SimilarityIndex(path, shared=True).lookup("bob", DAY)] == ["alice"]
+
+
+def test_index_is_rebuilt_from_sqlite(index):
+    add(index, "alice", DAY, style="Noir", tone="Dramatic", panels=4, layout="panels")
+
+    reopened = SimilarityIndex(index.path)
+    [match] = reopened.lookup("alice", DAY)
+
+    assert len(reopened) == 1
+    assert match.similarity == 1.0
+    assert match.same_settings("Noir", "Dramatic", 4, "panels")
+    assert not match.same_settings("Manga", "Dramatic", 4, "panels")
+
+
+def test_empty_conversation_is_never_looked_up(index):
+    add(index, "alice", DAY)
+
+    assert index.lookup("alice", "   ") == []
+    assert index.stats()["lookups"] == 0
+
+
+def test_signatures_are_stable_across_hashers():
+    assert (MinHasher().signature(DAY) == MinHasher().signature(DAY)).all()
+    with pytest.raises(ValueError):
+        MinHasher(num_perm=10, bands=3)
+
+
+def test_stats_count_reuse(index):
+    add(index, "alice", DAY)
+    index.lookup("alice", DAY)
+    index.lookup("alice", OTHER_DAY)
+    index.record_reuse("full")
+
+    stats = index.stats()
+    assert stats["entries"] == 1
+    assert stats["lookups"] == 2
+    assert stats["reuse_rate"] == 0.5
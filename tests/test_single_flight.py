@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def run_together(count, target):
+    results, errors = [None] * count, [None] * count
+
+    def call(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_identical_calls_run_once_and_share_the_result():
+    flights, calls = SingleFlight(), []
+
+    def work(flight):
+        calls.append(1)
+        time.sleep(0.1)
+        return "image"
+
+    def request():
+        return flights.do("prompt", work, wait_interval=0.01)
+
+    results, errors = run_together(5, request)
+
+    assert results == ["image"] * 5 and errors == [None] * 5
+    assert len(calls) == 1
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 4}
+
+
+def test_followers_get_the_leaders_error_and_the_next_call_starts_fresh():
+    flights = SingleFlight()
+
+    def fail(flight):
+        time.sleep(0.1)
+        raise ValueError("render failed")
+
+    _, errors = run_together(3, lambda: flights.do("prompt", fail, wait_interval=0.01))
+
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert flights.do("prompt", lambda flight: "retried") == "retried"
+
+
+def test_different_keys_do_not_coalesce():
+    flights = SingleFlight()
+
+    results, _ = run_together(2, lambda: flights.do(threading.get_ident(), lambda flight: "own"))
+
+    assert results == ["own", "own"]
+    assert flights.stats()["coalesced"] == 0
+
+
+def test_followers_see_the_leaders_progress():
+    flights, seen, leading = SingleFlight(), [], threading.Event()
+
+    def lead(flight):
+        flight.progress = {"polls": 3}
+        leading.set()
+        time.sleep(0.1)
+        return "done"
+
+    leader = threading.Thread(target=flights.do, args=("prompt", lead))
+    leader.start()
+    leading.wait(1)
+    result = flights.do("prompt", lead, on_wait=lambda flight, elapsed: seen.append(flight.progress),
+                        wait_interval=0.01)
+    leader.join()
+
+    assert result == "done"
+    assert seen and seen[0] == {"polls": 3}
+
+
+def test_leader_exception_propagates_to_the_leader():
+    with pytest.raises(KeyError):
+        SingleFlight().do("prompt", lambda flight: {}["missing"])
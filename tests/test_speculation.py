@@ -0,0 +1,53 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from speculation import SpeculationStats, StorySpeculator
+
+
+@pytest.fixture
+def speculator():
+    executor = ThreadPoolExecutor(max_workers=1)
+    yield StorySpeculator(executor, SpeculationStats())
+    executor.shutdown(wait=True)
+
+
+def test_finished_run_is_taken_for_the_same_conversation(speculator):
+    speculator.refresh("chat", lambda check: ("story", "final"))
+
+    assert speculator.take("other chat") is None
+    assert speculator.take("chat") == ("story", "final")
+    assert speculator.stats.snapshot()["used"] == 1
+
+
+def test_new_message_stops_the_run_in_flight_between_stages(speculator):
+    started, release, stages = threading.Event(), threading.Event(), []
+
+    def work(check):
+        started.set()
+        release.wait(2)
+        check()
+        stages.append("judge")
+        return "story", "final"
+
+    speculator.refresh("chat", work)
+    started.wait(2)
+    speculator.refresh("chat and more", lambda check: ("newer", "newer final"))
+    release.set()
+
+    assert speculator.take("chat and more") == ("newer", "newer final")
+    assert stages == []
+    assert speculator.stats.snapshot()["wasted"] == 1
+
+
+def test_queued_run_is_cancelled_without_waste(speculator):
+    blocker = threading.Event()
+    speculator.executor.submit(blocker.wait, 2)
+    speculator.refresh("chat", lambda check: ("story", "final"))
+    speculator.discard()
+    blocker.set()
+
+    stats = speculator.stats.snapshot()
+    assert (stats["cancelled"], stats["wasted"]) == (1, 0)
+    assert speculator.take("chat") is None
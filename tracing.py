@@ -0,0 +1,236 @@
+"""Lightweight spans and metrics for the chat and comic pipeline.
+
+Like ``logging``, tracing is process-wide: code opens spans with
+``span(name, **attributes)`` and nested spans on the same thread become
+children of the enclosing one. Code further down the call stack (the
+stage cache, the rate limiter) can add attributes to whatever span is
+open with ``annotate``. Finished spans update per-span metrics, which are
+exported as Prometheus text (``prometheus_text`` / ``serve_metrics``),
+and can also be appended to a JSON-lines log.
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Numeric attributes summed per span name in the exported metrics
+SUMMED_ATTRIBUTES = ("prompt_chars", "response_chars", "prompt_tokens", "response_tokens", "bytes",
+                     "retries", "limiter_wait")
+
+_current = ContextVar("current_span", default=None)
+
+
+@dataclass
+class Span:
+    """One timed operation and what was learned about it"""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str = None
+    started: float = field(default_factory=time.time)
+    duration: float = 0.0
+    status: str = "ok"
+    error: str = ""
+    attributes: dict = field(default_factory=dict)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "started": self.started,
+            "duration": self.duration,
+            "status": self.status,
+            "error": self.error,
+            **self.attributes,
+        }
+
+
+class _SpanMetrics:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.duration_sum = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.recent = deque(maxlen=1000)
+        self.sums = defaultdict(float)
+        self.cache = defaultdict(int)
+
+    def add(self, span):
+        self.count += 1
+        if span.status != "ok":
+            self.errors += 1
+        self.duration_sum += span.duration
+        index = bisect.bisect_left(DURATION_BUCKETS, span.duration)
+        if index < len(self.buckets):
+            self.buckets[index] += 1
+        self.recent.append(span.duration)
+        for name in SUMMED_ATTRIBUTES:
+            value = span.attributes.get(name)
+            if isinstance(value, (int, float)):
+                self.sums[name] += value
+        if "cache" in span.attributes:
+            self.cache[span.attributes["cache"]] += 1
+
+
+class Tracer:
+    """Collects finished spans into metrics, a recent-span buffer and an optional log"""
+
+    def __init__(self, keep=500):
+        self._metrics = defaultdict(_SpanMetrics)
+        self._recent = deque(maxlen=keep)
+        self._log = None
+        self._lock = threading.Lock()
+
+    def log_to(self, path):
+        """Append every finished span to ``path`` as one JSON object per line"""
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+            self._log = open(path, "a", buffering=1, encoding="utf-8") if path else None
+
+    @contextmanager
+    def span(self, name, **attributes):
+        parent = _current.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes,
+        )
+        token = _current.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"[:300]
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            _current.reset(token)
+            self._finish(span)
+
+    def _finish(self, span):
+        with self._lock:
+            self._metrics[span.name].add(span)
+            self._recent.append(span)
+            if self._log is not None:
+                try:
+                    self._log.write(json.dumps(span.to_dict(), default=str) + "\n")
+                except (OSError, ValueError) as e:
+                    logging.warning(f"Could not write trace log: {e}")
+
+    def recent(self, limit=50, trace_id=None):
+        """Most recent finished spans, newest first"""
+        with self._lock:
+            spans = [s for s in reversed(self._recent) if trace_id is None or s.trace_id == trace_id]
+        return [s.to_dict() for s in spans[:limit]]
+
+    def summary(self):
+        """Per-span count, errors, latency percentiles, cache outcomes and totals"""
+        with self._lock:
+            summary = {}
+            for name, m in sorted(self._metrics.items()):
+                ordered = sorted(m.recent)
+                summary[name] = {
+                    "count": m.count,
+                    "errors": m.errors,
+                    "p50": ordered[len(ordered) // 2] if ordered else 0.0,
+                    "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else 0.0,
+                    "cache": dict(m.cache),
+                    **{key: value for key, value in m.sums.items()},
+                }
+            return summary
+
+    def prometheus_text(self):
+        """All span metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP comic_span_duration_seconds Duration of traced operations",
+            "# TYPE comic_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+            for name, m in metrics:
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, m.buckets):
+                    cumulative += count
+                    lines.append(f'comic_span_duration_seconds_bucket{{span="{name}",le="{bound:g}"}} {cumulative}')
+                lines.append(f'comic_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {m.count}')
+                lines.append(f'comic_span_duration_seconds_sum{{span="{name}"}} {m.duration_sum:.6f}')
+                lines.append(f'comic_span_duration_seconds_count{{span="{name}"}} {m.count}')
+
+            lines += ["# HELP comic_span_errors_total Traced operations that raised",
+                      "# TYPE comic_span_errors_total counter"]
+            lines += [f'comic_span_errors_total{{span="{name}"}} {m.errors}' for name, m in metrics]
+
+            lines += ["# HELP comic_span_cache_total Cache outcomes of traced operations",
+                      "# TYPE comic_span_cache_total counter"]
+            for name, m in metrics:
+                lines += [f'comic_span_cache_total{{span="{name}",outcome="{outcome}"}} {count}'
+                          for outcome, count in sorted(m.cache.items())]
+
+            for attribute in SUMMED_ATTRIBUTES:
+                metric = f"comic_span_{attribute}_total"
+                lines += [f"# HELP {metric} Sum of {attribute} over traced operations",
+                          f"# TYPE {metric} counter"]
+                lines += [f'{metric}{{span="{name}"}} {m.sums[attribute]:g}'
+                          for name, m in metrics if attribute in m.sums]
+        return "\n".join(lines) + "\n"
+
+
+TRACER = Tracer()
+
+
+def span(name, **attributes):
+    """Open a span on the process-wide tracer"""
+    return TRACER.span(name, **attributes)
+
+
+def annotate(**attributes):
+    """Add attributes to the innermost open span, if there is one"""
+    current = _current.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def current_trace_id():
+    current = _current.get()
+    return current.trace_id if current else None
+
+
+def serve_metrics(port, host="0.0.0.0", tracer=TRACER):
+    """Serve ``/metrics`` in Prometheus format from a background thread"""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = tracer.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logging.info(f"Serving span metrics on http://{host}:{port}/metrics")
+    return server